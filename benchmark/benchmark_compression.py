@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the compression formats of the tar file on synthetic symbolic link trees. For every available format and
+level it reports the size of the tar file, the time to write it and the time to extract it into an empty directory.
+With --threads the gzip levels are measured a second time, compressed in parallel on that number of threads.
+
+Run it from the repository root:
+
+    python -m benchmark.benchmark_compression --links 100000 --threads 4
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from typing import Dict
+from typing import Optional
+
+from src.cloud_symlinks import COMPRESSIONS
+from src.cloud_symlinks import Manifest
+from src.cloud_symlinks import build_manifest
+from src.cloud_symlinks import extract_tar_file
+from src.cloud_symlinks import open_tar_reader
+from src.cloud_symlinks import write_tar_file
+
+# Levels measured for each compression format, None is the default level of the format
+LEVELS = {
+    'none': (None,),
+    'gz': (1, 6, 9),
+    'bz2': (1, 9),
+    'xz': (0, 6),
+    'zstd': (1, 3, 19),
+}
+
+
+def create_links(root: str, links: int, per_directory: int) -> None:
+    """
+    Creates a synthetic tree of symbolic links with realistic looking targets
+
+    :param root: Path of the directory where the tree is created
+    :type root: str
+    :param links: Number of symbolic links
+    :type links: int
+    :param per_directory: Number of symbolic links of each directory
+    :type per_directory: int
+    :return: Nothing
+    """
+    for i in range(links):
+        directory = os.path.join(root, 'project-{0:03d}'.format(i // per_directory // 100),
+                                 'folder-{0:05d}'.format(i // per_directory))
+        if i % per_directory == 0:
+            os.makedirs(directory, exist_ok=True)
+        os.symlink('/home/user/Cloud/data/project-{0:03d}/datasets/file-{1:08d}.nc'.format(i % 97, i),
+                   os.path.join(directory, 'file-{0:08d}.nc'.format(i)))
+
+
+def measure(symlinks_directory: str, manifest: Manifest, tar_filename: str, compression: str,
+            compression_level: Optional[int], compression_threads: int = 1) -> Dict[str, float]:
+    """
+    Writes and extracts a tar file with a compression format and level
+
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param manifest: The manifest of the symbolic links
+    :type manifest: Manifest
+    :param tar_filename: Path of the tar file to write
+    :type tar_filename: str
+    :param compression: Compression format
+    :type compression: str
+    :param compression_level: Compression level or None for the default one
+    :type compression_level: Optional[int]
+    :param compression_threads: Number of threads compressing a gzip tar file in parallel
+    :type compression_threads: int
+    :return: The size in bytes and the compression and extraction times in milliseconds
+    :rtype: Dict[str, float]
+    """
+    start = time.perf_counter()
+    write_tar_file(tar_filename, symlinks_directory, manifest, compression, compression_level,
+                   compression_threads=compression_threads)
+    compress_ms = (time.perf_counter() - start) * 1000
+    with tempfile.TemporaryDirectory() as extract_dir:
+        start = time.perf_counter()
+        with open_tar_reader(tar_filename) as tar:
+            extract_tar_file(tar, extract_dir, True)
+        extract_ms = (time.perf_counter() - start) * 1000
+    return {'bytes': os.path.getsize(tar_filename), 'compress_ms': compress_ms, 'extract_ms': extract_ms}
+
+
+if __name__ == "__main__":  # pragma: no cover
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--links', help='Number of symbolic links of the tree', type=int, default=100000)
+    parser.add_argument('-p', '--per-directory', help='Number of symbolic links per directory', type=int,
+                        default=500)
+    parser.add_argument('-t', '--threads', help='Number of threads compressing the gzip tar files in parallel',
+                        type=int, default=1)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        symlinks_dir = os.path.join(temp_dir, 'symlinks')
+        create_links(symlinks_dir, args.links, args.per_directory)
+        symlinks_manifest = build_manifest(symlinks_dir, True)
+        print('| {0:<11} | {1:>12} | {2:>12} | {3:>12} |'.format('format', 'bytes', 'compress ms', 'extract ms'))
+        print('|-{0:}-|-{1:}:|-{1:}:|-{1:}:|'.format('-' * 11, '-' * 12))
+        runs = [(fmt, level, 1) for fmt in COMPRESSIONS for level in LEVELS[fmt]]
+        if args.threads > 1:
+            runs += [('gz', level, args.threads) for level in LEVELS['gz']]
+        for fmt, level, threads in runs:
+            result = measure(symlinks_dir, symlinks_manifest, os.path.join(temp_dir, 'links.tar'), fmt, level, threads)
+            label = fmt if level is None else '{0:}-{1:}'.format(fmt, level)
+            if threads > 1:
+                label += 'x{0:}'.format(threads)
+            print('| {0:<11} | {1:>12} | {2:>12.0f} | {3:>12.0f} |'.format(label, result['bytes'],
+                                                                      result['compress_ms'],
+                                                                      result['extract_ms']))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the archive formats for a payload of symbolic links only. It writes the same manifest as a tar file and
+in the native manifest format, uncompressed and compressed, and reports for each one the size of the file, the time to
+write it and the time to read its manifest back.
+
+Run it from the repository root:
+
+    python -m benchmark.benchmark_format --links 200000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from typing import Dict
+
+from src.cloud_symlinks import Manifest
+from src.cloud_symlinks import read_archive_manifest
+from src.cloud_symlinks import write_archive
+
+
+def create_manifest(links: int, per_directory: int) -> Manifest:
+    """
+    Creates a synthetic manifest of symbolic links spread over a two level directory tree
+
+    :param links: Number of symbolic links
+    :type links: int
+    :param per_directory: Number of symbolic links of each directory
+    :type per_directory: int
+    :return: The manifest
+    :rtype: Manifest
+    """
+    manifest = dict()
+    for i in range(links):
+        directory = os.path.join('d{0:04d}'.format(i // per_directory // 100), 'd{0:04d}'.format(i // per_directory))
+        manifest[os.path.join(directory, 'link-{0:}'.format(i))] = ('/mnt/storage/media/{0:}/file-{1:}.bin'.format(
+            directory, i), 0o777)
+    return manifest
+
+
+def measure(filename: str, manifest: Manifest, archive_format: str, compression: str) -> Dict[str, float]:
+    """
+    Writes a manifest in a format and reads it back, measuring the size of the file and the times
+
+    :param filename: Path of the file to write
+    :type filename: str
+    :param manifest: The manifest to write
+    :type manifest: Manifest
+    :param archive_format: Format of the file
+    :type archive_format: str
+    :param compression: Compression format of the file
+    :type compression: str
+    :return: The measures
+    :rtype: Dict[str, float]
+    """
+    start = time.perf_counter()
+    write_archive(filename, os.path.dirname(filename), manifest, archive_format, compression, 6)
+    written = time.perf_counter()
+    read = read_archive_manifest(filename)
+    elapsed = time.perf_counter()
+    assert read == manifest
+    return {'size_mb': os.path.getsize(filename) / 1024 / 1024, 'write': written - start, 'read': elapsed - written}
+
+
+if __name__ == "__main__":  # pragma: no cover
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--links', help='Number of symbolic links', type=int, default=200000)
+    parser.add_argument('-p', '--per-directory', help='Number of symbolic links per directory', type=int,
+                        default=1000)
+    args = parser.parse_args()
+    links = create_manifest(args.links, args.per_directory)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        print('{0:<10} {1:<6} {2:>10} {3:>10} {4:>10}'.format('format', 'comp', 'size MB', 'write s', 'read s'))
+        for archive_format in ('tar', 'manifest'):
+            for compression in ('none', 'gz'):
+                result = measure(os.path.join(temp_dir, archive_format + '.' + compression), links, archive_format,
+                                 compression)
+                print('{0:<10} {1:<6} {2:>10.2f} {3:>10.2f} {4:>10.2f}'.format(
+                    archive_format, compression, result['size_mb'], result['write'], result['read']))
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the enumeration of the symbolic links of a directory tree. It compares the former os.walk based listing
+with the scandir based generator used by the compression, and with a rescan of the unchanged tree through a warm
+directory cache. For each one it reports the wall time, the peak memory allocated by Python and the number of file
+system calls issued from Python (scandir, lstat and stat).
+
+Run it from the repository root:
+
+    python -m benchmark.benchmark_scan --entries 1000000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from typing import Callable
+from typing import Dict
+from typing import List
+
+from src.cloud_symlinks import build_manifest_cached
+from src.cloud_symlinks import scan_symlinks
+
+
+def legacy_list(symlinks_directory: str) -> List[str]:
+    """
+    Former listing of the symbolic links of a directory tree, materializing the whole walk
+
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :return: The relative paths of the symbolic links
+    :rtype: List[str]
+    """
+    walked = list(os.walk(symlinks_directory))
+    symlinks = list()
+    for folder in walked[1:]:
+        for file in folder[2]:
+            if os.path.islink(os.path.join(folder[0], file)):
+                symlinks.append(os.path.join(folder[0].replace(symlinks_directory, '')[1:], file))
+    return symlinks
+
+
+def scandir_count(symlinks_directory: str) -> int:
+    """
+    Counts the symbolic links of a directory tree with the scandir based generator
+
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :return: The number of symbolic links
+    :rtype: int
+    """
+    count = 0
+    for _ in scan_symlinks(symlinks_directory, True):
+        count += 1
+    return count
+
+
+def create_tree(root: str, entries: int, per_directory: int) -> None:
+    """
+    Creates a synthetic directory tree with half of the entries being symbolic links and the other half empty regular
+    files
+
+    :param root: Path of the directory where the tree is created
+    :type root: str
+    :param entries: Total number of entries
+    :type entries: int
+    :param per_directory: Number of entries of each directory
+    :type per_directory: int
+    :return: Nothing
+    """
+    for i in range(entries):
+        directory = os.path.join(root, 'd{0:04d}'.format(i // per_directory // 100),
+                                 'd{0:04d}'.format(i // per_directory))
+        if i % per_directory == 0:
+            os.makedirs(directory, exist_ok=True)
+        if i % 2 == 0:
+            os.symlink('/target/{0:}'.format(i), os.path.join(directory, 'l{0:}'.format(i)))
+        else:
+            open(os.path.join(directory, 'f{0:}'.format(i)), 'w').close()
+
+
+def measure(function: Callable[[str], object], root: str) -> Dict[str, float]:
+    """
+    Runs a listing function counting the file system calls issued from Python, its wall time and its peak memory
+
+    :param function: Listing function to measure
+    :type function: Callable[[str], object]
+    :param root: Path of the directory tree to list
+    :type root: str
+    :return: The measures
+    :rtype: Dict[str, float]
+    """
+    calls = {'scandir': 0, 'lstat': 0, 'stat': 0}
+    originals = {name: getattr(os, name) for name in calls}
+
+    def counter(name: str) -> Callable:
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            return originals[name](*args, **kwargs)
+        return wrapper
+
+    for name in calls:
+        setattr(os, name, counter(name))
+    try:
+        tracemalloc.start()
+        start = time.perf_counter()
+        function(root)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        for name, original in originals.items():
+            setattr(os, name, original)
+    return {'seconds': elapsed, 'peak_mb': peak / 1024 / 1024, **calls}
+
+
+if __name__ == "__main__":  # pragma: no cover
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--entries', help='Number of entries of the tree', type=int, default=1000000)
+    parser.add_argument('-p', '--per-directory', help='Number of entries per directory', type=int, default=1000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        create_tree(temp_dir, args.entries, args.per_directory)
+        # Backdate the directories so they are old enough to be cached, and warm the cache
+        past = time.time_ns() - 10000000000
+        for path, dirs, files in os.walk(temp_dir):
+            os.utime(path, ns=(past, past))
+        cache = build_manifest_cached(temp_dir, True)[1]
+        print('{0:<10} {1:>10} {2:>10} {3:>10} {4:>10} {5:>10}'.format('walker', 'seconds', 'peak MB', 'scandir',
+                                                                     'lstat', 'stat'))
+        for label, function in (('os.walk', legacy_list), ('scandir', scandir_count),
+                                ('cached', lambda root: build_manifest_cached(root, True, cache=cache))):
+            result = measure(function, temp_dir)
+            print('{0:<10} {1:>10.2f} {2:>10.1f} {3:>10} {4:>10} {5:>10}'.format(
+                label, result['seconds'], result['peak_mb'], result['scandir'], result['lstat'], result['stat']))
@@ -3,341 +3,4194 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
+import bz2
+import collections
+import concurrent.futures
+import contextlib
+import ctypes
 import datetime
+import functools
+import gzip
+import hashlib
+import json
+import select
+import stat
+import struct
 import tarfile
+import tempfile
 import sys
 import os
 import logging
+import lzma
+import mmap
 import time
+import zlib
 import threading
 import configparser
+import sqlite3
 import watchdog.events
 
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from watchdog.events import FileModifiedEvent
+from watchdog.events import FileCreatedEvent
+from watchdog.events import FileDeletedEvent
+from watchdog.events import FileMovedEvent
+from watchdog.events import FileOpenedEvent
+from watchdog.events import FileClosedNoWriteEvent
+from watchdog.events import FileSystemMovedEvent
 from watchdog.events import DirModifiedEvent
+from watchdog.events import DirCreatedEvent
+from watchdog.events import DirDeletedEvent
+from watchdog.utils import UnsupportedLibcError
 
 from logging.handlers import RotatingFileHandler
+from typing import Any
+from typing import BinaryIO
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# The private inotify API of watchdog is only imported here and only used by InotifyDispatcher and its watchers. A
+# platform or a libc without inotify, or a watchdog release that changed the API, leaves InotifyConstants unset, and
+# the watchdog observer is used instead. The requirements bound the watchdog releases to the ones this API was checked
+# against
+try:
+    from watchdog.observers.inotify_c import DEFAULT_EVENT_BUFFER_SIZE
+    from watchdog.observers.inotify_c import InotifyConstants
+    from watchdog.observers.inotify_c import InotifyEvent
+    from watchdog.observers.inotify_c import inotify_add_watch
+    from watchdog.observers.inotify_c import inotify_init
+    from watchdog.observers.inotify_c import inotify_rm_watch
+except (ImportError, UnsupportedLibcError, OSError):  # pragma: no cover
+    InotifyConstants = None
+
+# Compression formats of the tar file. zstd is only available when the zstandard package is installed
+COMPRESSIONS = ('none', 'gz', 'bz2', 'xz') + (('zstd',) if zstandard is not None else ())
+# Lowest and highest compression level or preset of every compression format. The lowest zstd level is the one of
+# libzstd, which zstandard does not expose
+COMPRESSION_LEVELS = {'gz': (1, 9), 'bz2': (1, 9), 'xz': (0, 9)}
+if zstandard is not None:
+    COMPRESSION_LEVELS['zstd'] = (-(1 << 17), zstandard.MAX_COMPRESSION_LEVEL)
+# Placement strategies of the watches of a recursive symbolic links directory: the whole tree, or only the directories
+# that hold symbolic links, which needs the Linux inotify API
+WATCH_STRATEGIES = ('tree',) + (('symlink-dirs',) if InotifyConstants is not None else ())
+# Magic number at the start of a zstd frame
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+# Magic number at the start of a gzip member
+GZIP_MAGIC = b'\x1f\x8b'
+# Number of uncompressed bytes of every member of a gzip file compressed in parallel
+PARALLEL_GZIP_BLOCK_SIZE = 1 << 20
+# Magic numbers at the start of a bzip2 and an xz stream
+BZIP2_MAGIC = b'BZh'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+# Formats of the archive: tar files, or the native manifest format, which only stores symbolic links
+FORMATS = ('tar', 'manifest')
+# First line of a file in the native manifest format
+MANIFEST_MAGIC = b'cloud-symlinks manifest 1\n'
+# First line of the member index sidecar of an uncompressed tar file, and suffix of its filename
+MEMBER_INDEX_MAGIC = b'cloud-symlinks member index 1\n'
+MEMBER_INDEX_SUFFIX = '.idx'
+# Layouts of the archive: a single tar file, a tar file per top level subdirectory or per hash bucket of the paths,
+# called shards, or a journal of a base snapshot and delta segments, listed by an index file written at the path of the
+# tar file
+SHARDINGS = ('none', 'top', 'hash', 'journal')
+# First line of a shard index file
+SHARD_INDEX_MAGIC = b'cloud-symlinks shard index\n'
+# Key of the pax extended header that marks a member of a journal segment as the removal of the entry it names. A pax
+# header cannot be produced by a symbolic link, whatever its name, so removals are never confused with entries
+WHITEOUT_PAX_HEADER = 'CLOUD_SYMLINKS.whiteout'
+# Infix between the path of the index file and the identifier of a shard in the filename of the shard
+SHARD_INFIX = '.shard-'
+# Header of an inotify event: watch descriptor, mask, cookie and length of the name that follows it
+INOTIFY_EVENT_HEADER = struct.Struct('iIII')
+
+# A manifest maps the relative path of every archived entry to its link target (empty for anything that is not a
+# symbolic link) and its permission bits
+Manifest = Dict[str, Tuple[str, int]]
+# A fingerprint identifies the contents of the tar file by its size, its modification time in nanoseconds and the
+# SHA-256 hash of its contents
+Fingerprint = Tuple[int, int, str]
+# A directory cache maps the relative path of every directory of the tree to its inode, its modification time in
+# nanoseconds and its entries: the link target and permission bits of its symbolic links and None for its directories
+DirectoryCache = Dict[str, Tuple[int, int, Dict[str, Optional[Tuple[str, int]]]]]
+# A directory index maps the relative path of every directory of the tree to its inode, its modification time in
+# nanoseconds, the names of its subdirectories and, when the modification time is too recent to be trusted, its entries:
+# the link target of its symbolic links and None for the other entries
+DirectoryIndex = Dict[str, Tuple[int, int, List[str], Optional[Dict[str, Optional[str]]]]]
+# A member index maps the relative path of every entry of an uncompressed tar file to the offset of its header in the
+# tar file, its link target and its permission bits
+MemberIndex = Dict[str, Tuple[int, str, int]]
+# A shard index holds the layout of a sharded archive, its number of hash buckets and the SHA-256 hash of every shard
+ShardIndex = Tuple[str, int, Dict[str, str]]
+# Directories modified less than this number of nanoseconds before a scan are not cached, because a later change could
+# leave their modification time unchanged on file systems with coarse timestamps
+RACY_MTIME_NS = 1000000000
+# File mode creation mask of the process, which gives the permissions of the new files written through a temporary
+# file. It can only be read by setting it, for every thread of the process, so it is read once on import
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+def scan_symlinks(symlinks_directory: str, recursive: bool,
+                  symlinks_only: bool = False) -> Iterator[Tuple[str, os.DirEntry]]:
+    """
+    Generator of the entries of the symbolic links directory that are stored in the tar file. In recursive mode only the
+    symbolic links of the whole directory tree (including the top level) are yielded, otherwise all the top level
+    entries are yielded, unless only the symbolic links are requested. The directories are read with os.scandir, so the
+    type of each entry comes from the directory entry itself and no extra lstat is needed to find the symbolic links.
+    Nothing is accumulated but the stack of directories pending to be read.
+
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param recursive: True to walk the whole directory tree, False to list only the top level directory entries.
+    :type recursive: bool
+    :param symlinks_only: True to yield only the symbolic links of the top level directory in non-recursive mode.
+    :type symlinks_only: bool
+    :return: Pairs of relative path and directory entry
+    :rtype: Iterator[Tuple[str, os.DirEntry]]
+    """
+    pending = ['']
+    while len(pending) > 0:
+        relative = pending.pop()
+        with os.scandir(os.path.join(symlinks_directory, relative)) as it:
+            for entry in it:
+                name = os.path.join(relative, entry.name)
+                if entry.is_symlink() or (not recursive and not symlinks_only):
+                    yield name, entry
+                elif entry.is_dir(follow_symlinks=False):
+                    pending.append(name)
+
+
+def build_manifest(symlinks_directory: str, recursive: bool, symlinks_only: bool = False) -> Manifest:
+    """
+    Builds the manifest of the entries of the symbolic links directory from their lstat and readlink information. The
+    contents of regular files are not taken into account, so editing them does not change the manifest.
+
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param recursive: True to scan the symbolic links of the whole directory tree, False to scan only the top level
+    directory entries.
+    :type recursive: bool
+    :param symlinks_only: True to scan only the symbolic links of the top level directory in non-recursive mode.
+    :type symlinks_only: bool
+    :return: The manifest of the entries
+    :rtype: Manifest
+    """
+    manifest = dict()
+    for name, entry in scan_symlinks(symlinks_directory, recursive, symlinks_only):
+        st = entry.stat(follow_symlinks=False)
+        target = os.readlink(entry.path) if stat.S_ISLNK(st.st_mode) else ''
+        manifest[name] = (target, stat.S_IMODE(st.st_mode))
+    return manifest
+
+
+def build_manifest_cached(symlinks_directory: str, recursive: bool, symlinks_only: bool = False,
+                          cache: Optional[DirectoryCache] = None) -> Tuple[Manifest, DirectoryCache]:
+    """
+    Builds the manifest of the symbolic links directory reading only the directories that changed since the cache was
+    built. Adding, removing or renaming an entry changes the modification time of its directory, and a symbolic link
+    can only be retargeted by replacing it, so the entries of a directory whose inode and modification time match the
+    cache are taken from the cache without reading it. The cache is only used when the manifest holds nothing but
+    symbolic links, because the permission bits of other entries change without touching their directory.
+
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param recursive: True to scan the symbolic links of the whole directory tree, False to scan only the top level
+    directory entries.
+    :type recursive: bool
+    :param symlinks_only: True to scan only the symbolic links of the top level directory in non-recursive mode.
+    :type symlinks_only: bool
+    :param cache: Directory cache of a previous scan or None to read every directory
+    :type cache: Optional[DirectoryCache]
+    :return: The manifest of the entries and the directory cache of this scan
+    :rtype: Tuple[Manifest, DirectoryCache]
+    """
+    if not recursive and not symlinks_only:
+        return build_manifest(symlinks_directory, recursive, symlinks_only), dict()
+    cache = cache if cache is not None else dict()
+    racy = time.time_ns() - RACY_MTIME_NS
+    manifest = dict()
+    new_cache = dict()
+    pending = ['']
+    while len(pending) > 0:
+        relative = pending.pop()
+        path = os.path.join(symlinks_directory, relative)
+        try:
+            st = os.stat(path, follow_symlinks=False)
+            cached = cache.get(relative)
+            if cached is not None and cached[0] == st.st_ino and cached[1] == st.st_mtime_ns:
+                entries = cached[2]
+            else:
+                entries = dict()
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_symlink():
+                            entries[entry.name] = (os.readlink(entry.path),
+                                                   stat.S_IMODE(entry.stat(follow_symlinks=False).st_mode))
+                        elif recursive and entry.is_dir(follow_symlinks=False):
+                            entries[entry.name] = None
+        except (FileNotFoundError, NotADirectoryError):
+            # A directory removed during the scan, unless it is the top level one
+            if relative == '':
+                raise
+            continue
+        if st.st_mtime_ns < racy:
+            new_cache[relative] = (st.st_ino, st.st_mtime_ns, entries)
+        for name, value in entries.items():
+            if value is None:
+                pending.append(os.path.join(relative, name))
+            else:
+                manifest[os.path.join(relative, name)] = value
+    return manifest, new_cache
+
+
+def poll_directories(symlinks_directory: str, recursive: bool,
+                     index: Optional[DirectoryIndex] = None) -> Tuple[List[str], DirectoryIndex]:
+    """
+    Checks which directories of the symbolic links directory changed since the index was built, with a stat of every
+    directory. Only the changed directories are read, to find their new subdirectories, so an unchanged tree costs a
+    stat per directory. Directories modified too recently to trust their modification time are indexed with their
+    entries, so they are read again on the next poll and only reported if their entries differ.
+
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param recursive: True to check the whole directory tree, False to check only the top level directory.
+    :type recursive: bool
+    :param index: Directory index of a previous poll or None to build it
+    :type index: Optional[DirectoryIndex]
+    :return: The relative paths of the directories that changed, added or removed, and the directory index of this poll
+    :rtype: Tuple[List[str], DirectoryIndex]
+    """
+    index = index if index is not None else dict()
+    racy = time.time_ns() - RACY_MTIME_NS
+    changed = list()
+    new_index = dict()
+    pending = ['']
+    while len(pending) > 0:
+        relative = pending.pop()
+        path = os.path.join(symlinks_directory, relative)
+        try:
+            st = os.stat(path, follow_symlinks=False)
+            indexed = index.get(relative)
+            if (indexed is not None and indexed[0] == st.st_ino and indexed[1] == st.st_mtime_ns and
+                    indexed[3] is None):
+                subdirectories, entries = indexed[2], None
+            else:
+                subdirectories = list()
+                entries = dict()
+                with os.scandir(path) as it:
+                    for entry in it:
+                        entries[entry.name] = os.readlink(entry.path) if entry.is_symlink() else None
+                        if recursive and entry.is_dir(follow_symlinks=False):
+                            subdirectories.append(entry.name)
+                # A directory indexed with its entries only changed if they differ, whatever its modification time
+                if (indexed is None or indexed[0] != st.st_ino or indexed[3] is None or indexed[3] != entries or
+                        sorted(indexed[2]) != sorted(subdirectories)):
+                    changed.append(relative)
+        except (FileNotFoundError, NotADirectoryError):
+            if relative == '':
+                raise
+            continue
+        new_index[relative] = (st.st_ino, st.st_mtime_ns, subdirectories, entries if st.st_mtime_ns >= racy else None)
+        pending.extend(os.path.join(relative, name) for name in subdirectories)
+    changed.extend(index.keys() - new_index.keys())
+    return changed, new_index
+
+
+def update_manifest(manifest: Manifest, symlinks_directory: str, name: str, recursive: bool,
+                    symlinks_only: bool = False, subtree: bool = False) -> List[str]:
+    """
+    Updates in place the entry of a manifest of the symbolic links directory for a single path, reading only that path
+    instead of scanning the whole directory. In recursive mode the entries below the path are also updated when it is
+    flagged as a subtree, which is the case of the directories that are created, deleted or moved.
+
+    :param manifest: Manifest of the symbolic links directory to update
+    :type manifest: Manifest
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param name: Path relative to the symbolic links directory that changed
+    :type name: str
+    :param recursive: True if the manifest holds the symbolic links of the whole directory tree, False if it holds the
+    top level directory entries.
+    :type recursive: bool
+    :param symlinks_only: True if the manifest holds only the symbolic links in non-recursive mode.
+    :type symlinks_only: bool
+    :param subtree: True to update also the entries below the path.
+    :type subtree: bool
+    :return: The names of the entries that were updated
+    :rtype: List[str]
+    """
+    touched = [name]
+    manifest.pop(name, None)
+    if subtree and recursive:
+        prefix = name + '/'
+        for key in [key for key in manifest if key.startswith(prefix)]:
+            del manifest[key]
+            touched.append(key)
+    path = os.path.join(symlinks_directory, name)
+    try:
+        st = os.lstat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return touched
+    if stat.S_ISLNK(st.st_mode) or (not recursive and not symlinks_only):
+        target = os.readlink(path) if stat.S_ISLNK(st.st_mode) else ''
+        manifest[name] = (target, stat.S_IMODE(st.st_mode))
+    elif subtree and recursive and stat.S_ISDIR(st.st_mode):
+        for sub_name, entry in scan_symlinks(path, True):
+            key = os.path.join(name, sub_name)
+            manifest[key] = (os.readlink(entry.path), stat.S_IMODE(entry.stat(follow_symlinks=False).st_mode))
+            touched.append(key)
+    return touched
+
+
+def symlink_tar_info(name: str, target: str, mode: int) -> tarfile.TarInfo:
+    """
+    Builds the tar file header of a symbolic link from its manifest entry, without accessing the file system
+
+    :param name: Relative path of the symbolic link
+    :type name: str
+    :param target: Target of the symbolic link
+    :type target: str
+    :param mode: Permission bits of the symbolic link
+    :type mode: int
+    :return: The header of the symbolic link
+    :rtype: tarfile.TarInfo
+    """
+    info = tarfile.TarInfo(name)
+    info.type = tarfile.SYMTYPE
+    info.linkname = target
+    info.mode = mode
+    info.mtime = int(time.time())
+    info.uid = os.getuid()
+    info.gid = os.getgid()
+    return info
+
+
+def normalize_tar_info(info: tarfile.TarInfo) -> tarfile.TarInfo:
+    """
+    Clears the metadata of a tar file header that depends on the machine or the moment it is written: owner, group
+    and modification time. It can be used as a filter of TarFile.add.
+
+    :param info: Header of a member of the tar file
+    :type info: tarfile.TarInfo
+    :return: The same header with the metadata cleared
+    :rtype: tarfile.TarInfo
+    """
+    info.uid = 0
+    info.gid = 0
+    info.uname = ''
+    info.gname = ''
+    info.mtime = 0
+    return info
+
+
+def member_manifest_entry(member: tarfile.TarInfo, recursive: bool,
+                          symlinks_only: bool = False) -> Optional[Tuple[str, int]]:
+    """
+    Computes the manifest entry of a member of a tar file. Only the members that a scan of the symbolic links directory
+    would report have an entry, so the manifests of the tar file and the directory can be compared.
+
+    :param member: Member of the tar file
+    :type member: tarfile.TarInfo
+    :param recursive: True if the tar file stores the symbolic links of the whole directory tree, False if it stores
+    the top level directory entries.
+    :type recursive: bool
+    :param symlinks_only: True if only the symbolic links are stored in non-recursive mode.
+    :type symlinks_only: bool
+    :return: The link target and permission bits of the member or None if the member is not part of the manifest
+    :rtype: Optional[Tuple[str, int]]
+    """
+    if (recursive or symlinks_only) and not member.issym():
+        return None
+    if not recursive and '/' in member.name:
+        return None
+    return member.linkname if member.issym() else '', stat.S_IMODE(member.mode)
+
+
+def member_name(name: str) -> str:
+    """
+    Normalizes the name of a member of a tar file to the relative path that a scan of the symbolic links directory
+    reports, so the manifests of the tar file and of the directory can be compared. The tar files written with
+    "tar -C directory ." name their members with a leading ./ and hold the directory itself as the member ".", which is
+    not an entry of any manifest.
+
+    :param name: Name of the member
+    :type name: str
+    :return: The normalized name, or "." for the symbolic links directory itself
+    :rtype: str
+    """
+    return os.path.normpath(name)
+
+
+def member_path(root: str, name: str) -> Optional[str]:
+    """
+    Gets the path of an entry of the tar file in the symbolic links directory, checking that it is inside the
+    directory. Besides the name, the directories above the entry are resolved, so a symbolic link of the tar file, or
+    of the directory, cannot redirect the entries below it out of the directory.
+
+    :param root: Absolute path of the directory containing the symbolic links.
+    :type root: str
+    :param name: Path of the entry relative to the symbolic links directory
+    :type name: str
+    :return: The path of the entry, or None if it is outside the symbolic links directory
+    :rtype: Optional[str]
+    """
+    path = os.path.normpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root:
+        return None
+    real_root = os.path.realpath(root)
+    if os.path.commonpath([real_root, os.path.realpath(os.path.dirname(path))]) != real_root:
+        return None
+    return path
+
+
+def replace_symlink(target: str, path: str) -> None:
+    """
+    Points an existing symbolic link to a new target. The new link is created aside and renamed over the old one, so
+    the path never disappears.
+
+    :param target: New target of the symbolic link
+    :type target: str
+    :param path: Path of the symbolic link
+    :type path: str
+    :return: Nothing
+    """
+    temp_path = path + '.cloud_symlinks.tmp'
+    if os.path.lexists(temp_path):
+        os.remove(temp_path)
+    os.symlink(target, temp_path)
+    os.replace(temp_path, path)
+
+
+def is_extracted(path: str, member: tarfile.TarInfo) -> bool:
+    """
+    Checks if a member of the tar file that is not a symbolic link is already present in the symbolic links directory.
+    Regular files are compared by size and modification time.
+
+    :param path: Path of the member in the symbolic links directory
+    :type path: str
+    :param member: Member of the tar file
+    :type member: tarfile.TarInfo
+    :return: True if the member does not need to be extracted, False otherwise
+    :rtype: bool
+    """
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return False
+    if member.isdir():
+        return stat.S_ISDIR(st.st_mode)
+    return stat.S_ISREG(st.st_mode) and st.st_size == member.size and int(st.st_mtime) == member.mtime
+
+
+def extract_tar_file(tar: tarfile.TarFile, symlinks_directory: str, recursive: bool, symlinks_only: bool = False,
+                     on_disk: Optional[Manifest] = None) -> Tuple[Manifest, Dict[str, int]]:
+    """
+    Applies the members of a tar file to the symbolic links directory. Instead of extracting every member, the members
+    are compared with the symbolic links on disk: missing links are created, links pointing to another target are
+    retargeted and links that are not in the tar file are removed. Links that are already up-to-date are not touched.
+    Members that are not symbolic links are extracted only if they are missing or their size or modification time
+    differ, unless only the symbolic links are handled, in which case they are ignored.
+
+    The tar file is read in a single pass, so it can be opened in stream mode ("r|gz") and the symbolic links are
+    written while the members are decoded. The members already applied are dropped and their contents are streamed, so
+    only the manifests of the tar file and of the directory are kept, which hold an entry per archived entry.
+
+    :param tar: Tar file opened for reading
+    :type tar: tarfile.TarFile
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param recursive: True if the tar file stores the symbolic links of the whole directory tree, False if it stores
+    the top level directory entries.
+    :type recursive: bool
+    :param symlinks_only: True to handle only the symbolic links in non-recursive mode.
+    :type symlinks_only: bool
+    :param on_disk: Manifest of the part of the directory the tar file holds, which is consumed. None to scan the
+    whole directory.
+    :type on_disk: Optional[Manifest]
+    :return: The manifest of the tar file and the number of elements of the tar file and of created, retargeted and
+    removed entries
+    :rtype: Tuple[Manifest, Dict[str, int]]
+    """
+    counts = {'elements': 0, 'created': 0, 'retargeted': 0, 'removed': 0}
+    if on_disk is None:
+        on_disk = build_manifest(symlinks_directory, recursive, symlinks_only)
+    manifest = dict()
+    root = os.path.abspath(symlinks_directory)
+    member = tar.next()
+    while member is not None:
+        member.name = member_name(member.name)
+        if member.name == os.curdir:
+            # The symbolic links directory itself
+            tar.members = []
+            member = tar.next()
+            continue
+        counts['elements'] += 1
+        path = member_path(root, member.name)
+        if path is None:
+            raise tarfile.ExtractError("Member {0:} is outside the symbolic links directory.".format(member.name))
+        entry = member_manifest_entry(member, recursive, symlinks_only)
+        if entry is not None:
+            manifest[member.name] = entry
+        current = on_disk.pop(member.name, None)
+        if member.issym():
+            if current is not None and current[0] == member.linkname:
+                pass
+            elif current is not None and current[0] != '':
+                replace_symlink(member.linkname, path)
+                counts['retargeted'] += 1
+            elif os.path.lexists(path):
+                tar.extract(member, symlinks_directory)
+                counts['created'] += 1
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.symlink(member.linkname, path)
+                counts['created'] += 1
+        elif not symlinks_only and not is_extracted(path, member):
+            tar.extract(member, symlinks_directory)
+            counts['created'] += 1
+        # TarFile keeps every member read, even in stream mode
+        tar.members = []
+        member = tar.next()
+    for name, (target, mode) in on_disk.items():
+        if target != '':
+            os.remove(os.path.join(symlinks_directory, name))
+            counts['removed'] += 1
+    return manifest, counts
+
+
+class ParallelGzipWriter:
+    """
+    File object that compresses the data written to it to a multi-member gzip file. The data is cut in blocks of a
+    fixed size that are compressed as independent gzip members on a pool of threads, since zlib releases the GIL while
+    it compresses, and the members are written in order. Any gzip reader decompresses the members as a single stream.
+    The number of blocks compressed or waiting to be written is bounded, so the memory does not grow with the data.
+    The output only depends on the data, the level, the timestamp and the block size, not on the number of threads.
+    """
+
+    def __init__(self, fileobj: BinaryIO, compression_level: int = 9, mtime: Optional[int] = None,
+                 threads: int = 2, block_size: int = PARALLEL_GZIP_BLOCK_SIZE) -> None:
+        """
+        Class creator
+
+        :param fileobj: File object where the gzip members are written. It is not closed with the writer.
+        :type fileobj: BinaryIO
+        :param compression_level: Compression level of the gzip members.
+        :type compression_level: int
+        :param mtime: Modification time stored in the header of every gzip member. None to store the current time.
+        :type mtime: Optional[int]
+        :param threads: Number of threads compressing blocks at the same time.
+        :type threads: int
+        :param block_size: Number of uncompressed bytes of every gzip member.
+        :type block_size: int
+        """
+        self.fileobj = fileobj
+        self.compression_level = compression_level
+        self.mtime = int(time.time()) if mtime is None else mtime
+        self.block_size = block_size
+        self.closed = False
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=threads,
+                                                               thread_name_prefix='ParallelGzipWriter')
+        self._max_pending = 2 * threads
+        # Compressions of the blocks not written yet, in the order of the data
+        self._pending = collections.deque()
+        self._buffer = bytearray()
+        self._members = 0
+
+    def write(self, data: bytes) -> int:
+        """
+        Writes data to the gzip file. Every complete block is sent to the pool of threads.
+
+        :param data: Uncompressed data
+        :type data: bytes
+        :return: The number of bytes written
+        :rtype: int
+        """
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return len(data)
+
+    def close(self) -> None:
+        """
+        Compresses the last partial block, writes the pending members and stops the pool of threads. A gzip file
+        without data still gets an empty member, so it is a valid gzip file.
+
+        :return: Nothing
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if len(self._buffer) > 0 or self._members == 0:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while len(self._pending) > 0:
+                self.fileobj.write(self._pending.popleft().result())
+        finally:
+            for future in self._pending:
+                future.cancel()
+            self._executor.shutdown(wait=True)
+
+    def _submit(self, block: bytes) -> None:
+        """
+        Sends a block to the pool of threads, writing the oldest members first when too many are pending
+
+        :param block: Uncompressed block
+        :type block: bytes
+        :return: Nothing
+        """
+        while len(self._pending) >= self._max_pending:
+            self.fileobj.write(self._pending.popleft().result())
+        self._pending.append(self._executor.submit(gzip.compress, block, self.compression_level, mtime=self.mtime))
+        self._members += 1
+
+
+def check_compression_level(compression: str, compression_level: Optional[int]) -> None:
+    """
+    Checks that a compression level or preset is valid for a compression format, so a wrong level is reported at
+    startup instead of failing every compression. Any level is accepted without compression, which ignores it.
+
+    :param compression: Compression format, one of COMPRESSIONS
+    :type compression: str
+    :param compression_level: Compression level or preset of the format. None for the default one.
+    :type compression_level: Optional[int]
+    :return: Nothing
+    """
+    if compression_level is None or compression not in COMPRESSION_LEVELS:
+        return
+    lowest, highest = COMPRESSION_LEVELS[compression]
+    if not lowest <= compression_level <= highest:
+        raise ValueError("Compression level {0:} of {1:} is not between {2:} and {3:}.".format(
+            compression_level, compression, lowest, highest))
+
+
+def open_compressed_writer(fileobj: BinaryIO, compression: str, compression_level: Optional[int],
+                           mtime: Optional[int] = None, compression_threads: int = 1) -> BinaryIO:
+    """
+    Wraps a binary file object with a compressor of the requested format
+
+    :param fileobj: File object where the compressed data is written
+    :type fileobj: BinaryIO
+    :param compression: Compression format, one of COMPRESSIONS
+    :type compression: str
+    :param compression_level: Compression level or preset of the format. None for the default one.
+    :type compression_level: Optional[int]
+    :param mtime: Modification time stored in the gzip header. None to store the current time.
+    :type mtime: Optional[int]
+    :param compression_threads: Number of threads compressing a gzip file in parallel, as a multi-member gzip file.
+    1 to compress it in a single stream.
+    :type compression_threads: int
+    :return: The file object where the uncompressed data has to be written
+    :rtype: BinaryIO
+    """
+    if compression == 'none':
+        return fileobj
+    if compression == 'gz' and compression_threads > 1:
+        return ParallelGzipWriter(fileobj, 9 if compression_level is None else compression_level, mtime,
+                                  compression_threads)
+    if compression == 'gz':
+        return gzip.GzipFile(filename='', mode='wb', fileobj=fileobj,
+                             compresslevel=9 if compression_level is None else compression_level, mtime=mtime)
+    if compression == 'bz2':
+        return bz2.BZ2File(fileobj, mode='wb', compresslevel=9 if compression_level is None else compression_level)
+    if compression == 'xz':
+        return lzma.LZMAFile(fileobj, mode='wb', preset=compression_level)
+    if compression == 'zstd' and zstandard is not None:
+        return zstandard.ZstdCompressor(level=3 if compression_level is None else compression_level).stream_writer(
+            fileobj, closefd=False)
+    raise ValueError("Unsupported compression {0:}.".format(compression))
+
+
+@contextlib.contextmanager
+def open_atomic_writer(filename: str) -> Iterator[BinaryIO]:
+    """
+    Context manager that opens a temporary file next to a file for writing. When the context is left the temporary
+    file is flushed to disk and renamed over the file, keeping its permissions, so readers only ever see the old or
+    the new complete file. If an error happens the temporary file is removed and the file is left untouched.
+
+    :param filename: Path of the file
+    :type filename: str
+    :return: The temporary file opened for writing
+    :rtype: Iterator[BinaryIO]
+    """
+    fd, temp_filename = tempfile.mkstemp(prefix='.' + os.path.basename(filename) + '.', suffix='.tmp',
+                                         dir=os.path.dirname(os.path.abspath(filename)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(filename):
+            os.chmod(temp_filename, stat.S_IMODE(os.stat(filename).st_mode))
+        else:
+            os.chmod(temp_filename, 0o666 & ~UMASK)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
+
+
+@contextlib.contextmanager
+def open_tar_writer(tar_filename: str, compression: str = 'gz', compression_level: Optional[int] = None,
+                    deterministic: bool = False, compression_threads: int = 1) -> Iterator[tarfile.TarFile]:
+    """
+    Context manager that opens a tar file for writing in stream mode with the requested compression. The data is
+    written through an atomic writer. When the context is left the tar file and the compressor are closed in order
+    before the temporary file is renamed over the tar file, so readers only ever see the old or the new complete tar
+    file. If an error happens the tar file is left untouched.
+
+    :param tar_filename: Path with the filename of the tar file where the symbolic links are stored.
+    :type tar_filename: str
+    :param compression: Compression format, one of COMPRESSIONS
+    :type compression: str
+    :param compression_level: Compression level or preset of the format. None for the default one.
+    :type compression_level: Optional[int]
+    :param deterministic: True to write a zero timestamp in the header of the compressed file.
+    :type deterministic: bool
+    :param compression_threads: Number of threads compressing a gzip tar file in parallel.
+    :type compression_threads: int
+    :return: The tar file opened for writing
+    :rtype: Iterator[tarfile.TarFile]
+    """
+    with open_atomic_writer(tar_filename) as f:
+        compressed = open_compressed_writer(f, compression, compression_level, 0 if deterministic else None,
+                                            compression_threads)
+        try:
+            # The pax format carries the extended headers that mark the whiteouts of the journal segments
+            with tarfile.open(fileobj=compressed, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+                yield tar
+        finally:
+            if compressed is not f:
+                compressed.close()
+
+
+@contextlib.contextmanager
+def open_decompressed_reader(filename: str) -> Iterator[BinaryIO]:
+    """
+    Context manager that opens a file for reading its decompressed contents. The compression format is detected from
+    the contents of the file, and files that are not compressed are read as they are.
+
+    :param filename: Path of the file
+    :type filename: str
+    :return: The decompressed contents opened for reading
+    :rtype: Iterator[BinaryIO]
+    """
+    with open(filename, 'rb') as f:
+        magic = f.read(max(len(ZSTD_MAGIC), len(XZ_MAGIC)))
+        f.seek(0)
+        if magic.startswith(ZSTD_MAGIC):
+            if zstandard is None:
+                raise tarfile.ReadError("File {0:} is compressed with zstd, but zstandard is not "
+                                        "installed.".format(filename))
+            with zstandard.ZstdDecompressor().stream_reader(f, closefd=False) as decompressed:
+                yield decompressed
+        elif magic.startswith(GZIP_MAGIC):
+            with gzip.GzipFile(fileobj=f, mode='rb') as decompressed:
+                yield decompressed
+        elif magic.startswith(BZIP2_MAGIC):
+            with bz2.BZ2File(f, mode='rb') as decompressed:
+                yield decompressed
+        elif magic.startswith(XZ_MAGIC):
+            with lzma.LZMAFile(f, mode='rb') as decompressed:
+                yield decompressed
+        else:
+            yield f
+
+
+@contextlib.contextmanager
+def open_tar_reader(tar_filename: str) -> Iterator[tarfile.TarFile]:
+    """
+    Context manager that opens a tar file for reading in stream mode. The compression format is detected from the
+    contents of the file.
+
+    :param tar_filename: Path with the filename of the tar file where the symbolic links are stored.
+    :type tar_filename: str
+    :return: The tar file opened for reading
+    :rtype: Iterator[tarfile.TarFile]
+    """
+    with open_decompressed_reader(tar_filename) as decompressed:
+        with tarfile.open(fileobj=decompressed, mode='r|') as tar:
+            yield tar
+
+
+def write_tar_file(tar_filename: str, symlinks_directory: str, manifest: Manifest, compression: str = 'gz',
+                   compression_level: Optional[int] = None, deterministic: bool = False,
+                   compression_threads: int = 1) -> Dict[str, int]:
+    """
+    Writes the entries of a manifest to the tar file. The symbolic links are written from their manifest entry, the
+    rest of entries are read from the symbolic links directory.
+
+    In deterministic mode the entries are written sorted by name, their owner, group and modification time are cleared
+    and the timestamp of the compressed file header is zeroed, so the same manifest always produces the same bytes.
+
+    :param tar_filename: Path with the filename of the tar file where the symbolic links are stored.
+    :type tar_filename: str
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param manifest: The manifest of the entries to store
+    :type manifest: Manifest
+    :param compression: Compression format, one of COMPRESSIONS
+    :type compression: str
+    :param compression_level: Compression level or preset of the format. None for the default one.
+    :type compression_level: Optional[int]
+    :param deterministic: True to write a byte-reproducible tar file.
+    :type deterministic: bool
+    :param compression_threads: Number of threads compressing a gzip tar file in parallel.
+    :type compression_threads: int
+    :return: The offset of the header of every entry in the uncompressed tar file
+    :rtype: Dict[str, int]
+    """
+    names = sorted(manifest) if deterministic else manifest
+    offsets = dict()
+    with open_tar_writer(tar_filename, compression, compression_level, deterministic, compression_threads) as tar:
+        for name in names:
+            offsets[name] = tar.offset
+            target, mode = manifest[name]
+            if target != '':
+                info = symlink_tar_info(name, target, mode)
+                tar.addfile(normalize_tar_info(info) if deterministic else info)
+            else:
+                tar.add(os.path.join(symlinks_directory, name), arcname=name,
+                        filter=normalize_tar_info if deterministic else None)
+    return offsets
+
+
+def write_manifest_file(filename: str, manifest: Manifest, compression: str = 'gz',
+                        compression_level: Optional[int] = None, deterministic: bool = False,
+                        compression_threads: int = 1) -> None:
+    """
+    Writes a manifest in the native format: MANIFEST_MAGIC followed by a record per symbolic link made of its path,
+    its target and its permission bits in octal, each one terminated by a NUL byte, which cannot be part of a path or
+    a link target. A symbolic link costs the length of its path and target instead of a 512 bytes tar header, but
+    only symbolic links can be stored. The file is written atomically.
+
+    :param filename: Path of the file
+    :type filename: str
+    :param manifest: The manifest of the symbolic links to store
+    :type manifest: Manifest
+    :param compression: Compression format, one of COMPRESSIONS
+    :type compression: str
+    :param compression_level: Compression level or preset of the format. None for the default one.
+    :type compression_level: Optional[int]
+    :param deterministic: True to write the records sorted by path and a zero timestamp in the compressed file header.
+    :type deterministic: bool
+    :param compression_threads: Number of threads compressing a gzip file in parallel.
+    :type compression_threads: int
+    :return: Nothing
+    """
+    names = sorted(manifest) if deterministic else manifest
+    with open_atomic_writer(filename) as f:
+        compressed = open_compressed_writer(f, compression, compression_level, 0 if deterministic else None,
+                                            compression_threads)
+        try:
+            compressed.write(MANIFEST_MAGIC)
+            records = list()
+            for name in names:
+                target, mode = manifest[name]
+                if target == '':
+                    raise ValueError("Entry {0:} is not a symbolic link. The manifest format only stores symbolic "
+                                     "links.".format(name))
+                records.append(b'%s\0%s\0%o\0' % (os.fsencode(name), os.fsencode(target), mode))
+                # The records are written in batches, as every write call costs a call to the compressor
+                if len(records) == 4096:
+                    compressed.write(b''.join(records))
+                    records.clear()
+            compressed.write(b''.join(records))
+        finally:
+            if compressed is not f:
+                compressed.close()
+
+
+def read_manifest_file(filename: str) -> Manifest:
+    """
+    Reads a file in the native manifest format, whatever its compression. The file is read in chunks, so only the
+    manifest is held in memory.
+
+    :param filename: Path of the file
+    :type filename: str
+    :return: The manifest of the symbolic links stored in the file
+    :rtype: Manifest
+    """
+    manifest = dict()
+    with open_decompressed_reader(filename) as f:
+        if f.read(len(MANIFEST_MAGIC)) != MANIFEST_MAGIC:
+            raise ValueError("File {0:} is not in the manifest format.".format(filename))
+        fields = list()
+        rest = b''
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            fields.extend((rest + chunk).split(b'\0'))
+            rest = fields.pop()
+            complete = len(fields) - len(fields) % 3
+            for name, target, mode in zip(fields[0:complete:3], fields[1:complete:3], fields[2:complete:3]):
+                manifest[os.fsdecode(name)] = (os.fsdecode(target), int(mode, 8))
+            del fields[:complete]
+        if len(fields) > 0 or rest != b'':
+            raise ValueError("File {0:} is truncated.".format(filename))
+    return manifest
+
+
+def is_manifest_file(filename: str) -> bool:
+    """
+    Checks if a file is in the native manifest format instead of a tar file, whatever its compression
+
+    :param filename: Path of the file
+    :type filename: str
+    :return: True if the file is in the manifest format, False otherwise
+    :rtype: bool
+    """
+    with open_decompressed_reader(filename) as f:
+        return f.read(len(MANIFEST_MAGIC)) == MANIFEST_MAGIC
+
+
+def apply_manifest(manifest: Manifest, symlinks_directory: str, recursive: bool, symlinks_only: bool = False,
+                   on_disk: Optional[Manifest] = None) -> Dict[str, int]:
+    """
+    Applies a manifest of symbolic links to the symbolic links directory, the same way extract_tar_file applies a tar
+    file: missing links are created, links pointing to another target are retargeted, links that are not in the
+    manifest are removed and links that are already up-to-date are not touched.
+
+    :param manifest: The manifest of the symbolic links
+    :type manifest: Manifest
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param recursive: True if the manifest holds the symbolic links of the whole directory tree, False if it holds
+    the top level directory entries.
+    :type recursive: bool
+    :param symlinks_only: True to handle only the symbolic links in non-recursive mode.
+    :type symlinks_only: bool
+    :param on_disk: Manifest of the part of the directory the manifest holds, which is consumed. None to scan the
+    whole directory.
+    :type on_disk: Optional[Manifest]
+    :return: The number of elements of the manifest and of created, retargeted and removed entries
+    :rtype: Dict[str, int]
+    """
+    counts = {'elements': len(manifest), 'created': 0, 'retargeted': 0, 'removed': 0}
+    if on_disk is None:
+        on_disk = build_manifest(symlinks_directory, recursive, symlinks_only)
+    root = os.path.abspath(symlinks_directory)
+    for name, (target, mode) in manifest.items():
+        name = member_name(name)
+        path = member_path(root, name)
+        if path is None or path == root:
+            raise ValueError("Entry {0:} is outside the symbolic links directory.".format(name))
+        current = on_disk.pop(name, None)
+        if current is not None and current[0] == target:
+            pass
+        elif current is not None and current[0] != '':
+            replace_symlink(target, path)
+            counts['retargeted'] += 1
+        elif os.path.lexists(path):
+            replace_symlink(target, path)
+            counts['created'] += 1
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.symlink(target, path)
+            counts['created'] += 1
+    for name, (target, mode) in on_disk.items():
+        if target != '':
+            os.remove(os.path.join(symlinks_directory, name))
+            counts['removed'] += 1
+    return counts
+
+
+def write_archive(filename: str, symlinks_directory: str, manifest: Manifest, archive_format: str = 'tar',
+                  compression: str = 'gz', compression_level: Optional[int] = None,
+                  deterministic: bool = False, compression_threads: int = 1) -> None:
+    """
+    Writes the entries of a manifest to a file in the requested format
+
+    :param filename: Path of the file
+    :type filename: str
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param manifest: The manifest of the entries to store
+    :type manifest: Manifest
+    :param archive_format: Format of the file, one of FORMATS
+    :type archive_format: str
+    :param compression: Compression format, one of COMPRESSIONS
+    :type compression: str
+    :param compression_level: Compression level or preset of the format. None for the default one.
+    :type compression_level: Optional[int]
+    :param deterministic: True to write a byte-reproducible file.
+    :type deterministic: bool
+    :param compression_threads: Number of threads compressing a gzip file in parallel.
+    :type compression_threads: int
+    :return: Nothing
+    """
+    if archive_format == 'manifest':
+        write_manifest_file(filename, manifest, compression, compression_level, deterministic, compression_threads)
+    else:
+        write_tar_file(filename, symlinks_directory, manifest, compression, compression_level, deterministic,
+                       compression_threads)
+
+
+def extract_archive(filename: str, symlinks_directory: str, recursive: bool, symlinks_only: bool = False,
+                    on_disk: Optional[Manifest] = None) -> Tuple[Manifest, Dict[str, int]]:
+    """
+    Applies a file in any of the FORMATS to the symbolic links directory, detecting its format from its contents
+
+    :param filename: Path of the file
+    :type filename: str
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param recursive: True if the file stores the symbolic links of the whole directory tree, False if it stores the
+    top level directory entries.
+    :type recursive: bool
+    :param symlinks_only: True to handle only the symbolic links in non-recursive mode.
+    :type symlinks_only: bool
+    :param on_disk: Manifest of the part of the directory the file holds, which is consumed. None to scan the whole
+    directory.
+    :type on_disk: Optional[Manifest]
+    :return: The manifest of the file and the number of elements of the file and of created, retargeted and removed
+    entries
+    :rtype: Tuple[Manifest, Dict[str, int]]
+    """
+    if is_manifest_file(filename):
+        manifest = read_manifest_file(filename)
+        return manifest, apply_manifest(manifest, symlinks_directory, recursive, symlinks_only, on_disk)
+    with open_tar_reader(filename) as tar:
+        manifest, counts = extract_tar_file(tar, symlinks_directory, recursive, symlinks_only, on_disk)
+        tar.close()
+    return manifest, counts
+
+
+def read_archive_manifest(filename: str) -> Manifest:
+    """
+    Reads the manifest of the symbolic links of a file in any of the FORMATS, without touching the file system
+
+    :param filename: Path of the file
+    :type filename: str
+    :return: The manifest of the symbolic links of the file
+    :rtype: Manifest
+    """
+    if is_manifest_file(filename):
+        return read_manifest_file(filename)
+    manifest = dict()
+    with open_tar_reader(filename) as tar:
+        member = tar.next()
+        while member is not None:
+            name = member_name(member.name)
+            if name == os.curdir:
+                pass
+            elif not member.issym():
+                raise ValueError("Member {0:} of {1:} is not a symbolic link.".format(member.name, filename))
+            else:
+                manifest[name] = (member.linkname, stat.S_IMODE(member.mode))
+            tar.members = []
+            member = tar.next()
+        tar.close()
+    return manifest
+
+
+def convert_archive(source: str, destination: str, archive_format: str = 'manifest', compression: str = 'gz',
+                    compression_level: Optional[int] = None, deterministic: bool = False,
+                    compression_threads: int = 1) -> int:
+    """
+    Converts a file holding only symbolic links to another format or compression
+
+    :param source: Path of the file to convert, in any of the FORMATS
+    :type source: str
+    :param destination: Path of the converted file
+    :type destination: str
+    :param archive_format: Format of the converted file, one of FORMATS
+    :type archive_format: str
+    :param compression: Compression format of the converted file, one of COMPRESSIONS
+    :type compression: str
+    :param compression_level: Compression level or preset of the format. None for the default one.
+    :type compression_level: Optional[int]
+    :param deterministic: True to write a byte-reproducible file.
+    :type deterministic: bool
+    :param compression_threads: Number of threads compressing a gzip file in parallel.
+    :type compression_threads: int
+    :return: The number of symbolic links converted
+    :rtype: int
+    """
+    manifest = read_archive_manifest(source)
+    write_archive(destination, os.path.dirname(os.path.abspath(destination)), manifest, archive_format, compression,
+                  compression_level, deterministic, compression_threads)
+    return len(manifest)
+
+
+def write_member_index(tar_filename: str, digest: str, index: MemberIndex) -> None:
+    """
+    Writes the member index sidecar of an uncompressed tar file: MEMBER_INDEX_MAGIC, the SHA-256 hash of the tar file
+    it describes on a line, and a record per entry made of its path, the offset of its header in the tar file, its
+    link target and its permission bits in octal, each one terminated by a NUL byte. The file is written atomically.
+
+    :param tar_filename: Path with the filename of the tar file
+    :type tar_filename: str
+    :param digest: SHA-256 hash of the tar file
+    :type digest: str
+    :param index: The member index of the tar file
+    :type index: MemberIndex
+    :return: Nothing
+    """
+    with open_atomic_writer(tar_filename + MEMBER_INDEX_SUFFIX) as f:
+        f.write(MEMBER_INDEX_MAGIC + digest.encode('ascii') + b'\n')
+        f.write(b''.join(b'%s\0%d\0%s\0%o\0' % (os.fsencode(name), offset, os.fsencode(target), mode)
+                         for name, (offset, target, mode) in index.items()))
+
+
+def load_member_index(tar_filename: str, digest: str) -> Optional[MemberIndex]:
+    """
+    Loads the member index sidecar of an uncompressed tar file, if it describes the current contents of the tar file
+
+    :param tar_filename: Path with the filename of the tar file
+    :type tar_filename: str
+    :param digest: SHA-256 hash of the tar file
+    :type digest: str
+    :return: The member index or None if there is no sidecar or it describes other contents
+    :rtype: Optional[MemberIndex]
+    """
+    try:
+        with open(tar_filename + MEMBER_INDEX_SUFFIX, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    header = MEMBER_INDEX_MAGIC + digest.encode('ascii') + b'\n'
+    if not data.startswith(header):
+        return None
+    fields = data[len(header):].split(b'\0')
+    if len(fields) % 4 != 1 or fields[-1] != b'':
+        return None
+    return {os.fsdecode(name): (int(offset), os.fsdecode(target), int(mode, 8))
+            for name, offset, target, mode in zip(fields[0::4], fields[1::4], fields[2::4], fields[3::4])}
+
+
+def extract_members(tar_filename: str, symlinks_directory: str, index: MemberIndex, manifest: Manifest,
+                    recursive: bool, symlinks_only: bool = False) -> Tuple[Manifest, Dict[str, int]]:
+    """
+    Applies an uncompressed tar file to the symbolic links directory reading only the members that changed. The
+    member index is compared with the manifest of the tar file applied last, the tar file is mapped in memory and the
+    header of every changed member is read at its offset. The symbolic links that left the tar file are removed.
+    Nothing else of the tar file or the directory is read.
+
+    :param tar_filename: Path with the filename of the uncompressed tar file
+    :type tar_filename: str
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param index: The member index of the tar file
+    :type index: MemberIndex
+    :param manifest: The manifest of the tar file applied last
+    :type manifest: Manifest
+    :param recursive: True if the tar file stores the symbolic links of the whole directory tree, False if it stores
+    the top level directory entries.
+    :type recursive: bool
+    :param symlinks_only: True to handle only the symbolic links in non-recursive mode.
+    :type symlinks_only: bool
+    :return: The manifest of the tar file and the number of changed members and of created, retargeted and removed
+    entries
+    :rtype: Tuple[Manifest, Dict[str, int]]
+    """
+    changed = [name for name, (offset, target, mode) in index.items() if manifest.get(name) != (target, mode)]
+    removed = manifest.keys() - index.keys()
+    counts = {'elements': len(changed), 'created': 0, 'retargeted': 0, 'removed': 0}
+    result = dict(manifest)
+    root = os.path.abspath(symlinks_directory)
+    if len(changed) > 0:
+        with open(tar_filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with tarfile.open(fileobj=mapped, mode='r:') as tar:
+                for name in changed:
+                    mapped.seek(index[name][0])
+                    member = tarfile.TarInfo.fromtarfile(tar)
+                    if member_name(member.name) != name:
+                        raise tarfile.ReadError("Member {0:} is not at its indexed offset.".format(name))
+                    path = member_path(root, name)
+                    if path is None or path == root:
+                        raise tarfile.ExtractError("Member {0:} is outside the symbolic links "
+                                                   "directory.".format(name))
+                    if member.issym():
+                        if os.path.islink(path):
+                            replace_symlink(member.linkname, path)
+                            counts['retargeted'] += 1
+                        elif os.path.lexists(path):
+                            tar.extract(member, symlinks_directory)
+                            counts['created'] += 1
+                        else:
+                            os.makedirs(os.path.dirname(path), exist_ok=True)
+                            os.symlink(member.linkname, path)
+                            counts['created'] += 1
+                    elif not symlinks_only and not is_extracted(path, member):
+                        tar.extract(member, symlinks_directory)
+                        counts['created'] += 1
+                    entry = member_manifest_entry(member, recursive, symlinks_only)
+                    if entry is not None:
+                        result[name] = entry
+                tar.close()
+    for name in removed:
+        del result[name]
+        if manifest[name][0] != '' and os.path.islink(os.path.join(symlinks_directory, name)):
+            os.remove(os.path.join(symlinks_directory, name))
+            counts['removed'] += 1
+    return result, counts
+
+
+def verify_gzip_file(filename: str) -> bool:
+    """
+    Checks that a gzip file is complete, decompressing every member and checking the CRC-32 and ISIZE of its trailer,
+    without parsing the tar file it holds. Like gzip and tarfile, the NUL bytes padding the file after a member are
+    ignored. Files that are not gzip files are not checked.
+
+    :param filename: Path of the file
+    :type filename: str
+    :return: True if the file is a complete gzip file or not a gzip file, False if it is truncated or corrupt
+    :rtype: bool
+    """
+    with open(filename, 'rb') as f:
+        if f.read(2) != GZIP_MAGIC:
+            return True
+        f.seek(0)
+        decompressor = None
+        complete = False
+        try:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                while chunk:
+                    if decompressor is None and complete:
+                        # Zero padding after a complete member
+                        chunk = chunk.lstrip(b'\0')
+                        if not chunk:
+                            break
+                    if decompressor is None:
+                        # With wbits 31 zlib reads the gzip header and checks the trailer of the member
+                        decompressor = zlib.decompressobj(wbits=31)
+                    decompressor.decompress(chunk)
+                    complete = decompressor.eof
+                    if complete:
+                        # Next member of a multi-member gzip file
+                        chunk = decompressor.unused_data
+                        decompressor = None
+                    else:
+                        chunk = b''
+        except zlib.error:
+            return False
+    return complete
+
+
+def hash_file(filename: str) -> str:
+    """
+    Computes the SHA-256 hash of a file reading it in chunks, so the memory used does not depend on its size
+
+    :param filename: Path of the file
+    :type filename: str
+    :return: The hexadecimal digest of the file
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+        f.close()
+    return digest.hexdigest()
+
+
+def fingerprint_tar_file(tar_filename: str, previous: Optional[Fingerprint] = None) -> Fingerprint:
+    """
+    Computes the fingerprint of the tar file. The contents are only hashed when the size or the modification time
+    differ from the previous fingerprint, otherwise the previous fingerprint is returned.
+
+    :param tar_filename: Path with the filename of the tar file where the symbolic links are stored.
+    :type tar_filename: str
+    :param previous: Previous fingerprint of the tar file or None if it is unknown
+    :type previous: Optional[Fingerprint]
+    :return: The fingerprint of the tar file
+    :rtype: Fingerprint
+    """
+    st = os.stat(tar_filename)
+    if previous is not None and previous[0] == st.st_size and previous[1] == st.st_mtime_ns:
+        return previous
+    return st.st_size, st.st_mtime_ns, hash_file(tar_filename)
+
+
+def format_fingerprint(fingerprint: Fingerprint) -> str:
+    """
+    Formats a fingerprint in a readable way, as stored by the former ini configuration file. The value starts with the
+    modification time, with nanoseconds, followed by the size and the hash separated by semicolons.
+
+    :param fingerprint: Fingerprint of the tar file
+    :type fingerprint: Fingerprint
+    :return: The fingerprint as a string
+    :rtype: str
+    """
+    size, mtime_ns, digest = fingerprint
+    mtime = datetime.datetime.utcfromtimestamp(mtime_ns // 1000000000).strftime('%Y-%m-%d %H:%M:%S')
+    return '{0:}.{1:09d};{2:};{3:}'.format(mtime, mtime_ns % 1000000000, size, digest)
+
+
+def parse_fingerprint(value: str) -> Optional[Fingerprint]:
+    """
+    Parses a fingerprint formatted by format_fingerprint
+
+    :param value: The fingerprint as a string
+    :type value: str
+    :return: The fingerprint or None if the value is a legacy entry holding only the modification time in seconds
+    :rtype: Optional[Fingerprint]
+    """
+    try:
+        timestamp, size, digest = value.split(';')
+        mtime, nanoseconds = timestamp.split('.')
+        seconds = (datetime.datetime.strptime(mtime, '%Y-%m-%d %H:%M:%S') - datetime.datetime(1970, 1, 1))
+        return int(size), int(seconds.total_seconds()) * 1000000000 + int(nanoseconds), digest
+    except ValueError:
+        return None
+
+
+def shard_key(name: str, sharding: str, shard_count: int) -> str:
+    """
+    Computes the key of the shard holding a manifest entry: its top level subdirectory, empty for the top level
+    entries, or its hash bucket
+
+    :param name: Relative path of the entry
+    :type name: str
+    :param sharding: Layout of the archive, one of SHARDINGS other than none
+    :type sharding: str
+    :param shard_count: Number of hash buckets
+    :type shard_count: int
+    :return: The key of the shard
+    :rtype: str
+    """
+    if sharding == 'top':
+        return name.split(os.sep, 1)[0] if os.sep in name else ''
+    digest = hashlib.sha256(name.encode('utf-8', 'surrogateescape')).digest()
+    return str(int.from_bytes(digest[:4], 'big') % shard_count)
+
+
+def shard_filename(tar_filename: str, sharding: str, shard_count: int, key: str) -> str:
+    """
+    Computes the filename of a shard, next to the index file. The filename is derived from a hash of the layout and
+    the key, so it is valid whatever the name of the subdirectory and the shards of two layouts never collide.
+
+    :param tar_filename: Path with the filename of the index file
+    :type tar_filename: str
+    :param sharding: Layout of the archive, one of SHARDINGS other than none
+    :type sharding: str
+    :param shard_count: Number of hash buckets
+    :type shard_count: int
+    :param key: Key of the shard
+    :type key: str
+    :return: The path with the filename of the shard
+    :rtype: str
+    """
+    identifier = '{0:}:{1:}:{2:}'.format(sharding, shard_count, key).encode('utf-8', 'surrogateescape')
+    return tar_filename + SHARD_INFIX + hashlib.sha256(identifier).hexdigest()[:16]
+
+
+def is_shard_index(filename: str) -> bool:
+    """
+    Checks if a file is a shard index instead of a tar file
+
+    :param filename: Path of the file
+    :type filename: str
+    :return: True if the file is a shard index, False otherwise
+    :rtype: bool
+    """
+    with open(filename, 'rb') as f:
+        return f.read(len(SHARD_INDEX_MAGIC)) == SHARD_INDEX_MAGIC
+
+
+def read_shard_index(tar_filename: str) -> ShardIndex:
+    """
+    Reads a shard index file
+
+    :param tar_filename: Path with the filename of the index file
+    :type tar_filename: str
+    :return: The shard index
+    :rtype: ShardIndex
+    """
+    with open(tar_filename, 'rb') as f:
+        if f.read(len(SHARD_INDEX_MAGIC)) != SHARD_INDEX_MAGIC:
+            raise ValueError("File {0:} is not a shard index.".format(tar_filename))
+        index = json.loads(f.read().decode('utf-8'))
+    return index['sharding'], index['shard_count'], index['shards']
+
+
+def write_shard_index(tar_filename: str, index: ShardIndex) -> None:
+    """
+    Writes a shard index file atomically. The shards are sorted, so the same index always produces the same bytes.
+
+    :param tar_filename: Path with the filename of the index file
+    :type tar_filename: str
+    :param index: The shard index
+    :type index: ShardIndex
+    :return: Nothing
+    """
+    sharding, shard_count, shards = index
+    with open_atomic_writer(tar_filename) as f:
+        f.write(SHARD_INDEX_MAGIC)
+        f.write(json.dumps({'sharding': sharding, 'shard_count': shard_count, 'shards': shards}, sort_keys=True,
+                           indent=0).encode('utf-8'))
+
+
+def partition_manifest(manifest: Manifest, sharding: str, shard_count: int,
+                       keys: Optional[Set[str]] = None) -> Dict[str, Manifest]:
+    """
+    Splits a manifest by shard
+
+    :param manifest: The manifest to split
+    :type manifest: Manifest
+    :param sharding: Layout of the archive, one of SHARDINGS other than none
+    :type sharding: str
+    :param shard_count: Number of hash buckets
+    :type shard_count: int
+    :param keys: Keys of the shards to keep. None to keep all of them.
+    :type keys: Optional[Set[str]]
+    :return: The manifest of every shard with entries
+    :rtype: Dict[str, Manifest]
+    """
+    parts = dict()
+    for name, entry in manifest.items():
+        key = shard_key(name, sharding, shard_count)
+        if keys is None or key in keys:
+            parts.setdefault(key, dict())[name] = entry
+    return parts
+
+
+def scan_shards(symlinks_directory: str, recursive: bool, symlinks_only: bool, sharding: str, shard_count: int,
+                keys: Optional[Set[str]] = None) -> Dict[str, Manifest]:
+    """
+    Builds the manifest of the entries of the symbolic links directory split by shard. With a shard per top level
+    subdirectory in recursive mode only the subdirectories of the requested shards are scanned, otherwise the whole
+    directory is.
+
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param recursive: True to scan the symbolic links of the whole directory tree, False to scan only the top level
+    directory entries.
+    :type recursive: bool
+    :param symlinks_only: True to scan only the symbolic links of the top level directory in non-recursive mode.
+    :type symlinks_only: bool
+    :param sharding: Layout of the archive, one of SHARDINGS other than none
+    :type sharding: str
+    :param shard_count: Number of hash buckets
+    :type shard_count: int
+    :param keys: Keys of the shards to scan. None to scan all of them.
+    :type keys: Optional[Set[str]]
+    :return: The manifest of every scanned shard with entries
+    :rtype: Dict[str, Manifest]
+    """
+    if sharding != 'top' or not recursive or keys is None:
+        return partition_manifest(build_manifest(symlinks_directory, recursive, symlinks_only), sharding,
+                                  shard_count, keys)
+    parts = dict()
+    for key in keys:
+        if key == '':
+            with os.scandir(symlinks_directory) as it:
+                part = {entry.name: (os.readlink(entry.path), stat.S_IMODE(entry.stat(follow_symlinks=False).st_mode))
+                        for entry in it if entry.is_symlink()}
+        else:
+            path = os.path.join(symlinks_directory, key)
+            if not os.path.isdir(path) or os.path.islink(path):
+                continue
+            part = {os.path.join(key, name): entry for name, entry in build_manifest(path, True).items()}
+        if len(part) > 0:
+            parts[key] = part
+    return parts
+
+
+def write_shards(tar_filename: str, symlinks_directory: str, manifest: Manifest, changed: Optional[Set[str]],
+                 sharding: str, shard_count: int, compression: str = 'gz', compression_level: Optional[int] = None,
+                 deterministic: bool = False, previous: Optional[ShardIndex] = None,
+                 archive_format: str = 'tar') -> ShardIndex:
+    """
+    Writes the entries of a manifest as a sharded archive. Only the shards holding a changed entry are written, then
+    the index file is replaced and the shards left without entries are removed, so a reader that follows the index
+    always finds complete shards. Every shard is written when the previous index is unknown or has another layout.
+
+    :param tar_filename: Path with the filename of the index file
+    :type tar_filename: str
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param manifest: The manifest of the entries to store
+    :type manifest: Manifest
+    :param changed: Names of the entries that changed since the previous index was written. None if unknown.
+    :type changed: Optional[Set[str]]
+    :param sharding: Layout of the archive, one of SHARDINGS other than none
+    :type sharding: str
+    :param shard_count: Number of hash buckets
+    :type shard_count: int
+    :param compression: Compression format of the shards, one of COMPRESSIONS
+    :type compression: str
+    :param compression_level: Compression level or preset of the format. None for the default one.
+    :type compression_level: Optional[int]
+    :param deterministic: True to write byte-reproducible shards.
+    :type deterministic: bool
+    :param previous: The index written or extracted last. None if unknown.
+    :type previous: Optional[ShardIndex]
+    :param archive_format: Format of the shards, one of FORMATS
+    :type archive_format: str
+    :return: The written shard index
+    :rtype: ShardIndex
+    """
+    if previous is None or changed is None or previous[:2] != (sharding, shard_count):
+        keys = None
+        shards = dict()
+    else:
+        keys = {shard_key(name, sharding, shard_count) for name in changed}
+        shards = dict(previous[2])
+    parts = partition_manifest(manifest, sharding, shard_count, keys)
+    for key in (parts.keys() if keys is None else keys):
+        if key in parts:
+            filename = shard_filename(tar_filename, sharding, shard_count, key)
+            write_archive(filename, symlinks_directory, parts[key], archive_format, compression, compression_level,
+                          deterministic)
+            shards[key] = hash_file(filename)
+        else:
+            shards.pop(key, None)
+    index = (sharding, shard_count, shards)
+    write_shard_index(tar_filename, index)
+    if previous is not None:
+        for key in previous[2]:
+            if previous[:2] != (sharding, shard_count) or key not in shards:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(shard_filename(tar_filename, previous[0], previous[1], key))
+    return index
+
+
+def extract_shards(tar_filename: str, symlinks_directory: str, recursive: bool, symlinks_only: bool = False,
+                   applied: Optional[ShardIndex] = None,
+                   manifest: Optional[Manifest] = None) -> Tuple[Manifest, Dict[str, int], ShardIndex]:
+    """
+    Applies a sharded archive to the symbolic links directory. Only the shards whose hash differs from the index
+    applied last are extracted, and only their part of the directory is compared with them. The links of the shards
+    that left the index are removed. Every shard is checked against the hash of the index before any is extracted, so
+    an index that arrived before its shards is not applied partially. Journals are applied by extract_journal.
+
+    :param tar_filename: Path with the filename of the index file
+    :type tar_filename: str
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param recursive: True if the archive stores the symbolic links of the whole directory tree, False if it stores
+    the top level directory entries.
+    :type recursive: bool
+    :param symlinks_only: True to handle only the symbolic links in non-recursive mode.
+    :type symlinks_only: bool
+    :param applied: The index written or extracted last. None to extract every shard.
+    :type applied: Optional[ShardIndex]
+    :param manifest: The manifest of the archive for the applied index. None to extract every shard.
+    :type manifest: Optional[Manifest]
+    :return: The manifest of the archive, the number of elements of the extracted shards and of created, retargeted
+    and removed entries, and the extracted index
+    :rtype: Tuple[Manifest, Dict[str, int], ShardIndex]
+    """
+    index = read_shard_index(tar_filename)
+    sharding, shard_count, shards = index
+    if sharding == 'journal':
+        return extract_journal(tar_filename, symlinks_directory, recursive, symlinks_only, applied, manifest)
+    if applied is None or manifest is None or applied[:2] != index[:2]:
+        changed = set(shards)
+        keys = None
+        result = dict()
+    else:
+        changed = {key for key, digest in shards.items() if applied[2].get(key) != digest}
+        keys = changed | (applied[2].keys() - shards.keys())
+        result = {name: entry for name, entry in manifest.items()
+                  if shard_key(name, sharding, shard_count) not in keys}
+    for key in changed:
+        filename = shard_filename(tar_filename, sharding, shard_count, key)
+        if not os.path.isfile(filename) or hash_file(filename) != shards[key]:
+            raise tarfile.ReadError("Shard {0:} does not match the index {1:}.".format(filename, tar_filename))
+    on_disk = scan_shards(symlinks_directory, recursive, symlinks_only, sharding, shard_count, keys)
+    counts = {'elements': 0, 'created': 0, 'retargeted': 0, 'removed': 0}
+    for key in sorted(changed):
+        part, part_counts = extract_archive(shard_filename(tar_filename, sharding, shard_count, key),
+                                            symlinks_directory, recursive, symlinks_only, on_disk.pop(key, dict()))
+        result.update(part)
+        for name, count in part_counts.items():
+            counts[name] += count
+    # What is left on disk belongs to shards that are no longer in the index
+    for part in on_disk.values():
+        for name, (target, mode) in part.items():
+            if target != '':
+                os.remove(os.path.join(symlinks_directory, name))
+                counts['removed'] += 1
+    return result, counts, index
+
+
+def apply_tar_delta(tar: tarfile.TarFile, symlinks_directory: str, recursive: bool,
+                    symlinks_only: bool = False) -> Tuple[Manifest, Set[str], Dict[str, int]]:
+    """
+    Applies a journal segment to the symbolic links directory. Unlike a full extraction, only the entries named by the
+    segment are touched: its members are created or retargeted and its whiteouts, empty members named after a removed
+    entry and marked by the WHITEOUT_PAX_HEADER extended header, remove the symbolic links they name.
+
+    :param tar: Tar file of the segment opened for reading
+    :type tar: tarfile.TarFile
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param recursive: True if the archive stores the symbolic links of the whole directory tree, False if it stores
+    the top level directory entries.
+    :type recursive: bool
+    :param symlinks_only: True to handle only the symbolic links in non-recursive mode.
+    :type symlinks_only: bool
+    :return: The manifest entries of the members of the segment, the names of the removed entries and the number of
+    elements of the segment and of created, retargeted and removed entries
+    :rtype: Tuple[Manifest, Set[str], Dict[str, int]]
+    """
+    counts = {'elements': 0, 'created': 0, 'retargeted': 0, 'removed': 0}
+    changed = dict()
+    removed = set()
+    root = os.path.abspath(symlinks_directory)
+    member = tar.next()
+    while member is not None:
+        member.name = name = member_name(member.name)
+        if name == os.curdir:
+            # The symbolic links directory itself
+            tar.members = []
+            member = tar.next()
+            continue
+        counts['elements'] += 1
+        whiteout = member.pax_headers.get(WHITEOUT_PAX_HEADER) == '1'
+        path = member_path(root, name)
+        if path is None or path == root:
+            raise tarfile.ExtractError("Member {0:} is outside the symbolic links directory.".format(member.name))
+        if whiteout:
+            removed.add(name)
+            changed.pop(name, None)
+            if os.path.islink(path):
+                os.remove(path)
+                counts['removed'] += 1
+        else:
+            removed.discard(name)
+            entry = member_manifest_entry(member, recursive, symlinks_only)
+            if entry is not None:
+                changed[name] = entry
+            if member.issym():
+                if os.path.islink(path):
+                    if os.readlink(path) != member.linkname:
+                        replace_symlink(member.linkname, path)
+                        counts['retargeted'] += 1
+                elif os.path.lexists(path):
+                    tar.extract(member, symlinks_directory)
+                    counts['created'] += 1
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.symlink(member.linkname, path)
+                    counts['created'] += 1
+            elif not symlinks_only and not is_extracted(path, member):
+                tar.extract(member, symlinks_directory)
+                counts['created'] += 1
+        # TarFile keeps every member read, even in stream mode
+        tar.members = []
+        member = tar.next()
+    return changed, removed, counts
+
+
+def write_journal(tar_filename: str, symlinks_directory: str, manifest: Manifest, changed: Optional[Set[str]],
+                  compression: str = 'gz', compression_level: Optional[int] = None, deterministic: bool = False,
+                  previous: Optional[ShardIndex] = None, max_segments: int = 32,
+                  archive_format: str = 'tar') -> ShardIndex:
+    """
+    Writes the changes of a manifest to a journal. The journal is a base snapshot holding every entry followed by
+    segments holding the changed entries and a whiteout for every removed one, all listed by the index file in the
+    order they have to be applied. Only a segment with the changed entries is appended, unless the journal is
+    compacted: a new base snapshot replaces the base and the segments when the number of segments reaches the maximum,
+    when the segments together are larger than the base or when the previous journal is unknown.
+
+    :param tar_filename: Path with the filename of the index file
+    :type tar_filename: str
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param manifest: The manifest of the entries to store
+    :type manifest: Manifest
+    :param changed: Names of the entries that changed since the previous index was written. None if unknown.
+    :type changed: Optional[Set[str]]
+    :param compression: Compression format of the base and the segments, one of COMPRESSIONS
+    :type compression: str
+    :param compression_level: Compression level or preset of the format. None for the default one.
+    :type compression_level: Optional[int]
+    :param deterministic: True to write byte-reproducible base snapshots and segments.
+    :type deterministic: bool
+    :param previous: The index written or extracted last. None if unknown.
+    :type previous: Optional[ShardIndex]
+    :param max_segments: Number of segments that triggers a compaction.
+    :type max_segments: int
+    :param archive_format: Format of the base snapshot, one of FORMATS. The segments are always tar files, which can
+    hold the whiteouts.
+    :type archive_format: str
+    :return: The written index
+    :rtype: ShardIndex
+    """
+    keys = sorted(previous[2]) if previous is not None and previous[:2] == ('journal', 0) else []
+    key = '{0:010d}'.format(int(keys[-1]) + 1 if len(keys) > 0 else 1)
+    filename = shard_filename(tar_filename, 'journal', 0, key)
+    compact = changed is None or len(keys) == 0 or len(keys) > max_segments
+    if not compact:
+        try:
+            sizes = [os.stat(shard_filename(tar_filename, 'journal', 0, other)).st_size for other in keys]
+            compact = sum(sizes[1:]) > sizes[0]
+        except FileNotFoundError:
+            compact = True
+    if compact:
+        write_archive(filename, symlinks_directory, manifest, archive_format, compression, compression_level,
+                      deterministic)
+        shards = {key: hash_file(filename)}
+    else:
+        names = sorted(changed) if deterministic else changed
+        with open_tar_writer(filename, compression, compression_level, deterministic) as tar:
+            for name in names:
+                if name not in manifest:
+                    info = tarfile.TarInfo(name)
+                    info.pax_headers = {WHITEOUT_PAX_HEADER: '1'}
+                    info.mtime = int(time.time())
+                    tar.addfile(normalize_tar_info(info) if deterministic else info)
+                elif manifest[name][0] != '':
+                    info = symlink_tar_info(name, manifest[name][0], manifest[name][1])
+                    tar.addfile(normalize_tar_info(info) if deterministic else info)
+                else:
+                    tar.add(os.path.join(symlinks_directory, name), arcname=name,
+                            filter=normalize_tar_info if deterministic else None)
+        shards = dict(previous[2])
+        shards[key] = hash_file(filename)
+    index = ('journal', 0, shards)
+    write_shard_index(tar_filename, index)
+    if previous is not None:
+        for other in previous[2]:
+            if previous[:2] != index[:2] or other not in shards:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(shard_filename(tar_filename, previous[0], previous[1], other))
+    return index
+
+
+def extract_journal(tar_filename: str, symlinks_directory: str, recursive: bool, symlinks_only: bool = False,
+                    applied: Optional[ShardIndex] = None,
+                    manifest: Optional[Manifest] = None) -> Tuple[Manifest, Dict[str, int], ShardIndex]:
+    """
+    Applies a journal to the symbolic links directory. When the base snapshot and the segments applied last are still
+    in the journal only the segments appended since are replayed, otherwise the base snapshot is extracted and every
+    segment is replayed. Every file to apply is checked against the hash of the index before any is applied.
+
+    :param tar_filename: Path with the filename of the index file
+    :type tar_filename: str
+    :param symlinks_directory: Path of the directory containing the symbolic links.
+    :type symlinks_directory: str
+    :param recursive: True if the archive stores the symbolic links of the whole directory tree, False if it stores
+    the top level directory entries.
+    :type recursive: bool
+    :param symlinks_only: True to handle only the symbolic links in non-recursive mode.
+    :type symlinks_only: bool
+    :param applied: The index written or extracted last. None to extract the whole journal.
+    :type applied: Optional[ShardIndex]
+    :param manifest: The manifest of the archive for the applied index. None to extract the whole journal.
+    :type manifest: Optional[Manifest]
+    :return: The manifest of the archive, the number of elements of the applied files and of created, retargeted and
+    removed entries, and the extracted index
+    :rtype: Tuple[Manifest, Dict[str, int], ShardIndex]
+    """
+    index = read_shard_index(tar_filename)
+    keys = sorted(index[2])
+    if (applied is None or manifest is None or applied[:2] != index[:2] or
+            any(index[2].get(key) != digest for key, digest in applied[2].items()) or keys[0] not in applied[2]):
+        replay = keys
+        result = dict()
+    else:
+        replay = [key for key in keys if key not in applied[2]]
+        result = dict(manifest)
+    for key in replay:
+        filename = shard_filename(tar_filename, 'journal', 0, key)
+        if not os.path.isfile(filename) or hash_file(filename) != index[2][key]:
+            raise tarfile.ReadError("Segment {0:} does not match the index {1:}.".format(filename, tar_filename))
+    counts = {'elements': 0, 'created': 0, 'retargeted': 0, 'removed': 0}
+    for key in replay:
+        filename = shard_filename(tar_filename, 'journal', 0, key)
+        if key == keys[0]:
+            result, part_counts = extract_archive(filename, symlinks_directory, recursive, symlinks_only)
+        else:
+            with open_tar_reader(filename) as tar:
+                changed, removed, part_counts = apply_tar_delta(tar, symlinks_directory, recursive, symlinks_only)
+                tar.close()
+            result.update(changed)
+            for name in removed:
+                result.pop(name, None)
+        for name, count in part_counts.items():
+            counts[name] += count
+    return result, counts, index
+
+
+class StateStore:
+    """
+    Transactional store of the state of the tar files, backed by a sqlite database in WAL mode and keyed by the path
+    of the tar file. For every tar file it keeps its fingerprint, the manifest of the symbolic links it holds, the
+    directory cache of the last scan of its symbolic links directory and, for sharded archives, the shard index last
+    written or extracted. The manifests and directory caches are updated with their differences from the previous ones,
+    so only the changed links and directories are written.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS archives (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime_ns INTEGER,
+            sha256 TEXT,
+            has_manifest INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS links (
+            archive TEXT NOT NULL,
+            path TEXT NOT NULL,
+            target TEXT NOT NULL,
+            mode INTEGER NOT NULL,
+            PRIMARY KEY (archive, path)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS directories (
+            archive TEXT NOT NULL,
+            path TEXT NOT NULL,
+            inode INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            PRIMARY KEY (archive, path)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS directory_entries (
+            archive TEXT NOT NULL,
+            directory TEXT NOT NULL,
+            name TEXT NOT NULL,
+            target TEXT,
+            mode INTEGER,
+            PRIMARY KEY (archive, directory, name)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS shard_indexes (
+            archive TEXT PRIMARY KEY,
+            sharding TEXT NOT NULL,
+            shard_count INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS shards (
+            archive TEXT NOT NULL,
+            shard TEXT NOT NULL,
+            sha256 TEXT NOT NULL,
+            PRIMARY KEY (archive, shard)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, state_filename: str) -> None:
+        """
+        Class creator. Opens the database, creating it if it does not exist.
+
+        :param state_filename: Path of the sqlite database holding the state.
+        :type state_filename: str
+        """
+        self.state_filename = state_filename
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(state_filename, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.executescript(self.SCHEMA)
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Context manager that serializes the access to the database between threads and runs the statements in a single
+        transaction, that is rolled back if an error happens
+
+        :return: The connection to the database
+        :rtype: Iterator[sqlite3.Connection]
+        """
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._connection
+            except BaseException:
+                self._connection.execute('ROLLBACK')
+                raise
+            self._connection.execute('COMMIT')
+
+    def close(self) -> None:
+        """
+        Closes the database
+
+        :return: Nothing
+        """
+        with self._lock:
+            self._connection.close()
+
+    def load_fingerprint(self, tar_filename: str) -> Optional[Fingerprint]:
+        """
+        Loads the stored fingerprint of a tar file
+
+        :param tar_filename: Path with the filename of the tar file where the symbolic links are stored.
+        :type tar_filename: str
+        :return: The fingerprint or None if there is no stored fingerprint
+        :rtype: Optional[Fingerprint]
+        """
+        with self._transaction() as connection:
+            row = connection.execute('SELECT size, mtime_ns, sha256 FROM archives WHERE path = ?',
+                                     (tar_filename,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return row[0], row[1], row[2]
+
+    def save_fingerprint(self, tar_filename: str, fingerprint: Fingerprint) -> None:
+        """
+        Stores the fingerprint of a tar file
+
+        :param tar_filename: Path with the filename of the tar file where the symbolic links are stored.
+        :type tar_filename: str
+        :param fingerprint: Fingerprint of the tar file
+        :type fingerprint: Fingerprint
+        :return: Nothing
+        """
+        with self._transaction() as connection:
+            connection.execute('INSERT INTO archives (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?) '
+                               'ON CONFLICT (path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, '
+                               'sha256 = excluded.sha256', (tar_filename,) + tuple(fingerprint))
+
+    def load_manifest(self, tar_filename: str) -> Optional[Manifest]:
+        """
+        Loads the stored manifest of a tar file
+
+        :param tar_filename: Path with the filename of the tar file where the symbolic links are stored.
+        :type tar_filename: str
+        :return: The manifest or None if there is no stored manifest
+        :rtype: Optional[Manifest]
+        """
+        with self._transaction() as connection:
+            row = connection.execute('SELECT has_manifest FROM archives WHERE path = ?', (tar_filename,)).fetchone()
+            if row is None or not row[0]:
+                return None
+            return {path: (target, mode) for path, target, mode in
+                    connection.execute('SELECT path, target, mode FROM links WHERE archive = ?', (tar_filename,))}
+
+    def save_manifest(self, tar_filename: str, manifest: Manifest, previous: Optional[Manifest] = None) -> None:
+        """
+        Stores the manifest of a tar file. If the previously stored manifest is given, only the entries that differ
+        from it are written, otherwise the whole manifest is replaced.
+
+        :param tar_filename: Path with the filename of the tar file where the symbolic links are stored.
+        :type tar_filename: str
+        :param manifest: The manifest of the tar file
+        :type manifest: Manifest
+        :param previous: The manifest currently stored or None to replace the whole manifest
+        :type previous: Optional[Manifest]
+        :return: Nothing
+        """
+        if previous is None:
+            removed = None
+            changed = manifest.items()
+        else:
+            removed = [(tar_filename, path) for path in previous.keys() - manifest.keys()]
+            changed = [(path, entry) for path, entry in manifest.items() if previous.get(path) != entry]
+        with self._transaction() as connection:
+            connection.execute('INSERT INTO archives (path, has_manifest) VALUES (?, 1) '
+                               'ON CONFLICT (path) DO UPDATE SET has_manifest = 1', (tar_filename,))
+            if removed is None:
+                connection.execute('DELETE FROM links WHERE archive = ?', (tar_filename,))
+            else:
+                connection.executemany('DELETE FROM links WHERE archive = ? AND path = ?', removed)
+            connection.executemany('INSERT OR REPLACE INTO links (archive, path, target, mode) VALUES (?, ?, ?, ?)',
+                                   ((tar_filename, path, target, mode) for path, (target, mode) in changed))
+
+    def load_directory_cache(self, tar_filename: str) -> DirectoryCache:
+        """
+        Loads the stored directory cache of the symbolic links directory of a tar file
+
+        :param tar_filename: Path with the filename of the tar file where the symbolic links are stored.
+        :type tar_filename: str
+        :return: The directory cache, empty if there is no stored cache
+        :rtype: DirectoryCache
+        """
+        with self._transaction() as connection:
+            cache = {path: (inode, mtime_ns, dict()) for path, inode, mtime_ns in
+                     connection.execute('SELECT path, inode, mtime_ns FROM directories WHERE archive = ?',
+                                        (tar_filename,))}
+            for directory, name, target, mode in connection.execute(
+                    'SELECT directory, name, target, mode FROM directory_entries WHERE archive = ?', (tar_filename,)):
+                cache[directory][2][name] = None if target is None else (target, mode)
+        return cache
+
+    def save_directory_cache(self, tar_filename: str, cache: DirectoryCache,
+                             previous: Optional[DirectoryCache] = None) -> None:
+        """
+        Stores the directory cache of the symbolic links directory of a tar file. If the previously stored cache is
+        given, only the directories that differ from it are written, otherwise the whole cache is replaced.
+
+        :param tar_filename: Path with the filename of the tar file where the symbolic links are stored.
+        :type tar_filename: str
+        :param cache: The directory cache
+        :type cache: DirectoryCache
+        :param previous: The directory cache currently stored or None to replace the whole cache
+        :type previous: Optional[DirectoryCache]
+        :return: Nothing
+        """
+        if previous is None:
+            removed = None
+            changed = cache.items()
+        else:
+            changed = [(path, value) for path, value in cache.items() if previous.get(path) != value]
+            removed = [(tar_filename, path) for path in previous.keys() - cache.keys()]
+            removed.extend((tar_filename, path) for path, value in changed if path in previous)
+        with self._transaction() as connection:
+            if removed is None:
+                connection.execute('DELETE FROM directories WHERE archive = ?', (tar_filename,))
+                connection.execute('DELETE FROM directory_entries WHERE archive = ?', (tar_filename,))
+            else:
+                connection.executemany('DELETE FROM directories WHERE archive = ? AND path = ?', removed)
+                connection.executemany('DELETE FROM directory_entries WHERE archive = ? AND directory = ?', removed)
+            connection.executemany('INSERT INTO directories (archive, path, inode, mtime_ns) VALUES (?, ?, ?, ?)',
+                                   ((tar_filename, path, inode, mtime_ns) for path, (inode, mtime_ns, _) in changed))
+            connection.executemany('INSERT INTO directory_entries (archive, directory, name, target, mode) '
+                                   'VALUES (?, ?, ?, ?, ?)',
+                                   ((tar_filename, path, name) + (entry if entry is not None else (None, None))
+                                    for path, (_, _, entries) in changed for name, entry in entries.items()))
+
+    def load_shard_index(self, tar_filename: str) -> Optional[ShardIndex]:
+        """
+        Loads the stored shard index of a sharded archive
+
+        :param tar_filename: Path with the filename of the index file
+        :type tar_filename: str
+        :return: The shard index or None if there is no stored index
+        :rtype: Optional[ShardIndex]
+        """
+        with self._transaction() as connection:
+            row = connection.execute('SELECT sharding, shard_count FROM shard_indexes WHERE archive = ?',
+                                     (tar_filename,)).fetchone()
+            if row is None:
+                return None
+            return row[0], row[1], {shard: sha256 for shard, sha256 in
+                                    connection.execute('SELECT shard, sha256 FROM shards WHERE archive = ?',
+                                                       (tar_filename,))}
+
+    def save_shard_index(self, tar_filename: str, index: Optional[ShardIndex]) -> None:
+        """
+        Stores the shard index of a sharded archive, replacing the stored one
+
+        :param tar_filename: Path with the filename of the index file
+        :type tar_filename: str
+        :param index: The shard index. None to remove the stored index.
+        :type index: Optional[ShardIndex]
+        :return: Nothing
+        """
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM shard_indexes WHERE archive = ?', (tar_filename,))
+            connection.execute('DELETE FROM shards WHERE archive = ?', (tar_filename,))
+            if index is not None:
+                connection.execute('INSERT INTO shard_indexes (archive, sharding, shard_count) VALUES (?, ?, ?)',
+                                   (tar_filename, index[0], index[1]))
+                connection.executemany('INSERT INTO shards (archive, shard, sha256) VALUES (?, ?, ?)',
+                                       ((tar_filename, shard, sha256) for shard, sha256 in index[2].items()))
+
+    def import_config_file(self, config_filename: str, tar_filenames: List[str],
+                           log: Optional[logging.Logger] = None) -> None:
+        """
+        Imports the fingerprints of the legacy ini configuration file, for the configured tar files that have no
+        fingerprint in the store. The ini file lowercased the paths of the tar files, so every configured path is
+        looked up without case and stored with its real case. Entries that only hold the modification time in seconds
+        are stored with an unknown size and an empty hash. Entries that cannot be parsed are skipped.
+
+        :param config_filename: Path of the legacy ini configuration file
+        :type config_filename: str
+        :param tar_filenames: Paths of the configured tar files
+        :type tar_filenames: List[str]
+        :param log: Logger to write the entries that cannot be parsed. None to skip them silently.
+        :type log: Optional[logging.Logger]
+        :return: Nothing
+        """
+        config = configparser.ConfigParser()
+        config.read(config_filename)
+        if 'main' not in config.sections():
+            return
+        for tar_filename in tar_filenames:
+            value = config['main'].get(tar_filename)
+            if value is None or self.load_fingerprint(tar_filename) is not None:
+                continue
+            fingerprint = parse_fingerprint(value)
+            if fingerprint is None:
+                try:
+                    seconds = datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S') - datetime.datetime(1970, 1, 1)
+                except ValueError:
+                    if log is not None:
+                        log.warning("Skipped the legacy state {0:} of tar file {1:}.".format(value, tar_filename))
+                    continue
+                fingerprint = (-1, int(seconds.total_seconds()) * 1000000000, '')
+            self.save_fingerprint(tar_filename, fingerprint)
+
+
+def start_event_loop(name: str) -> Tuple[asyncio.AbstractEventLoop, threading.Thread]:
+    """
+    Creates an asyncio event loop and runs it in a daemon thread of its own
+
+    :param name: Name of the thread
+    :type name: str
+    :return: The event loop and the thread running it
+    :rtype: Tuple[asyncio.AbstractEventLoop, threading.Thread]
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name=name, daemon=True)
+    thread.start()
+    return loop, thread
+
+
+def call_in_loop(loop: asyncio.AbstractEventLoop, callback: Callable, *args: Any) -> None:
+    """
+    Calls a function in the thread of an event loop: right away if it is called from that thread, otherwise in the next
+    iteration of the loop
+
+    :param loop: The event loop
+    :type loop: asyncio.AbstractEventLoop
+    :param callback: Function to call
+    :type callback: Callable
+    :param args: Arguments of the function
+    :type args: Any
+    :return: Nothing
+    """
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        callback(*args)
+    else:
+        loop.call_soon_threadsafe(callback, *args)
+
+
+class DebounceScheduler:
+    """
+    Scheduler that debounces bursts of events on an asyncio event loop. The events are pushed from any thread into an
+    asyncio queue and every key runs its callback, from a loop timer, once no new event has arrived for the quiet
+    window or once the maximum latency has passed since the first pending event, so a steady stream of events is still
+    flushed. The callbacks are run in the thread of the loop and must not block, so the number of threads does not
+    depend on the number of events.
+    """
+
+    def __init__(self, quiet_window: float = 0.5, max_latency: float = 5.0, log: Optional[logging.Logger] = None,
+                 loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Class creator. Without an event loop, the scheduler starts a loop of its own when the first callback is
+        scheduled.
+
+        :param quiet_window: Seconds without events before the callback of a key is run.
+        :type quiet_window: float
+        :param max_latency: Maximum seconds between the first pending event of a key and the run of its callback.
+        :type max_latency: float
+        :param log: Logger to write the errors raised by the callbacks.
+        :type log: Optional[logging.Logger]
+        :param loop: Event loop where the events are debounced. None to use a loop of its own.
+        :type loop: Optional[asyncio.AbstractEventLoop]
+        """
+        self.quiet_window = quiet_window
+        self.max_latency = max_latency
+        self.log = log
+        self._loop = loop
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._queue = asyncio.Queue()
+        self._consumer = None
+        # Pending tasks by key: loop time of the first event, timer, callback and its arguments
+        self._tasks = dict()
+        self._stopped = False
+
+    def schedule(self, key: Any, callback: Callable, *args: Any) -> None:
+        """
+        Schedules the run of a callback for a key, postponing the run already scheduled for the same key. The callback
+        is called with the arguments of the last schedule. It can be called from any thread.
+
+        :param key: Key that identifies the task, usually the object that schedules it
+        :type key: Any
+        :param callback: Function to call
+        :type callback: Callable
+        :param args: Arguments of the function
+        :type args: Any
+        :return: Nothing
+        """
+        self._put(key, callback, args, None)
+
+    def schedule_later(self, key: Any, delay: float, callback: Callable, *args: Any) -> None:
+        """
+        Schedules the run of a callback for a key after a fixed delay, without debouncing. The run already scheduled
+        for the same key is replaced, and a later schedule of the key replaces this one. It can be called from any
+        thread.
+
+        :param key: Key that identifies the task, usually the object that schedules it
+        :type key: Any
+        :param delay: Seconds before the callback is run
+        :type delay: float
+        :param callback: Function to call
+        :type callback: Callable
+        :param args: Arguments of the function
+        :type args: Any
+        :return: Nothing
+        """
+        self._put(key, callback, args, delay)
+
+    def _put(self, key: Any, callback: Callable, args: Tuple, delay: Optional[float]) -> None:
+        """
+        Pushes a task into the queue of events, starting the event loop and the consumer of the queue if needed
+
+        :param key: Key that identifies the task
+        :type key: Any
+        :param callback: Function to call
+        :type callback: Callable
+        :param args: Arguments of the function
+        :type args: Tuple
+        :param delay: Seconds before the callback is run. None to debounce it.
+        :type delay: Optional[float]
+        :return: Nothing
+        """
+        with self._start_lock:
+            if self._stopped:
+                return
+            if self._loop is None:
+                self._loop, self._thread = start_event_loop('DebounceScheduler')
+            if self._consumer is None:
+                self._consumer = True
+                call_in_loop(self._loop, self._start_consumer)
+        call_in_loop(self._loop, self._queue.put_nowait, (key, callback, args, delay))
+
+    def stop(self) -> None:
+        """
+        Stops the scheduler. The pending callbacks are discarded.
+
+        :return: Nothing
+        """
+        with self._start_lock:
+            self._stopped = True
+        if self._thread is not None:
+            asyncio.run_coroutine_threadsafe(self._close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+        elif self._loop is not None:
+            call_in_loop(self._loop, self._cancel)
+
+    def _start_consumer(self) -> None:
+        """
+        Starts the task that consumes the queue of events
+
+        :return: Nothing
+        """
+        self._consumer = self._loop.create_task(self._consume())
+
+    async def _consume(self) -> None:
+        """
+        Task that consumes the queue of events, arming the timer of the key of every event
+
+        :return: Nothing
+        """
+        while True:
+            key, callback, args, delay = await self._queue.get()
+            if self._stopped:
+                continue
+            now = self._loop.time()
+            task = self._tasks.get(key)
+            if task is not None:
+                task[1].cancel()
+            if delay is not None:
+                first = now
+                deadline = now + delay
+            else:
+                first = now if task is None else task[0]
+                deadline = min(now + self.quiet_window, first + self.max_latency)
+            self._tasks[key] = (first, self._loop.call_at(deadline, self._fire, key), callback, args)
+
+    def _fire(self, key: Any) -> None:
+        """
+        Runs the callback of a key whose timer expired
+
+        :param key: Key that identifies the task
+        :type key: Any
+        :return: Nothing
+        """
+        first, timer, callback, args = self._tasks.pop(key)
+        try:
+            callback(*args)
+        except Exception as xcpt:
+            if self.log is not None:
+                self.log.error("Error running scheduled task. Exception: {0:}.".format(str(xcpt)))
+
+    def _cancel(self) -> None:
+        """
+        Cancels the timers of the pending tasks and the consumer of the queue of events
+
+        :return: Nothing
+        """
+        for first, timer, callback, args in self._tasks.values():
+            timer.cancel()
+        self._tasks.clear()
+        if isinstance(self._consumer, asyncio.Task):
+            self._consumer.cancel()
+
+    async def _close(self) -> None:
+        """
+        Cancels the pending tasks and waits for the consumer of the queue of events to finish
+
+        :return: Nothing
+        """
+        self._cancel()
+        if isinstance(self._consumer, asyncio.Task):
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._consumer
+
+
+class SyncEngine:
+    """
+    Engine that runs the synchronizations of the archives on an asyncio event loop, sending their blocking work to a
+    bounded pool of worker threads. At most one synchronization of an archive runs at a time. The synchronizations
+    requested while another one of the same archive is running mark the archive as dirty and are run once, with the
+    arguments of the last request, when the running one finishes. Compressions and extractions of the same archive
+    therefore never overlap, whatever the timing of the events. The bookkeeping is only touched from the thread of the
+    loop, so it needs no locks.
+    """
+
+    def __init__(self, max_workers: int = 2, log: Optional[logging.Logger] = None,
+                 loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Class creator. Without an event loop, the engine starts a loop of its own when the first synchronization is
+        requested.
+
+        :param max_workers: Maximum number of archives synchronized at the same time.
+        :type max_workers: int
+        :param log: Logger to write the errors raised by the synchronizations.
+        :type log: Optional[logging.Logger]
+        :param loop: Event loop where the synchronizations are coordinated. None to use a loop of its own.
+        :type loop: Optional[asyncio.AbstractEventLoop]
+        """
+        self.log = log
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='SyncEngine')
+        self._loop = loop
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # Archives with a running synchronization, and the tasks running them
+        self._running = set()
+        self._tasks = set()
+        # Synchronizations requested while the archive was running, by archive and callback
+        self._dirty = dict()
+        self._stopped = False
+
+    def submit(self, key: Any, callback: Callable, *args: Any) -> None:
+        """
+        Requests the synchronization of an archive. It is run right away in the pool if the archive is idle, otherwise
+        the archive is marked as dirty and the synchronization is run after the running one. It can be called from any
+        thread.
+
+        :param key: Key that identifies the archive, usually the absolute path of the tar file
+        :type key: Any
+        :param callback: Function that synchronizes the archive
+        :type callback: Callable
+        :param args: Arguments of the function
+        :type args: Any
+        :return: Nothing
+        """
+        with self._start_lock:
+            if self._stopped:
+                return
+            if self._loop is None:
+                self._loop, self._thread = start_event_loop('SyncEngine')
+        call_in_loop(self._loop, self._submit, key, callback, args)
+
+    def stop(self) -> None:
+        """
+        Stops the engine, waiting for the running synchronizations. The dirty archives are not synchronized again.
+
+        :return: Nothing
+        """
+        with self._start_lock:
+            self._stopped = True
+        self._executor.shutdown(wait=True)
+        if self._thread is not None:
+            asyncio.run_coroutine_threadsafe(self._drain(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+
+    def _submit(self, key: Any, callback: Callable, args: Tuple) -> None:
+        """
+        Starts the synchronization of an archive or marks it as dirty if it is running
+
+        :param key: Key that identifies the archive
+        :type key: Any
+        :param callback: Function that synchronizes the archive
+        :type callback: Callable
+        :param args: Arguments of the function
+        :type args: Tuple
+        :return: Nothing
+        """
+        if self._stopped:
+            return
+        if key in self._running:
+            self._dirty.setdefault(key, dict())[callback] = args
+            return
+        self._running.add(key)
+        task = self._loop.create_task(self._run(key, callback, args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Any, callback: Callable, args: Tuple) -> None:
+        """
+        Body of a synchronization. It runs the requested callback in the pool and then, while the archive is dirty, the
+        callbacks requested meanwhile.
+
+        :param key: Key that identifies the archive
+        :type key: Any
+        :param callback: Function that synchronizes the archive
+        :type callback: Callable
+        :param args: Arguments of the function
+        :type args: Tuple
+        :return: Nothing
+        """
+        try:
+            while not self._stopped:
+                try:
+                    await self._loop.run_in_executor(self._executor, functools.partial(callback, *args))
+                except Exception as xcpt:
+                    if self.log is not None:
+                        self.log.error("Error synchronizing {0:}. Exception: {1:}.".format(str(key), str(xcpt)))
+                dirty = self._dirty.get(key)
+                if not dirty:
+                    break
+                callback = next(iter(dirty))
+                args = dirty.pop(callback)
+        finally:
+            self._dirty.pop(key, None)
+            self._running.discard(key)
+
+    async def _drain(self) -> None:
+        """
+        Waits for the tasks of the running synchronizations to finish
+
+        :return: Nothing
+        """
+        await asyncio.gather(*self._tasks, return_exceptions=True)
 
 
 class SymLinksEventHandler(FileSystemEventHandler):
     """
-    TODO: Change ini file when the compression is finished
+    Handler of the changes in the symbolic links directory. It compresses the directory to the tar file and stores the
+    fingerprint and manifest of the written tar file in the state store. The handler keeps an index with the manifest
+    of the directory, updated from the paths named by the events, so finding out whether the directory changed costs
+    in proportion to the events instead of to the directory tree. The directory is only scanned the first time and when
+    the events can no longer be trusted to describe every change.
+    """
+
+    def __init__(self, tar_filename: str, symlinks_directory: str, recursive: bool = False,
+                 log: Optional[logging.Logger] = None, *, state: Optional[StateStore] = None,
+                 symlinks_only: bool = False, compression: str = 'gz',
+                 compression_level: Optional[int] = None, deterministic: bool = False,
+                 scheduler: Optional[DebounceScheduler] = None, engine: Optional[SyncEngine] = None,
+                 rescan_threshold: int = 10000, sharding: str = 'none', shard_count: int = 16,
+                 journal_segments: int = 32, archive_format: str = 'tar', member_index: bool = False,
+                 compression_threads: int = 1) -> None:
+        """
+        Class creator. The tar file, directory, recursive flag and logger keep their historical positions, the other
+        parameters are keyword-only.
+
+        :param tar_filename: Path with the filename of the tar file where the symbolic links are stored.
+        :type tar_filename: str
+        :param symlinks_directory: Path of the directory containing the symbolic links.
+        :type symlinks_directory: str
+        :param recursive: True to store the symbolic links of the whole directory tree, False to store only the top
+        level directory entries.
+        :type recursive: bool
+        :param log: Logger to write the status or error messages. None to use the logger of the module.
+        :type log: Optional[logging.Logger]
+        :param state: Store of the fingerprint and manifest of the tar file. None to keep the manifest only in memory.
+        :type state: Optional[StateStore]
+        :param symlinks_only: True to store only the symbolic links of the top level directory in non-recursive mode.
+        Regular files and directories are then never read.
+        :type symlinks_only: bool
+        :param compression: Compression format of the tar file, one of COMPRESSIONS
+        :type compression: str
+        :param compression_level: Compression level or preset of the format. None for the default one.
+        :type compression_level: Optional[int]
+        :param deterministic: True to write byte-reproducible tar files.
+        :type deterministic: bool
+        :param scheduler: Scheduler that debounces the events. None to use a scheduler of its own.
+        :type scheduler: Optional[DebounceScheduler]
+        :param engine: Engine that runs the synchronizations of the tar file. None to use an engine of its own.
+        :type engine: Optional[SyncEngine]
+        :param rescan_threshold: Number of changed paths pending at once above which the directory is scanned again
+        instead of updating the index path by path, which bounds the memory of the pending paths. The lost events
+        are not detected by it but by the watchers, which call invalidate_index on an overflow of the event queue.
+        :type rescan_threshold: int
+        :param sharding: Layout of the archive, one of SHARDINGS. With a sharded layout the tar file path holds the
+        index of the shards and only the shards with changed entries are written. With the journal layout only a
+        segment with the changed entries is appended.
+        :type sharding: str
+        :param shard_count: Number of shards of the hash layout.
+        :type shard_count: int
+        :param journal_segments: Number of segments of the journal layout that triggers its compaction.
+        :type journal_segments: int
+        :param archive_format: Format of the tar file, or of its shards, one of FORMATS. The manifest format only stores
+        symbolic links, so it needs the recursive or the symlinks only mode.
+        :type archive_format: str
+        :param member_index: True to write a member index sidecar next to the tar file, so the peers only read the
+        members that changed. It needs an uncompressed tar file without sharding.
+        :type member_index: bool
+        :param compression_threads: Number of threads compressing a gzip tar file in parallel, as a multi-member gzip
+        file. Only the tar file of the layout without sharding is compressed in parallel, the shards and segments are
+        small.
+        :type compression_threads: int
+        """
+        super().__init__()
+        self.tar_filename = tar_filename
+        self.symlinks_directory = symlinks_directory
+        self.recursive = recursive
+        self.rescan_threshold = rescan_threshold
+        self.symlinks_only = symlinks_only
+        self.compression = compression
+        self.compression_level = compression_level
+        self.deterministic = deterministic
+        self.sharding = sharding
+        self.shard_count = shard_count
+        self.journal_segments = journal_segments
+        self.archive_format = archive_format
+        self.member_index = member_index
+        self.compression_threads = compression_threads
+        self.state = state
+        self.log = log if log is not None else logging.getLogger(__name__)
+        self.scheduler = scheduler if scheduler is not None else DebounceScheduler(log=self.log)
+        self.engine = engine if engine is not None else SyncEngine(log=self.log)
+        self._manifest = state.load_manifest(tar_filename) if state is not None else None
+        self._event_handler_tar = None
+        # Manifest of the directory, None until the first scan
+        self._index = None
+        # Directory cache of the last scan, loaded from the state store on the first scan
+        self._directory_cache = None
+        # Names of the index entries updated since the tar file was last synchronized
+        self._unsynced = set()
+        # Paths changed since the last compression, flagged True when their subtree changed too
+        self._changes = dict()
+        self._rescan = False
+        self._lock = threading.Lock()
+
+    @property
+    def manifest(self) -> Optional[Manifest]:
+        """
+        Getter of the manifest of the symbolic links stored in the tar file
+
+        :return: The manifest of the tar file or None if it is unknown
+        :rtype: Optional[Manifest]
+        """
+        return self._manifest
+
+    @manifest.setter
+    def manifest(self, manifest: Manifest) -> None:
+        """
+        Setter of the manifest of the symbolic links stored in the tar file. The manifest is also stored, writing only
+        its differences from the previous one.
+
+        :param manifest: The manifest of the tar file
+        :type manifest: Manifest
+        :return: Nothing
+        """
+        if self.state is not None:
+            self.state.save_manifest(self.tar_filename, manifest, self._manifest)
+        self._manifest = manifest
+
+    @property
+    def tar_event_handler(self) -> TarEventHandler:
+        """
+        Property to store the tar file event handler reference
+
+        :return: The tar file event handler reference
+        :rtype: TarEventHandler
+        """
+        return self._event_handler_tar
+
+    @tar_event_handler.setter
+    def tar_event_handler(self, event_handler_tar: TarEventHandler) -> None:
+        """
+        Setter of the tar file event handler property
+
+        :param event_handler_tar: The tar file event handler
+        :type event_handler_tar: TarEventHandler
+        """
+        self._event_handler_tar = event_handler_tar
+
+    def invalidate_index(self) -> None:
+        """
+        Discards the index of the directory, so the next compression scans the whole directory. To be called when
+        events may have been lost.
+
+        :return: Nothing
+        """
+        with self._lock:
+            self._rescan = True
+            self._changes.clear()
+
+    def request_rescan(self, event: watchdog.events.FileSystemEvent) -> None:
+        """
+        Schedules a compression that scans the directory again, for the changes that are not described by events
+
+        :param event: The event that generated the storage of the symbolic links to the tar file
+        :type event: watchdog.events.FileSystemEvent
+        :return: Nothing
+        """
+        self.invalidate_index()
+        self.scheduler.schedule(self, self.engine.submit, os.path.abspath(self.tar_filename), self.compress, event)
+
+    def scan_index(self) -> Manifest:
+        """
+        Scans the directory to build its index, without compressing it, if there is no index yet. While the manifest of
+        the tar file is unknown the rescans compare the directory with this index, so the pollers call it before
+        requesting any rescan. It does not block on the synchronizations, so it can be run by the polling threads.
+
+        :return: The manifest of the directory found by the scan
+        :rtype: Manifest
+        """
+        index = build_manifest(self.symlinks_directory, self.recursive, self.symlinks_only)
+        with self._lock:
+            if self._index is None:
+                self._index = dict(index)
+        return index
+
+    def _update_index(self) -> Optional[Set[str]]:
+        """
+        Updates the index of the directory with the paths changed since the last compression, or scans the whole
+        directory if there is no index or it was invalidated. While the manifest of the tar file is unknown a requested
+        rescan does not name any change, so the directory is only taken as changed if it differs from the previous
+        index. Otherwise a peer that never synchronized would write its directory over the tar file.
+
+        :return: The names of the entries of the index that differ from the manifest of the tar file, or None if the
+        manifest is unknown and the directory changed
+        :rtype: Optional[Set[str]]
+        """
+        with self._lock:
+            changes, self._changes = self._changes, dict()
+            requested, previous = self._rescan, self._index
+            rescan, self._rescan = self._rescan or self._index is None, False
+        if rescan:
+            if self._directory_cache is None and self.state is not None:
+                self._directory_cache = self.state.load_directory_cache(self.tar_filename)
+            self._index, cache = build_manifest_cached(self.symlinks_directory, self.recursive, self.symlinks_only,
+                                                       self._directory_cache)
+            if self.state is not None:
+                self.state.save_directory_cache(self.tar_filename, cache, self._directory_cache)
+            self._directory_cache = cache
+            if self._manifest is not None:
+                self._unsynced.clear()
+                return {name for name in self._index.keys() | self._manifest.keys()
+                        if self._index.get(name) != self._manifest.get(name)}
+            if not requested:
+                self._unsynced.clear()
+                return None
+            # The entries left unsynced by a failed compression are kept, so it is retried
+            if previous is not None:
+                self._unsynced.update(name for name in previous.keys() | self._index.keys()
+                                      if previous.get(name) != self._index.get(name))
+            return None if len(self._unsynced) > 0 else set()
+        for name, subtree in changes.items():
+            self._unsynced.update(update_manifest(self._index, self.symlinks_directory, name, self.recursive,
+                                                  self.symlinks_only, subtree))
+        if self._manifest is None:
+            return None
+        return {name for name in self._unsynced if self._index.get(name) != self._manifest.get(name)}
+
+    def compress(self, event: watchdog.events.FileSystemEvent) -> None:
+        """
+        Helper method that compresses the symbolic links directory to the tar file. The directory is only compressed
+        when its manifest differs from the one of the tar file, so the changes made by the extraction of the tar file
+        are ignored whatever the number of events they produce.
+
+        :param event: The event that generated the storage of the symbolic links to the tar file
+        :type event: watchdog.events.FileSystemEvent
+        :return: Nothing
+        """
+        self.log.info("Directory changed. Event: {0:}.".format(str(event)))
+        try:
+            changed = self._update_index()
+            if changed is not None and len(changed) == 0:
+                self._unsynced.clear()
+                self.log.info("Symbolic links directory {0:} unchanged. Compression skipped.".format(
+                    self.symlinks_directory))
+            else:
+                if not os.path.isfile(self.tar_filename):
+                    raise FileNotFoundError("Tar file {0:} does not exist.".format(self.tar_filename))
+                manifest = dict(self._index)
+                offsets = None
+                if self.sharding == 'journal':
+                    self.tar_event_handler.shards = write_journal(
+                        self.tar_filename, self.symlinks_directory, manifest, changed, self.compression,
+                        self.compression_level, self.deterministic, self.tar_event_handler.shards,
+                        self.journal_segments, self.archive_format)
+                elif self.sharding != 'none':
+                    self.tar_event_handler.shards = write_shards(
+                        self.tar_filename, self.symlinks_directory, manifest, changed, self.sharding, self.shard_count,
+                        self.compression, self.compression_level, self.deterministic, self.tar_event_handler.shards,
+                        self.archive_format)
+                elif self.member_index:
+                    offsets = write_tar_file(self.tar_filename, self.symlinks_directory, manifest, 'none',
+                                             deterministic=self.deterministic)
+                    self.tar_event_handler.shards = None
+                else:
+                    write_archive(self.tar_filename, self.symlinks_directory, manifest, self.archive_format,
+                                  self.compression, self.compression_level, self.deterministic,
+                                  self.compression_threads)
+                    self.tar_event_handler.shards = None
+                fingerprint = fingerprint_tar_file(self.tar_filename)
+                if offsets is not None:
+                    write_member_index(self.tar_filename, fingerprint[2],
+                                       {name: (offsets[name],) + manifest[name] for name in offsets})
+                # The fingerprint of the written tar file lets the tar file handler ignore the events of this write
+                self.tar_event_handler.fingerprint = fingerprint
+                self.log.info("Compressed symbolic links directory {0:}.".format(self.symlinks_directory))
+                self.manifest = manifest
+                self._unsynced.clear()
+        except Exception as xcpt:
+            # The index may be out of step with the directory, so it is scanned again on the next compression
+            self.invalidate_index()
+            self.log.error("Error compressing symbolic links. Exception: {0:}.".format(str(xcpt)))
+
+    def on_any_event(self, event: watchdog.events.FileSystemEvent) -> None:
+        """
+        Event handler for any type of change in the symbolic links directory. The paths named by the event are recorded
+        for the update of the index and the compression is scheduled. Too many pending paths discard the index in
+        favour of a scan of the directory, only to bound their memory.
+
+        :param event: The event that generated the storage of the symbolic links to the tar file
+        :type event: watchdog.events.FileSystemEvent
+        :return: Nothing
+        """
+        if isinstance(event, (FileOpenedEvent, FileClosedNoWriteEvent)):
+            return
+        paths = [event.src_path]
+        if isinstance(event, FileSystemMovedEvent):
+            paths.append(event.dest_path)
+        # The modification of a directory does not change the entries below it, unlike its creation, deletion or move
+        subtree = event.is_directory and not isinstance(event, DirModifiedEvent)
+        changed = False
+        with self._lock:
+            for path in paths:
+                name = os.path.relpath(path, self.symlinks_directory) if path else os.curdir
+                if (name == os.curdir or name == os.pardir or name.startswith(os.pardir + os.sep) or
+                        (not self.recursive and os.sep in name)):
+                    continue
+                self._changes[name] = self._changes.get(name, False) or subtree
+                changed = True
+            if len(self._changes) > self.rescan_threshold:
+                self._rescan = True
+                self._changes.clear()
+        if changed:
+            self.scheduler.schedule(self, self.engine.submit, os.path.abspath(self.tar_filename), self.compress, event)
+
+
+class TarEventHandler(FileSystemEventHandler):
+    """
+    Handler of the changes in the tar file. It extracts the tar file to the symbolic links directory and stores the
+    fingerprint of the extracted tar file in the state store.
+    """
+
+    def __init__(self, tar_filename: str, symlinks_directory: str, log: logging.Logger, *,
+                 state: Optional[StateStore] = None, scheduler: Optional[DebounceScheduler] = None,
+                 engine: Optional[SyncEngine] = None, stable_polls: int = 2, stable_interval: float = 0.25,
+                 verify_gzip: bool = False, max_attempts: int = 8) -> None:
+        """
+        Class creator. The tar file, directory and logger keep their historical positions, the other parameters are
+        keyword-only.
+
+        :param tar_filename: Path with the filename of the tar file where the symbolic links are stored.
+        :type tar_filename: str
+        :param symlinks_directory: Path of the directory containing the symbolic links.
+        :type symlinks_directory: str
+        :param log: Logger to write the status or error messages.
+        :type log: logging.Logger
+        :param state: Store of the fingerprint of the tar file. None to not store it.
+        :type state: Optional[StateStore]
+        :param scheduler: Scheduler that debounces the events. None to use a scheduler of its own.
+        :type scheduler: Optional[DebounceScheduler]
+        :param engine: Engine that runs the synchronizations of the tar file. None to use an engine of its own.
+        :type engine: Optional[SyncEngine]
+        :param stable_polls: Number of consecutive polls with the same size and modification time of the tar file
+                             before it is extracted.
+        :type stable_polls: int
+        :param stable_interval: Seconds between the first polls of the tar file, doubled every time it changes.
+        :type stable_interval: float
+        :param verify_gzip: Check the CRC-32 and size of every gzip member of a stable tar file before extracting it.
+        :type verify_gzip: bool
+        :param max_attempts: Number of changes or failed checks of the tar file before the extraction is abandoned
+                             until its next event.
+        :type max_attempts: int
+        """
+        super().__init__()
+        self.tar_filename = tar_filename
+        self.symlinks_directory = symlinks_directory
+        self.log = log
+        self.state = state
+        self.scheduler = scheduler if scheduler is not None else DebounceScheduler(log=log)
+        self.engine = engine if engine is not None else SyncEngine(log=log)
+        self._event_handler_symlinks = None
+        self._fingerprint = state.load_fingerprint(tar_filename) if state is not None else None
+        self._shards = state.load_shard_index(tar_filename) if state is not None else None
+        self.stable_polls = stable_polls
+        self.stable_interval = stable_interval
+        self.verify_gzip = verify_gzip
+        self.max_attempts = max_attempts
+        # Size and modification time seen by the last poll, number of polls that saw them and number of attempts
+        self._last_stat = None
+        self._stable_count = 0
+        self._attempt = 0
+
+    @property
+    def symlink_event_handler(self) -> SymLinksEventHandler:
+        """
+        Property to store the symbolic links directory event handler reference
+
+        :return: The symbolic links directory event handler reference
+        :rtype: SymLinksEventHandler
+        """
+        return self._event_handler_symlinks
+
+    @symlink_event_handler.setter
+    def symlink_event_handler(self, event_handler_symlinks: SymLinksEventHandler):
+        """
+        Setter of the tar file event handler property
+
+        :param event_handler_symlinks: The symbolic links directory event handler
+        :type event_handler_symlinks: SymLinksEventHandler
+        """
+        self._event_handler_symlinks = event_handler_symlinks
+
+    @property
+    def fingerprint(self) -> Optional[Fingerprint]:
+        """
+        Getter of the fingerprint of the tar file as it was last written or extracted by this program
+
+        :return: The fingerprint of the tar file or None if it is unknown
+        :rtype: Optional[Fingerprint]
+        """
+        return self._fingerprint
+
+    @fingerprint.setter
+    def fingerprint(self, fingerprint: Fingerprint) -> None:
+        """
+        Setter of the fingerprint of the tar file as it was last written or extracted by this program. The fingerprint
+        is also stored.
+
+        :param fingerprint: The fingerprint of the tar file
+        :type fingerprint: Fingerprint
+        :return: Nothing
+        """
+        if self.state is not None:
+            self.state.save_fingerprint(self.tar_filename, fingerprint)
+        self._fingerprint = fingerprint
+
+    @property
+    def shards(self) -> Optional[ShardIndex]:
+        """
+        Getter of the shard index of the archive as it was last written or extracted by this program
+
+        :return: The shard index or None if the archive is not sharded or its index is unknown
+        :rtype: Optional[ShardIndex]
+        """
+        return self._shards
+
+    @shards.setter
+    def shards(self, index: Optional[ShardIndex]) -> None:
+        """
+        Setter of the shard index of the archive. The index is also stored.
+
+        :param index: The shard index or None if the archive is not sharded
+        :type index: Optional[ShardIndex]
+        :return: Nothing
+        """
+        if self.state is not None and index != self._shards:
+            self.state.save_shard_index(self.tar_filename, index)
+        self._shards = index
+
+    def settle(self, event: watchdog.events.FileSystemEvent) -> None:
+        """
+        Method that polls the tar file until it is stable before extracting it, so a tar file still being downloaded
+        by the cloud client is not decompressed while truncated. The tar file is stable when its size and modification
+        time are the same for the configured number of polls and, optionally, its gzip trailers are valid. Every
+        change or failed check doubles the interval until the next poll.
+
+        :param event: The event that generated the extraction
+        :type event: watchdog.events.FileSystemEvent
+        :return: Nothing
+        """
+        try:
+            stat_result = os.stat(self.tar_filename)
+        except OSError:
+            # Nothing to wait for, the extraction reports the error
+            self._reset_settle()
+            self.untar(event)
+            return
+        current = (stat_result.st_size, stat_result.st_mtime_ns)
+        if self._fingerprint is not None and current == self._fingerprint[:2]:
+            # Written or extracted by this program, so there is nothing to wait for
+            self._reset_settle()
+            self.untar(event)
+            return
+        if current == self._last_stat:
+            self._stable_count += 1
+        else:
+            if self._last_stat is not None:
+                self._attempt += 1
+            self._last_stat = current
+            self._stable_count = 1
+        if self._stable_count >= self.stable_polls:
+            if not self.verify_gzip or verify_gzip_file(self.tar_filename):
+                self._reset_settle()
+                self.untar(event)
+                return
+            self.log.info("Tar file {0:} is not a complete gzip file yet.".format(self.tar_filename))
+            self._attempt += 1
+            self._stable_count = 0
+        if self._attempt >= self.max_attempts:
+            self.log.error("Tar file {0:} did not settle after {1:} attempts. Extraction "
+                           "abandoned.".format(self.tar_filename, self._attempt))
+            self._reset_settle()
+            return
+        self.scheduler.schedule_later(self, self.stable_interval * 2 ** self._attempt, self.engine.submit,
+                                      os.path.abspath(self.tar_filename), self.settle, event)
+
+    def _reset_settle(self) -> None:
+        """
+        Forgets the polls of the tar file made to check that it is stable
+
+        :return: Nothing
+        """
+        self._last_stat = None
+        self._stable_count = 0
+        self._attempt = 0
+
+    def untar(self, event: watchdog.events.FileSystemEvent) -> None:
+        """
+        Method that extracts the tar file into the symbolic links directory. The tar file is only extracted when its
+        contents differ from the ones last written or extracted by this program, so the events produced by the writes
+        of the symbolic links handler are ignored whatever their number. When the tar file is a shard index, only the
+        shards that changed are extracted. When it has a member index sidecar, only the members that changed are read.
+
+        :param event: The event that generated the untar execution
+        :type event: watchdog.events.FileSystemEvent
+        :return: Nothing
+        """
+        self.log.info("Tar file changed. Event: {0:}.".format(str(event)))
+        try:
+            fingerprint = fingerprint_tar_file(self.tar_filename, self._fingerprint)
+            if self._fingerprint is not None and fingerprint[2] == self._fingerprint[2]:
+                self.log.info("Tar file {0:} unchanged. Extraction skipped.".format(self.tar_filename))
+                if fingerprint != self._fingerprint:
+                    self.fingerprint = fingerprint
+                return
+            if is_shard_index(self.tar_filename):
+                manifest, counts, self.shards = extract_shards(self.tar_filename, self.symlinks_directory,
+                                                               self._event_handler_symlinks.recursive,
+                                                               self._event_handler_symlinks.symlinks_only,
+                                                               self._shards, self._event_handler_symlinks.manifest)
+            else:
+                previous = self._event_handler_symlinks.manifest
+                index = load_member_index(self.tar_filename, fingerprint[2]) if previous is not None else None
+                if index is not None:
+                    manifest, counts = extract_members(self.tar_filename, self.symlinks_directory, index, previous,
+                                                       self._event_handler_symlinks.recursive,
+                                                       self._event_handler_symlinks.symlinks_only)
+                else:
+                    manifest, counts = extract_archive(self.tar_filename, self.symlinks_directory,
+                                                       self._event_handler_symlinks.recursive,
+                                                       self._event_handler_symlinks.symlinks_only)
+                self.shards = None
+            # The manifest of the extracted tar file lets the symbolic links handler ignore the events of the extraction
+            self._event_handler_symlinks.manifest = manifest
+            self.fingerprint = fingerprint
+            self.log.info("Extracted file {0:} with {1:} elements: {2:} created, {3:} retargeted, {4:} "
+                          "removed.".format(self.tar_filename, counts['elements'], counts['created'],
+                                            counts['retargeted'], counts['removed']))
+        except Exception as e:
+            self.log.error("Failed to extract file {0:}. Error: {1:}".format(self.tar_filename, str(e)))
+
+    def on_any_event(self, event: watchdog.events.FileSystemEvent) -> None:
+        """
+        Event handler for any type of change in the directory of the tar file. The directory is watched instead of the
+        tar file itself because a watch on the file is lost when it is replaced by a rename, which is how this program
+        and most cloud clients update it. Only the modification or creation of the tar file or its shards and the
+        renames onto them are handled. The shards are handled too because a cloud client can download them after the
+        index.
+
+        :param event: The event that generated extraction the symbolic links tar file
+        :type event: watchdog.events.FileSystemEvent
+        :return: Nothing
+        """
+        tar_path = os.path.abspath(self.tar_filename)
+        if isinstance(event, (FileModifiedEvent, FileCreatedEvent)):
+            path = event.src_path
+        elif isinstance(event, FileMovedEvent):
+            path = event.dest_path
+        else:
+            return
+        if path == tar_path or path.startswith(tar_path + SHARD_INFIX):
+            self.scheduler.schedule(self, self.engine.submit, tar_path, self.settle, event)
+
+
+class Poller:
+    """
+    Poller of a symbolic links directory and tar file pair, for the file systems that do not deliver inotify events,
+    such as many FUSE and cloud mounts. Every poll only issues a stat of the tar file and a stat of every directory of
+    the tree, and hands the changes to the event handlers as if they came from the file system observer.
     """
 
-    def __init__(self, tar_filename: str, symlinks_directory: str, recursive: bool,  log: logging.Logger) -> None:
+    def __init__(self, event_handler_dir: SymLinksEventHandler, event_handler_tar: TarEventHandler,
+                 interval: float = 5.0) -> None:
         """
         Class creator
 
-        :param tar_filename: Path with the filename of the tar file where the symbolic links are stored.
-        :type tar_filename: str
-        :param symlinks_directory: Path of the directory containing the symbolic links.
-        :type symlinks_directory: str
-        :param log: Logger to write the status or error messages.
-        :type log: logging.Logger
+        :param event_handler_dir: Handler of the changes in the symbolic links directory
+        :type event_handler_dir: SymLinksEventHandler
+        :param event_handler_tar: Handler of the changes in the tar file
+        :type event_handler_tar: TarEventHandler
+        :param interval: Seconds between two polls
+        :type interval: float
+        """
+        self.event_handler_dir = event_handler_dir
+        self.event_handler_tar = event_handler_tar
+        self.interval = interval
+        self._tar_stat = None
+        self._index = None
+
+    def poll(self) -> None:
+        """
+        Polls the tar file and the directory once. The first poll only records their state, and builds the index of
+        the directory handler if the manifest of the tar file is unknown, so the later changes can be told apart from
+        the differences between the directory and a tar file it was never synchronized with.
+
+        :return: Nothing
+        """
+        tar_path = os.path.abspath(self.event_handler_tar.tar_filename)
+        try:
+            st = os.stat(tar_path)
+            tar_stat = (st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            tar_stat = self._tar_stat
+        if self._tar_stat is not None and tar_stat != self._tar_stat:
+            self.event_handler_tar.on_any_event(FileModifiedEvent(tar_path))
+        self._tar_stat = tar_stat
+        changed, index = poll_directories(self.event_handler_dir.symlinks_directory, self.event_handler_dir.recursive,
+                                          self._index)
+        if self._index is None and self.event_handler_dir.manifest is None:
+            self.event_handler_dir.scan_index()
+        if self._index is not None and len(changed) > 0:
+            self.event_handler_dir.request_rescan(DirModifiedEvent(self.event_handler_dir.symlinks_directory))
+        self._index = index
+
+    async def run(self) -> None:
+        """
+        Task that polls the pair until it is cancelled. The polls run in a worker thread, so a slow mount does not
+        block the event loop.
+
+        :return: Nothing
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self.poll)
+            except Exception as xcpt:
+                self.event_handler_dir.log.error("Error polling {0:}. Exception: {1:}.".format(
+                    self.event_handler_dir.symlinks_directory, str(xcpt)))
+            await asyncio.sleep(self.interval)
+
+
+def inotify_watchdog_event(event: InotifyEvent) -> Optional[watchdog.events.FileSystemEvent]:
+    """
+    Translates an inotify event of a watched directory to the watchdog event taken by the handlers. Moves are reported
+    as a deletion from the source directory and a creation in the destination directory, since the two ends of a move
+    may belong to different watchers.
+
+    :param event: The inotify event
+    :type event: InotifyEvent
+    :return: The watchdog event or None if the event does not describe a change of an entry of the directory
+    :rtype: Optional[watchdog.events.FileSystemEvent]
+    """
+    path = os.fsdecode(event.src_path)
+    if event.is_create or event.is_moved_to:
+        return DirCreatedEvent(path) if event.is_directory else FileCreatedEvent(path)
+    if event.is_delete or event.is_moved_from:
+        return DirDeletedEvent(path) if event.is_directory else FileDeletedEvent(path)
+    if event.is_attrib or event.is_modify or event.is_close_write:
+        return DirModifiedEvent(path) if event.is_directory else FileModifiedEvent(path)
+    return None
+
+
+class InotifyDispatcher:
+    """
+    Single inotify instance of the process, read by a single thread, that hands the events of every watch to the
+    watchers that placed it. The watchers of all the pairs share it, so the number of threads of the process does not
+    depend on the number of pairs or of watches. The watchers of a directory watched twice share its watch. A watcher
+    is an object with a dispatch method, which receives the inotify events of its watches, and an overflow method,
+    which is called when the kernel event queue overflowed and events were lost.
+    """
+
+    def __init__(self, log: Optional[logging.Logger] = None) -> None:
+        """
+        Class creator
+
+        :param log: Logger to write the errors raised by the watchers.
+        :type log: Optional[logging.Logger]
         """
-        super().__init__()
-        self.tar_filename = tar_filename
-        self.symlinks_directory = symlinks_directory
-        self.recursive = recursive
         self.log = log
-        self.timer = None
-        self._controlled_change = False
-        self._event_handler_tar = None
+        self._fd = inotify_init()
+        if self._fd == -1:
+            error = ctypes.get_errno()
+            raise OSError(error, "Cannot create an inotify instance: {0:}".format(os.strerror(error)))
+        self._kill_r, self._kill_w = os.pipe()
+        self._lock = threading.Lock()
+        # Watched path and watchers of every watch descriptor
+        self._paths = dict()
+        self._watchers = dict()
+        self._thread = None
+        self._closed = False
 
-    @property
-    def controlled_change(self) -> bool:
+    def start(self) -> None:
+        """
+        Starts the thread that reads the events
+
+        :return: Nothing
+        """
+        self._thread = threading.Thread(target=self._read, name='InotifyDispatcher', daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """
+        Stops the thread that reads the events and closes the inotify instance, which removes every watch
+
+        :return: Nothing
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            os.write(self._kill_w, b'!')
+            self._thread.join()
+        for fd in (self._fd, self._kill_r, self._kill_w):
+            os.close(fd)
+
+    def add_watch(self, path: str, mask: int, watcher: Any) -> int:
+        """
+        Watches a path for a watcher. The mask is added to the one of the path if it is already watched.
+
+        :param path: Path to watch
+        :type path: str
+        :param mask: inotify events to watch
+        :type mask: int
+        :param watcher: Watcher that receives the events of the path
+        :type watcher: Any
+        :return: The watch descriptor of the path
+        :rtype: int
+        """
+        with self._lock:
+            wd = inotify_add_watch(self._fd, os.fsencode(path), mask | InotifyConstants.IN_MASK_ADD)
+            if wd == -1:
+                error = ctypes.get_errno()
+                raise OSError(error, "Cannot watch {0:}: {1:}".format(path, os.strerror(error)))
+            self._paths[wd] = os.fsencode(path)
+            watchers = self._watchers.setdefault(wd, list())
+            if watcher not in watchers:
+                watchers.append(watcher)
+        return wd
+
+    def remove_watch(self, wd: int, watcher: Any) -> None:
+        """
+        Stops handing the events of a watch to a watcher. The watch is removed when no watcher is left.
+
+        :param wd: Watch descriptor
+        :type wd: int
+        :param watcher: Watcher of the watch
+        :type watcher: Any
+        :return: Nothing
+        """
+        with self._lock:
+            watchers = self._watchers.get(wd, list())
+            if watcher not in watchers:
+                return
+            watchers.remove(watcher)
+            if len(watchers) == 0:
+                del self._watchers[wd]
+                del self._paths[wd]
+                # The watch may already be gone with its directory
+                inotify_rm_watch(self._fd, wd)
+
+    def remove_watcher(self, watcher: Any) -> None:
+        """
+        Stops handing the events of every watch to a watcher
+
+        :param watcher: Watcher to remove
+        :type watcher: Any
+        :return: Nothing
+        """
+        with self._lock:
+            wds = [wd for wd, watchers in self._watchers.items() if watcher in watchers]
+        for wd in wds:
+            self.remove_watch(wd, watcher)
+
+    def _read(self) -> None:
+        """
+        Body of the thread that reads the inotify events until the dispatcher is closed
+
+        :return: Nothing
         """
-        Getter of the boolean that enables or disables the reaction of the handler to an event in the file system
+        poller = select.poll()
+        poller.register(self._fd, select.POLLIN)
+        poller.register(self._kill_r, select.POLLIN)
+        while not self._closed:
+            ready = [fd for fd, mask in poller.poll()]
+            if self._kill_r in ready:
+                break
+            try:
+                buffer = os.read(self._fd, DEFAULT_EVENT_BUFFER_SIZE)
+            except InterruptedError:
+                continue
+            self._dispatch(buffer)
+
+    def _dispatch(self, buffer: bytes) -> None:
+        """
+        Hands the events of a buffer read from the inotify instance to the watchers of their watches. An overflow of
+        the event queue is reported to every watcher once, after the events that were not lost.
 
-        :return: True when the actual change is controlled by the main program and should be ignored, False otherwise.
-        :rtype: bool
+        :param buffer: Buffer of inotify_event structures
+        :type buffer: bytes
+        :return: Nothing
         """
-        return self._controlled_change
+        overflow = False
+        offset = 0
+        while offset + INOTIFY_EVENT_HEADER.size <= len(buffer):
+            wd, mask, cookie, length = INOTIFY_EVENT_HEADER.unpack_from(buffer, offset)
+            name = buffer[offset + INOTIFY_EVENT_HEADER.size:offset + INOTIFY_EVENT_HEADER.size + length].rstrip(b'\0')
+            offset += INOTIFY_EVENT_HEADER.size + length
+            if mask & InotifyConstants.IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            with self._lock:
+                path = self._paths.get(wd)
+                watchers = list(self._watchers.get(wd, list()))
+                if mask & InotifyConstants.IN_IGNORED:
+                    # The kernel removed the watch, with its directory or by a call to inotify_rm_watch
+                    self._paths.pop(wd, None)
+                    self._watchers.pop(wd, None)
+            if path is None:
+                continue
+            event = InotifyEvent(wd, mask, cookie, name, os.path.join(path, name) if name else path)
+            for watcher in watchers:
+                self._call(watcher.dispatch, event)
+        if overflow:
+            with self._lock:
+                watchers = list({id(watcher): watcher for watchers in self._watchers.values()
+                                 for watcher in watchers}.values())
+            for watcher in watchers:
+                self._call(watcher.overflow)
 
-    @controlled_change.setter
-    def controlled_change(self, controlled_change: bool) -> None:
+    def _call(self, callback: Callable, *args: Any) -> None:
         """
-        Enables or disables the reaction of the handler to an event in the file system
+        Calls a method of a watcher, logging its errors so the reading thread survives them
 
-        :param controlled_change: True when the actual change is controlled by the main program and should be ignored,
-        False otherwise.
-        :type controlled_change: bool
+        :param callback: Method of the watcher
+        :type callback: Callable
+        :param args: Arguments of the method
+        :type args: Any
         :return: Nothing
         """
-        self._controlled_change = controlled_change
+        try:
+            callback(*args)
+        except Exception as xcpt:
+            if self.log is not None:
+                self.log.error("Error handling an inotify event. Exception: {0:}.".format(str(xcpt)))
+
+
+class SymlinkDirectoryWatcher:
+    """
+    Watcher of a recursive symbolic links directory that only places inotify watches on the top level directory and on
+    the directories that hold symbolic links, up to a maximum number of watches, instead of on every directory of the
+    tree. The watches are placed on the inotify dispatcher shared by the watchers of the process. The changes in the
+    other directories are found by periodic polls of the directory index, which only cost a stat per directory.
+    """
+
+    # Only the changes of the entries of a directory can change its symbolic links
+    EVENT_MASK = (InotifyConstants.IN_CREATE | InotifyConstants.IN_DELETE | InotifyConstants.IN_MOVED_FROM |
+                  InotifyConstants.IN_MOVED_TO | InotifyConstants.IN_ATTRIB | InotifyConstants.IN_MOVE_SELF |
+                  InotifyConstants.IN_DONT_FOLLOW | InotifyConstants.IN_ONLYDIR) if InotifyConstants is not None else 0
+
+    def __init__(self, event_handler_dir: SymLinksEventHandler, rescan_interval: float = 60.0,
+                 max_watches: int = 4096, dispatcher: Optional[InotifyDispatcher] = None) -> None:
+        """
+        Class creator
+
+        :param event_handler_dir: Handler of the changes in the symbolic links directory
+        :type event_handler_dir: SymLinksEventHandler
+        :param rescan_interval: Seconds between two polls of the directories
+        :type rescan_interval: float
+        :param max_watches: Maximum number of inotify watches of the directory tree
+        :type max_watches: int
+        :param dispatcher: Inotify dispatcher shared by the watchers of the process. None to start one of its own.
+        :type dispatcher: Optional[InotifyDispatcher]
+        """
+        self.event_handler_dir = event_handler_dir
+        self.rescan_interval = rescan_interval
+        self.max_watches = max_watches
+        self.dispatcher = dispatcher
+        self._own_dispatcher = dispatcher is None
+        self._watched = set()
+        self._index = None
+        # Manifest of the directory found by the first poll, which places the watches while the manifest of the tar file
+        # is unknown
+        self._scanned = None
+        self._limited = False
+        # The watched directories are updated by the polls and by the thread of the dispatcher, on IN_IGNORED events
+        self._lock = threading.Lock()
 
     @property
-    def tar_event_handler(self) -> TarEventHandler:
+    def watched(self) -> Set[str]:
         """
-        Property to store the tar file event handler reference
+        Getter of the directories with an inotify watch
 
-        :return: The tar file event handler reference
-        :rtype: TarEventHandler
+        :return: The paths of the watched directories, relative to the symbolic links directory
+        :rtype: Set[str]
         """
-        return self._event_handler_tar
+        with self._lock:
+            return set(self._watched)
 
-    @tar_event_handler.setter
-    def tar_event_handler(self, event_handler_tar: TarEventHandler) -> None:
+    def start(self) -> None:
         """
-        Setter of the tar file event handler property
+        Places the watch of the top level directory and of the directories with archived symbolic links
 
-        :param event_handler_tar: The tar file event handler
-        :type event_handler_tar: TarEventHandler
+        :return: Nothing
         """
-        self._event_handler_tar = event_handler_tar
+        if self._own_dispatcher:
+            self.dispatcher = InotifyDispatcher(self.event_handler_dir.log)
+            self.dispatcher.start()
+        with self._lock:
+            self.dispatcher.add_watch(self.event_handler_dir.symlinks_directory, self.EVENT_MASK, self)
+            self._watched.add('')
+        self.refresh()
 
-    def compress(self, event: watchdog.events.FileSystemEvent) -> None:
+    def stop(self) -> None:
         """
-        Helper method that compresses the symbolic links directory to the tar file
+        Removes the watches, and stops the dispatcher if it is not shared
 
-        :param event: The event that generated the storage of the symbolic links to the tar file
-        :type event: watchdog.events.FileSystemEvent
         :return: Nothing
         """
-        if not self._controlled_change:
-            self.log.info("Directory changed. Event: {0:}.".format(str(event)))
+        if self.dispatcher is None:
+            return
+        self.dispatcher.remove_watcher(self)
+        if self._own_dispatcher:
+            self.dispatcher.close()
+
+    def refresh(self) -> None:
+        """
+        Adds the watches of the directories that hold archived symbolic links and are not watched yet, while the
+        maximum number of watches is not reached. The watches of removed directories are dropped by inotify itself.
+        The watched directories are locked while the watches are placed, so the IN_IGNORED event of a watch is only
+        handled once it is recorded.
+
+        :return: Nothing
+        """
+        manifest = self.event_handler_dir.manifest
+        if manifest is None:
+            manifest = self._scanned or dict()
+        directories = {os.path.dirname(name) for name, (target, mode) in manifest.items() if target != ''}
+        with self._lock:
+            unwatched = directories - self._watched
+            limited = len(self._watched) + len(unwatched) > self.max_watches
+            if limited and not self._limited:
+                self.event_handler_dir.log.warning("Reached the maximum of {0:} watches in {1:}. The changes in {2:} "
+                                                   "directories with symbolic links are found by polls every {3:} "
+                                                   "seconds.".format(self.max_watches,
+                                                                     self.event_handler_dir.symlinks_directory,
+                                                                     len(self._watched) + len(unwatched) -
+                                                                     self.max_watches, self.rescan_interval))
+            self._limited = limited
+            for directory in sorted(unwatched):
+                if len(self._watched) >= self.max_watches:
+                    break
+                try:
+                    self.dispatcher.add_watch(os.path.join(self.event_handler_dir.symlinks_directory, directory),
+                                              self.EVENT_MASK, self)
+                except OSError:
+                    continue
+                self._watched.add(directory)
+
+    def poll(self) -> None:
+        """
+        Polls the modification times of the directories and requests a scan of the directory if an unwatched one
+        changed. The first poll only builds the index of the directories, and if the manifest of the tar file is
+        unknown it also builds the index of the directory handler, without compressing the directory, so the watches
+        can be placed.
+
+        :return: Nothing
+        """
+        changed, index = poll_directories(self.event_handler_dir.symlinks_directory, True, self._index)
+        if self._index is None and self.event_handler_dir.manifest is None:
+            self._scanned = self.event_handler_dir.scan_index()
+        elif self._index is not None and len(set(changed) - self.watched) > 0:
+            self.event_handler_dir.request_rescan(DirModifiedEvent(self.event_handler_dir.symlinks_directory))
+        self._index = index
+        self.refresh()
+
+    async def run(self, executor: Optional[concurrent.futures.Executor] = None) -> None:
+        """
+        Task that polls the directories until it is cancelled. The polls run in a worker thread, so they do not block
+        the event loop.
+
+        :param executor: Executor of the polls, which the watchers of many pairs can share. None to use the default
+        executor of the loop.
+        :type executor: Optional[concurrent.futures.Executor]
+        :return: Nothing
+        """
+        loop = asyncio.get_running_loop()
+        while True:
             try:
-                self.tar_event_handler.controlled_change = True
-                os.remove(self.tar_filename)
-                with tarfile.open(self.tar_filename, "w:gz") as tar:
-                    self.log.info("Compressed symbolic links directory {0:}.".format(self.symlinks_directory))
-                    if not self.recursive:
-                        for fn in os.listdir(self.symlinks_directory):
-                            tar.add(os.path.join(self.symlinks_directory, fn), arcname=fn)
-                    else:
-                        walked = list(os.walk(self.symlinks_directory))
-                        toplevel = walked[0]
-                        symlinks = list()
-                        folders = walked[1:]
-                        for folder in folders:
-                            # symlinks will be listed in the walk folders, but are not
-                            # present in the tail of the walk list
-                            basedir = folder[0]
-                            files = folder[2]
-                            for file in files:
-                                if os.path.islink(os.path.join(basedir, file)):
-                                    symlinks.append(os.path.join(basedir.replace(self.symlinks_directory, '')[1:], file))
-                        for file in symlinks:
-                            tar.add(os.path.join(self.symlinks_directory, file), arcname=file)
-                    tar.close()
+                await loop.run_in_executor(executor, self.poll)
             except Exception as xcpt:
-                self.log.error("Error compressing symbolic links. Exception: {0:}.".format(str(xcpt)))
+                self.event_handler_dir.log.error("Error polling {0:}. Exception: {1:}.".format(
+                    self.event_handler_dir.symlinks_directory, str(xcpt)))
+            await asyncio.sleep(self.rescan_interval)
+
+    def dispatch(self, event: InotifyEvent) -> None:
+        """
+        Hands an inotify event of a watched directory to the handler of the directory as a watchdog event
+
+        :param event: The inotify event
+        :type event: InotifyEvent
+        :return: Nothing
+        """
+        if event.is_ignored:
+            directory = os.path.relpath(os.fsdecode(event.src_path), self.event_handler_dir.symlinks_directory)
+            with self._lock:
+                self._watched.discard('' if directory == os.curdir else directory)
+        elif event.is_move_self:
+            self.event_handler_dir.request_rescan(DirModifiedEvent(self.event_handler_dir.symlinks_directory))
         else:
-            self._controlled_change = False
-        self.timer = None
+            watchdog_event = inotify_watchdog_event(event)
+            if watchdog_event is not None:
+                self.event_handler_dir.on_any_event(watchdog_event)
 
-    def on_any_event(self, event: watchdog.events.FileSystemEvent) -> None:
+    def overflow(self) -> None:
         """
-        Event handler for any type of change in the symbolic links directory
+        Requests a scan of the directory after an overflow of the event queue, since the lost events cannot be known
 
-        :param event: The event that generated the storage of the symbolic links to the tar file
-        :type event: watchdog.events.FileSystemEvent
         :return: Nothing
         """
-        if isinstance(event, DirModifiedEvent):
-            if self.timer is not None:
-                self.timer.cancel()
-            self.timer = threading.Timer(0.5, self.compress, args=(event,))
-            self.timer.start()
+        self.event_handler_dir.log.error("Inotify event queue overflowed. Scanning {0:} again.".format(
+            self.event_handler_dir.symlinks_directory))
+        self.event_handler_dir.request_rescan(DirModifiedEvent(self.event_handler_dir.symlinks_directory))
 
 
-class TarEventHandler(FileSystemEventHandler):
-    def __init__(self, tar_filename: str, symlinks_directory: str, log: logging.Logger) -> None:
+class DirectoryWatcher:
+    """
+    Watcher of a symbolic links directory through the inotify dispatcher. In recursive mode every directory of the
+    tree is watched, and the directories created or moved into the tree are watched as they appear. Otherwise only the
+    top level directory is watched. When the kernel event queue overflows the lost events cannot be known, so the
+    index of the directory is discarded and a scan of the whole directory is requested.
+    """
+
+    # The writes of the files of the directory are reported too, as the watchdog observer did
+    EVENT_MASK = (SymlinkDirectoryWatcher.EVENT_MASK | InotifyConstants.IN_MODIFY |
+                  InotifyConstants.IN_CLOSE_WRITE) if InotifyConstants is not None else 0
+
+    def __init__(self, event_handler_dir: SymLinksEventHandler, dispatcher: InotifyDispatcher) -> None:
         """
         Class creator
 
-        :param tar_filename: Path with the filename of the tar file where the symbolic links are stored.
-        :type tar_filename: str
-        :param symlinks_directory: Path of the directory containing the symbolic links.
-        :type symlinks_directory: str
-        :param log: Logger to write the status or error messages.
-        :type log: logging.Logger
+        :param event_handler_dir: Handler of the changes in the symbolic links directory
+        :type event_handler_dir: SymLinksEventHandler
+        :param dispatcher: Inotify dispatcher shared by the watchers of the process
+        :type dispatcher: InotifyDispatcher
         """
-        super().__init__()
-        self.tar_filename = tar_filename
-        self.symlinks_directory = symlinks_directory
-        self.log = log
-        self.timer = None
-        self._event_handler_symlinks = None
-        self._controlled_change = False
+        self.event_handler_dir = event_handler_dir
+        self.dispatcher = dispatcher
+        self._root = os.path.abspath(event_handler_dir.symlinks_directory)
+        # Watch descriptor of every watched directory, by path relative to the symbolic links directory
+        self._wds = dict()
+        self._stopped = False
+        # The watches are updated by the thread of the dispatcher and stopped by the thread of the event loop
+        self._lock = threading.Lock()
 
     @property
-    def symlink_event_handler(self) -> SymLinksEventHandler:
+    def watched(self) -> Set[str]:
         """
-        Property to store the symbolic links directory event handler reference
+        Getter of the watched directories
 
-        :return: The symbolic links directory event handler reference
-        :rtype: SymLinksEventHandler
+        :return: The paths of the watched directories, relative to the symbolic links directory
+        :rtype: Set[str]
         """
-        return self._event_handler_symlinks
+        with self._lock:
+            return set(self._wds)
 
-    @symlink_event_handler.setter
-    def symlink_event_handler(self, event_handler_symlinks: SymLinksEventHandler):
+    def start(self) -> None:
         """
-        Setter of the tar file event handler property
+        Places the watches of the directory. An error, such as reaching the limit of inotify watches of the user, is
+        raised, so the directory can be polled instead.
 
-        :param event_handler_symlinks: The symbolic links directory event handler
-        :type event_handler_symlinks: SymLinksEventHandler
+        :return: Nothing
         """
-        self._event_handler_symlinks = event_handler_symlinks
+        try:
+            self._watch_tree('')
+        except OSError:
+            self.stop()
+            raise
 
-    @property
-    def controlled_change(self) -> bool:
+    def stop(self) -> None:
+        """
+        Removes the watches of the directory. The events still being dispatched no longer place new watches.
+
+        :return: Nothing
+        """
+        with self._lock:
+            self._stopped = True
+            self._wds.clear()
+        self.dispatcher.remove_watcher(self)
+
+    def dispatch(self, event: InotifyEvent) -> None:
         """
-        Getter of the boolean that enables or disables the reaction of the handler to an event in the file system
+        Hands an inotify event of the directory to the handler of the directory, keeping the watches of the tree in
+        step with its subdirectories
 
-        :return: True when the actual change is controlled by the main program and should be ignored, False otherwise.
-        :rtype: bool
+        :param event: The inotify event
+        :type event: InotifyEvent
+        :return: Nothing
         """
-        return self._controlled_change
+        path = os.fsdecode(event.src_path)
+        directory = os.path.relpath(path, self._root) if path != self._root else ''
+        if event.is_ignored:
+            with self._lock:
+                if self._wds.get(directory) == event.wd:
+                    del self._wds[directory]
+            return
+        if event.is_move_self:
+            self.event_handler_dir.request_rescan(DirModifiedEvent(self._root))
+            return
+        if event.is_directory and self.event_handler_dir.recursive:
+            if event.is_moved_from:
+                # The watches of a directory moved away would report their events under its old path
+                with self._lock:
+                    for other in [other for other in self._wds if other == directory or
+                                  other.startswith(directory + os.sep)]:
+                        self.dispatcher.remove_watch(self._wds.pop(other), self)
+            elif event.is_create or event.is_moved_to:
+                self._watch_new_tree(directory)
+        watchdog_event = inotify_watchdog_event(event)
+        if watchdog_event is not None:
+            self.event_handler_dir.on_any_event(watchdog_event)
 
-    @controlled_change.setter
-    def controlled_change(self, controlled_change: bool) -> None:
+    def overflow(self) -> None:
         """
-        Enables or disables the reaction of the handler to an event in the file system
+        Discards the index of the directory after an overflow of the event queue and requests a scan. The directories
+        created while the events were lost are watched too.
 
-        :param controlled_change: True when the actual change is controlled by the main program and should be ignored,
-        False otherwise.
-        :type controlled_change: bool
         :return: Nothing
         """
-        self._controlled_change = controlled_change
+        self.event_handler_dir.log.error("Inotify event queue overflowed. Scanning {0:} again.".format(
+            self.event_handler_dir.symlinks_directory))
+        self._watch_new_tree('')
+        self.event_handler_dir.request_rescan(DirModifiedEvent(self._root))
 
-    def untar(self, event: watchdog.events.FileSystemEvent) -> None:
+    def _watch_new_tree(self, directory: str) -> None:
         """
-        Method that extracts the tar file into the symbolic links directory
+        Watches a directory that appeared after the start, and its subdirectories. A directory that cannot be watched
+        is logged, since its changes would be missed.
 
-        :param event: The event that generated the untar execution
-        :type event: watchdog.events.FileSystemEvent
+        :param directory: Path of the directory, relative to the symbolic links directory
+        :type directory: str
         :return: Nothing
         """
-        if not self._controlled_change:
-            self.log.info("Tar file changed. Event: {0:}.".format(str(event)))
+        try:
+            self._watch_tree(directory)
+        except OSError as xcpt:
+            self.event_handler_dir.log.error("Error watching {0:}. Exception: {1:}.".format(
+                os.path.join(self._root, directory), str(xcpt)))
+
+    def _watch_tree(self, directory: str) -> None:
+        """
+        Watches a directory and, in recursive mode, its subdirectories. The symbolic links to directories are not
+        followed.
+
+        :param directory: Path of the directory, relative to the symbolic links directory
+        :type directory: str
+        :return: Nothing
+        """
+        self._watch(directory)
+        if not self.event_handler_dir.recursive:
+            return
+        for root, dirnames, filenames in os.walk(os.path.join(self._root, directory)):
+            dirnames[:] = [dirname for dirname in dirnames if not os.path.islink(os.path.join(root, dirname))]
+            for dirname in dirnames:
+                self._watch(os.path.relpath(os.path.join(root, dirname), self._root))
+
+    def _watch(self, directory: str) -> None:
+        """
+        Watches a directory, unless the watcher is stopped. A directory removed or replaced before it is watched is
+        skipped, its removal has its own event.
+
+        :param directory: Path of the directory, relative to the symbolic links directory
+        :type directory: str
+        :return: Nothing
+        """
+        with self._lock:
+            if self._stopped:
+                return
             try:
-                with tarfile.open(self.tar_filename, "r:gz") as tar:
-                    self._event_handler_symlinks.controlled_change = True
-                    self.log.info("Extracting file {0:} with {1:} elements.".format(self.tar_filename,
-                                                                                    len(tar.getnames())))
-                    tar.extractall(self.symlinks_directory, members=tar.getmembers())
-                    tar.close()
-            except Exception as e:
-                self.log.error("Failed to extract file {0:}. Error: {1:}".format(self.tar_filename, str(e)))
-        else:
-            self.controlled_change = False
-        self.timer = None
+                self._wds[directory] = self.dispatcher.add_watch(os.path.join(self._root, directory),
+                                                                 self.EVENT_MASK, self)
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+
+
+class TarDirectoryWatcher:
+    """
+    Watcher of the directory of a tar file through the inotify dispatcher. The directory is watched instead of the tar
+    file because a watch on the file is lost when it is replaced by a rename. The watchers of the tar files of a
+    directory share its watch.
+    """
 
-    def on_modified(self, event):
+    EVENT_MASK = (InotifyConstants.IN_CREATE | InotifyConstants.IN_MODIFY | InotifyConstants.IN_CLOSE_WRITE |
+                  InotifyConstants.IN_MOVED_TO | InotifyConstants.IN_ONLYDIR) if InotifyConstants is not None else 0
+
+    def __init__(self, event_handler_tar: TarEventHandler, dispatcher: InotifyDispatcher) -> None:
         """
-        Event handler for any type of change in the symbolic links directory
+        Class creator
+
+        :param event_handler_tar: Handler of the changes in the tar file
+        :type event_handler_tar: TarEventHandler
+        :param dispatcher: Inotify dispatcher shared by the watchers of the process
+        :type dispatcher: InotifyDispatcher
+        """
+        self.event_handler_tar = event_handler_tar
+        self.dispatcher = dispatcher
+
+    def start(self) -> None:
+        """
+        Places the watch of the directory of the tar file
+
+        :return: Nothing
+        """
+        self.dispatcher.add_watch(os.path.dirname(os.path.abspath(self.event_handler_tar.tar_filename)),
+                                  self.EVENT_MASK, self)
+
+    def stop(self) -> None:
+        """
+        Removes the watch of the directory of the tar file, unless other tar files share it
+
+        :return: Nothing
+        """
+        self.dispatcher.remove_watcher(self)
+
+    def dispatch(self, event: InotifyEvent) -> None:
+        """
+        Hands an inotify event of the directory to the handler of the tar file, which ignores the other files
+
+        :param event: The inotify event
+        :type event: InotifyEvent
+        :return: Nothing
+        """
+        watchdog_event = inotify_watchdog_event(event)
+        if watchdog_event is not None:
+            self.event_handler_tar.on_any_event(watchdog_event)
+
+    def overflow(self) -> None:
+        """
+        Checks the tar file after an overflow of the event queue, in case its events were lost. An unchanged tar
+        file is not extracted.
 
-        :param event: The event that generated extraction the symbolic links tar file
-        :type event: watchdog.events.FileSystemEvent
         :return: Nothing
         """
-        if isinstance(event, FileModifiedEvent):
-            if self.timer is not None:
-                self.timer.cancel()
-            self.timer = threading.Timer(0.5, self.untar, args=[event])
-            self.timer.start()
+        self.event_handler_tar.on_any_event(FileModifiedEvent(os.path.abspath(self.event_handler_tar.tar_filename)))
 
 
-def main(directory: str, tar_filename: str, log: logging.Logger, event: threading.Event, config_filename: str, recursive: bool) -> None:
+def load_pairs(config_filename: str, defaults: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     """
-    Main function that tests for the existence of the tar file and symlink directory, loads the configuration file and
-    starts the file system observers
+    Reads the directory and tar file pairs of a config file. Every section of the ini file is a pair, with the options
+    dir and tar_file and the optional recursive, symlinks_only, compression, compression_level, deterministic,
+    sharding, shard_count, journal_segments, format, member_index and compression_threads. The options of the DEFAULT
+    section apply to every pair, and the defaults given apply to the options that no section sets.
+
+    :param config_filename: Path of the ini config file
+    :type config_filename: str
+    :param defaults: Values of the optional options of every pair, keyed as in the returned pairs. None to use the
+    defaults of the program.
+    :type defaults: Optional[Dict[str, Any]]
+    :return: The keyword arguments of every pair, as taken by watch_pairs
+    :rtype: List[Dict[str, Any]]
+    """
+    fallback = {'recursive': False, 'symlinks_only': False, 'compression': 'gz', 'compression_level': None,
+                'deterministic': False, 'sharding': 'none', 'shard_count': 16, 'journal_segments': 32,
+                'archive_format': 'tar', 'member_index': False, 'compression_threads': 1}
+    if defaults is not None:
+        fallback.update(defaults)
+    config = configparser.ConfigParser()
+    if len(config.read(config_filename)) == 0:
+        raise FileNotFoundError("Config file {0:} does not exist.".format(config_filename))
+    pairs = list()
+    for section in config.sections():
+        options = config[section]
+        missing = [option for option in ('dir', 'tar_file') if options.get(option, '') == '']
+        if len(missing) > 0:
+            raise ValueError("Section {0:} of config file {1:} misses the option {2:}.".format(
+                section, config_filename, ' and '.join(missing)))
+        try:
+            # An empty compression level selects the default level of the format
+            level = options.get('compression_level')
+            if level is None:
+                level = fallback['compression_level']
+            else:
+                level = int(level) if level != '' else None
+            pair = {'directory': options['dir'], 'tar_filename': options['tar_file'],
+                    'recursive': options.getboolean('recursive', fallback['recursive']),
+                    'symlinks_only': options.getboolean('symlinks_only', fallback['symlinks_only']),
+                    'compression': options.get('compression', fallback['compression']),
+                    'compression_level': level,
+                    'deterministic': options.getboolean('deterministic', fallback['deterministic']),
+                    'sharding': options.get('sharding', fallback['sharding']),
+                    'shard_count': options.getint('shard_count', fallback['shard_count']),
+                    'journal_segments': options.getint('journal_segments', fallback['journal_segments']),
+                    'archive_format': options.get('format', fallback['archive_format']),
+                    'member_index': options.getboolean('member_index', fallback['member_index']),
+                    'compression_threads': options.getint('compression_threads', fallback['compression_threads'])}
+        except ValueError as xcpt:
+            raise ValueError("Invalid option in section {0:}: {1:}".format(section, str(xcpt)))
+        if pair['compression'] not in COMPRESSIONS:
+            raise ValueError("Unknown compression format {0:} in section {1:}.".format(pair['compression'], section))
+        try:
+            check_compression_level(pair['compression'], pair['compression_level'])
+        except ValueError as xcpt:
+            raise ValueError("Invalid option in section {0:}: {1:}".format(section, str(xcpt)))
+        if pair['sharding'] not in SHARDINGS:
+            raise ValueError("Unknown sharding {0:} in section {1:}.".format(pair['sharding'], section))
+        for option in ('shard_count', 'compression_threads'):
+            if pair[option] < 1:
+                raise ValueError("The option {0:} of section {1:} must be at least 1.".format(option, section))
+        if pair['archive_format'] not in FORMATS:
+            raise ValueError("Unknown format {0:} in section {1:}.".format(pair['archive_format'], section))
+        if pair['archive_format'] == 'manifest' and not (pair['recursive'] or pair['symlinks_only']):
+            raise ValueError("The manifest format of section {0:} needs recursive or symlinks_only.".format(section))
+        if pair['member_index'] and (pair['compression'] != 'none' or pair['sharding'] != 'none' or
+                                     pair['archive_format'] != 'tar'):
+            raise ValueError("The member index of section {0:} needs an uncompressed tar file without "
+                             "sharding.".format(section))
+        pairs.append(pair)
+    return pairs
+
+
+def startup_sync(directory: str, tar_filename: str, log: logging.Logger, state: StateStore, recursive: bool = False,
+                 symlinks_only: bool = False) -> None:
+    """
+    Extracts the tar file if it changed since it was last seen, according to the fingerprint in the state store. Of a
+    sharded archive only the shards that changed since the stored shard index are extracted, and of a tar file with a
+    member index sidecar only the members that changed since the stored manifest are read.
 
     :param directory: Path of the directory containing the symbolic links.
     :type directory: str
     :param tar_filename: Path with the filename of the tar file where the symbolic links are stored.
     :type tar_filename: str
     :param log: Logger to write the status or error messages.
+    :type log: logging.Logger
+    :param state: Store of the fingerprints and manifests of the tar files.
+    :type state: StateStore
+    :param recursive: True to store the symbolic links of the whole directory tree, False to store only the top level
+    directory entries.
+    :type recursive: bool
+    :param symlinks_only: True to store only the symbolic links of the top level directory in non-recursive mode.
+    :type symlinks_only: bool
+    :return: Nothing
+    """
+    stored = state.load_fingerprint(tar_filename)
+    if stored is not None:
+        fingerprint = fingerprint_tar_file(tar_filename, stored)
+        if stored[2] == '':
+            # Legacy entry, holding only the modification time truncated to seconds
+            changed = stored[1] // 1000000000 < fingerprint[1] // 1000000000
+        else:
+            changed = fingerprint[2] != stored[2]
+        if changed:
+            log.info("Found newer tar file; config: {0:} - file: {1:}".format(format_fingerprint(stored),
+                                                                              format_fingerprint(fingerprint)))
+            try:
+                # The stored manifest lets the store only rewrite the entries that changed
+                previous = state.load_manifest(tar_filename)
+                if is_shard_index(tar_filename):
+                    manifest, counts, index = extract_shards(tar_filename, directory, recursive, symlinks_only,
+                                                             state.load_shard_index(tar_filename), previous)
+                else:
+                    members = load_member_index(tar_filename, fingerprint[2]) if previous is not None else None
+                    if members is not None:
+                        manifest, counts = extract_members(tar_filename, directory, members, previous, recursive,
+                                                           symlinks_only)
+                    else:
+                        manifest, counts = extract_archive(tar_filename, directory, recursive, symlinks_only)
+                    index = None
+                state.save_shard_index(tar_filename, index)
+                state.save_manifest(tar_filename, manifest, previous)
+                log.info("Extracted file {0:} with {1:} elements: {2:} created, {3:} retargeted, {4:} "
+                         "removed.".format(tar_filename, counts['elements'], counts['created'],
+                                           counts['retargeted'], counts['removed']))
+                state.save_fingerprint(tar_filename, fingerprint)
+            except Exception as e:
+                log.error("Failed to extract file {0:}. Error: {1:}".format(tar_filename, str(e)))
+        elif fingerprint != stored:
+            state.save_fingerprint(tar_filename, fingerprint)
+    else:
+        state.save_fingerprint(tar_filename, fingerprint_tar_file(tar_filename))
+
+
+def watch_pairs(pairs: List[Dict[str, Any]], log: logging.Logger, event: threading.Event, state_filename: str,
+                quiet_window: float = 0.5, max_latency: float = 5.0, sync_workers: int = 2,
+                poll_interval: Optional[float] = None, watch_strategy: str = 'tree', rescan_interval: float = 60.0,
+                stable_polls: int = 2, verify_gzip: bool = False, max_watches: int = 4096) -> None:
+    """
+    Synchronizes many symbolic links directory and tar file pairs in a single process. The pairs whose directory or
+    tar file does not exist are skipped. All the pairs share one state store, one inotify instance read by a single
+    thread, one debounce scheduler and one bounded pool of synchronization workers, so the threads and memory of the
+    process depend on the number of workers rather than on the number of pairs. The watches of the tar files of the
+    pairs that share a directory are merged into a single watch. In polling mode there is no watch and the pairs are
+    polled instead.
+
+    :param pairs: Keyword arguments of every pair: directory, tar_filename and optionally recursive, symlinks_only,
+    compression, compression_level, deterministic, sharding, shard_count, journal_segments, archive_format,
+    member_index and compression_threads.
+    :type pairs: List[Dict[str, Any]]
+    :param log: Logger to write the status or error messages.
     :type log: logging.Loger
     :param event: Event to stop the main thread and the observers threads.
     :type event: threading.Event
-    :param config_filename: Configuration path and filename of the ini file containing the tar filenames and dates.
-    :type config_filename: str
-    :return:
+    :param state_filename: Path of the sqlite database holding the fingerprints and manifests of the tar files.
+    :type state_filename: str
+    :param quiet_window: Seconds without events before a change is handled.
+    :type quiet_window: float
+    :param max_latency: Maximum seconds between a change and its handling under a steady stream of events.
+    :type max_latency: float
+    :param sync_workers: Maximum number of synchronizations run at the same time.
+    :type sync_workers: int
+    :param poll_interval: Seconds between two polls of every pair in polling mode. None to use the file system
+    observer.
+    :type poll_interval: Optional[float]
+    :param watch_strategy: Placement of the watches of the recursive pairs, one of WATCH_STRATEGIES
+    :type watch_strategy: str
+    :param rescan_interval: Seconds between two polls of the directories without a watch in the symlink-dirs strategy.
+    :type rescan_interval: float
+    :param stable_polls: Number of consecutive polls with the same size and modification time of a tar file before
+    it is extracted.
+    :type stable_polls: int
+    :param verify_gzip: Check the CRC-32 and size of every gzip member of a stable tar file before extracting it.
+    :type verify_gzip: bool
+    :param max_watches: Maximum number of inotify watches of every recursive pair in the symlink-dirs strategy.
+    :type max_watches: int
+    :return: Nothing
     """
 
-    # Check if the directory exists
-    if not os.path.isdir(directory):
-        log.error('Directory {0:} does not exist'.format(directory))
-        sys.exit(1)
-    # Check if the tar file exists
-    if not os.path.isfile(tar_filename):
-        log.error('Tar file {0:} does not exist'.format(tar_filename))
+    # Check if the directories and the tar files exist
+    valid_pairs = list()
+    for pair in pairs:
+        if not os.path.isdir(pair['directory']):
+            log.error('Directory {0:} does not exist'.format(pair['directory']))
+        elif not os.path.isfile(pair['tar_filename']):
+            log.error('Tar file {0:} does not exist'.format(pair['tar_filename']))
+        else:
+            valid_pairs.append(pair)
+    if len(valid_pairs) == 0:
         sys.exit(1)
 
-    # Load or creation of the configuration file
-    tar_file_time = (datetime.datetime.utcfromtimestamp(int(os.path.getmtime(tar_filename))).
-                     strftime('%Y-%m-%d %H:%M:%S'))
-    config = configparser.ConfigParser()
-    config.read(config_filename)
-    if 'main' in config.sections():
-        if tar_filename in config['main']:
-            config_file_time = config['main'][tar_filename]
-            tar_time = datetime.datetime.strptime(tar_file_time, '%Y-%m-%d %H:%M:%S')
-            config_time = datetime.datetime.strptime(config_file_time, '%Y-%m-%d %H:%M:%S')
-            if config_time < tar_time:
-                log.info("Found newer tar file; config: {0:} - file: {1:}".format(config_file_time, tar_file_time))
-                try:
-                    with tarfile.open(tar_filename, "r:gz") as tar:
-                        log.info("Extracting file {0:} with {1:} elements.".format(tar_filename, len(tar.getnames())))
-                        tar.extractall(directory, members=tar.getmembers())
-                        tar.close()
-                    tar_file_time = (datetime.datetime.utcfromtimestamp(int(os.path.getmtime(tar_filename))).
-                                     strftime('%Y-%m-%d %H:%M:%S'))
-                    config.set('main', tar_filename, tar_file_time)
-                    with open(config_filename, 'w') as f:
-                        config.write(f)
-                        f.close()
-                except Exception as e:
-                    log.error("Failed to extract file {0:}. Error: {1:}".format(tar_filename, str(e)))
-        else:
-            config.set('main', tar_filename, tar_file_time)
-            with open(config_filename, 'w') as f:
-                config.write(f)
-                f.close()
-    else:
-        config.add_section('main')
-        config.set('main', tar_filename, tar_file_time)
-        with open(config_filename, 'w') as f:
-            config.write(f)
-            f.close()
-
-    # Creation and start of the file system observers
-    observer_tar_file = Observer()
-    observer_directory = Observer()
-    event_handler_dir = SymLinksEventHandler(tar_filename=tar_filename, symlinks_directory=directory, recursive=recursive, log=log)
-    observer_directory.schedule(event_handler_dir, directory, recursive=True)
-    event_handler_tar = TarEventHandler(tar_filename=tar_filename, symlinks_directory=directory, log=log)
-    observer_tar_file.schedule(event_handler_tar, tar_filename, recursive=False)
-    event_handler_dir.tar_event_handler = event_handler_tar
-    event_handler_tar.symlink_event_handler = event_handler_dir
-    observer_directory.start()
-    observer_tar_file.start()
+    # Open the state store and extract the tar files that changed since they were last seen
+    state = StateStore(state_filename)
+    for pair in valid_pairs:
+        startup_sync(pair['directory'], pair['tar_filename'], log, state, pair.get('recursive', False),
+                     pair.get('symlinks_only', False))
+
     try:
-        while not event.is_set():
-            time.sleep(1)
+        asyncio.run(serve_pairs(valid_pairs, log, event, state, quiet_window, max_latency, sync_workers,
+                                poll_interval, watch_strategy, rescan_interval, stable_polls, verify_gzip,
+                                max_watches))
     except KeyboardInterrupt:  # pragma: nocover
         pass
     finally:
-        observer_tar_file.stop()
-        observer_directory.stop()
-        observer_tar_file.join()
-        observer_directory.join()
+        state.close()
+
+
+async def serve_pairs(pairs: List[Dict[str, Any]], log: logging.Logger, event: threading.Event, state: StateStore,
+                      quiet_window: float = 0.5, max_latency: float = 5.0, sync_workers: int = 2,
+                      poll_interval: Optional[float] = None, watch_strategy: str = 'tree',
+                      rescan_interval: float = 60.0, stable_polls: int = 2, verify_gzip: bool = False,
+                      max_watches: int = 4096) -> None:
+    """
+    Core of the program, run on an asyncio event loop. The inotify dispatcher, or the file system observer where
+    inotify is not available, pushes the events into the debounce scheduler queue of the loop, the debouncing is done
+    with loop timers and the blocking work of the synchronizations is sent to a bounded pool of worker threads. In
+    polling mode the changes are found by a poller task per pair instead. It returns as soon as the stop event is
+    set.
+
+    :param pairs: Keyword arguments of every pair: directory, tar_filename and optionally recursive, symlinks_only,
+    compression, compression_level, deterministic, sharding, shard_count, journal_segments, archive_format,
+    member_index and compression_threads. Their directory and tar file must exist.
+    :type pairs: List[Dict[str, Any]]
+    :param log: Logger to write the status or error messages.
+    :type log: logging.Loger
+    :param event: Event to stop the event loop and the observer threads.
+    :type event: threading.Event
+    :param state: Store of the fingerprints and manifests of the tar files.
+    :type state: StateStore
+    :param quiet_window: Seconds without events before a change is handled.
+    :type quiet_window: float
+    :param max_latency: Maximum seconds between a change and its handling under a steady stream of events.
+    :type max_latency: float
+    :param sync_workers: Maximum number of synchronizations run at the same time.
+    :type sync_workers: int
+    :param poll_interval: Seconds between two polls of every pair in polling mode. None to use the file system
+    observer.
+    :type poll_interval: Optional[float]
+    :param watch_strategy: Placement of the watches of the recursive pairs, one of WATCH_STRATEGIES
+    :type watch_strategy: str
+    :param rescan_interval: Seconds between two polls of the directories without a watch in the symlink-dirs strategy.
+    :type rescan_interval: float
+    :param stable_polls: Number of consecutive polls with the same size and modification time of a tar file before
+    it is extracted.
+    :type stable_polls: int
+    :param verify_gzip: Check the CRC-32 and size of every gzip member of a stable tar file before extracting it.
+    :type verify_gzip: bool
+    :param max_watches: Maximum number of inotify watches of every recursive pair in the symlink-dirs strategy.
+    :type max_watches: int
+    :return: Nothing
+    """
+    loop = asyncio.get_running_loop()
+    scheduler = DebounceScheduler(quiet_window=quiet_window, max_latency=max_latency, log=log, loop=loop)
+    engine = SyncEngine(max_workers=sync_workers, log=log, loop=loop)
+    # All the pairs share one inotify instance and its reading thread. The watchdog observer, which starts threads for
+    # every watch, is only used where inotify is not available
+    dispatcher = None
+    if poll_interval is None and InotifyConstants is not None:
+        try:
+            dispatcher = InotifyDispatcher(log)
+        except OSError as xcpt:
+            # The watchdog observer would need an inotify instance too
+            log.warning("Cannot create an inotify instance, polling every pair instead. Exception: {0:}.".format(
+                str(xcpt)))
+    observer = Observer() if poll_interval is None and InotifyConstants is None else None
+    # The polls of the directories without a watch of all the pairs are run one after the other by a single thread
+    poll_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='SymlinkDirectoryWatcher')
+    pollers = list()
+    watchers = list()
+    for pair in pairs:
+        event_handler_dir = SymLinksEventHandler(tar_filename=pair['tar_filename'],
+                                                 symlinks_directory=pair['directory'], log=log,
+                                                 recursive=pair.get('recursive', False), state=state,
+                                                 symlinks_only=pair.get('symlinks_only', False),
+                                                 compression=pair.get('compression', 'gz'),
+                                                 compression_level=pair.get('compression_level'),
+                                                 deterministic=pair.get('deterministic', False),
+                                                 scheduler=scheduler, engine=engine,
+                                                 sharding=pair.get('sharding', 'none'),
+                                                 shard_count=pair.get('shard_count', 16),
+                                                 journal_segments=pair.get('journal_segments', 32),
+                                                 archive_format=pair.get('archive_format', 'tar'),
+                                                 member_index=pair.get('member_index', False),
+                                                 compression_threads=pair.get('compression_threads', 1))
+        event_handler_tar = TarEventHandler(tar_filename=pair['tar_filename'], symlinks_directory=pair['directory'],
+                                            log=log, state=state, scheduler=scheduler, engine=engine,
+                                            stable_polls=stable_polls, verify_gzip=verify_gzip)
+        event_handler_dir.tar_event_handler = event_handler_tar
+        event_handler_tar.symlink_event_handler = event_handler_dir
+        if dispatcher is not None:
+            if pair.get('recursive', False) and watch_strategy == 'symlink-dirs':
+                watcher = SymlinkDirectoryWatcher(event_handler_dir, rescan_interval, max_watches, dispatcher)
+            else:
+                # Only the top level directory is watched in non-recursive mode
+                watcher = DirectoryWatcher(event_handler_dir, dispatcher)
+            pair_watchers = [watcher, TarDirectoryWatcher(event_handler_tar, dispatcher)]
+            try:
+                for watcher in pair_watchers:
+                    watcher.start()
+            except OSError as xcpt:
+                # Such as the limit of inotify watches of the user, which must not stop the other pairs
+                log.warning("Cannot watch the pair {0:}, polling it instead. Exception: {1:}.".format(
+                    pair['directory'], str(xcpt)))
+                for watcher in pair_watchers:
+                    watcher.stop()
+                pollers.append(loop.create_task(Poller(event_handler_dir, event_handler_tar).run()))
+                continue
+            watchers.extend(pair_watchers)
+            if isinstance(pair_watchers[0], SymlinkDirectoryWatcher):
+                pollers.append(loop.create_task(pair_watchers[0].run(poll_executor)))
+        elif observer is not None:
+            observer.schedule(event_handler_dir, pair['directory'], recursive=pair.get('recursive', False))
+            observer.schedule(event_handler_tar, os.path.dirname(os.path.abspath(pair['tar_filename'])),
+                              recursive=False)
+        else:
+            # Without a poll interval the pairs are polled because inotify failed
+            pollers.append(loop.create_task(Poller(event_handler_dir, event_handler_tar, poll_interval
+                                                   if poll_interval is not None else 5.0).run()))
+    if dispatcher is not None:
+        dispatcher.start()
+    if observer is not None:
+        observer.start()
+    try:
+        await asyncio.to_thread(event.wait)
+    finally:
+        # The waiting thread must return for the loop to close when the core is cancelled
+        event.set()
+        if observer is not None:
+            observer.stop()
+            observer.join()
+        for poller in pollers:
+            poller.cancel()
+        await asyncio.gather(*pollers, return_exceptions=True)
+        poll_executor.shutdown()
+        for watcher in watchers:
+            watcher.stop()
+        if dispatcher is not None:
+            dispatcher.close()
+        scheduler.stop()
+        # The running synchronizations are waited for in a worker thread, so they do not block the event loop
+        await asyncio.to_thread(engine.stop)
+
+
+def main(directory: str, tar_filename: str, log: logging.Logger, event: threading.Event, state_filename: str,
+         recursive: bool = False, symlinks_only: bool = False, compression: str = 'gz',
+         compression_level: Optional[int] = None, deterministic: bool = False, quiet_window: float = 0.5,
+         max_latency: float = 5.0, sync_workers: int = 2, poll_interval: Optional[float] = None,
+         watch_strategy: str = 'tree', rescan_interval: float = 60.0, stable_polls: int = 2,
+         verify_gzip: bool = False, sharding: str = 'none', shard_count: int = 16,
+         journal_segments: int = 32, archive_format: str = 'tar', member_index: bool = False,
+         compression_threads: int = 1, max_watches: int = 4096) -> None:
+    """
+    Main function that tests for the existence of the tar file and symlink directory, opens the state store, extracts
+    the tar file if it changed since it was last seen and starts the file system observer
+
+    :param directory: Path of the directory containing the symbolic links.
+    :type directory: str
+    :param tar_filename: Path with the filename of the tar file where the symbolic links are stored.
+    :type tar_filename: str
+    :param log: Logger to write the status or error messages.
+    :type log: logging.Loger
+    :param event: Event to stop the main thread and the observers threads.
+    :type event: threading.Event
+    :param state_filename: Path of the sqlite database holding the fingerprints and manifests of the tar files.
+    :type state_filename: str
+    :param recursive: True to store the symbolic links of the whole directory tree, False to store only the top level
+    directory entries.
+    :type recursive: bool
+    :param symlinks_only: True to store only the symbolic links of the top level directory in non-recursive mode.
+    :type symlinks_only: bool
+    :param compression: Compression format of the tar file, one of COMPRESSIONS
+    :type compression: str
+    :param compression_level: Compression level or preset of the format. None for the default one.
+    :type compression_level: Optional[int]
+    :param deterministic: True to write byte-reproducible tar files.
+    :type deterministic: bool
+    :param quiet_window: Seconds without events before a change is handled.
+    :type quiet_window: float
+    :param max_latency: Maximum seconds between a change and its handling under a steady stream of events.
+    :type max_latency: float
+    :param sync_workers: Maximum number of synchronizations run at the same time.
+    :type sync_workers: int
+    :param poll_interval: Seconds between two polls of the directory and tar file in polling mode. None to use the
+    file system observer.
+    :type poll_interval: Optional[float]
+    :param watch_strategy: Placement of the watches of the directory in recursive mode, one of WATCH_STRATEGIES
+    :type watch_strategy: str
+    :param rescan_interval: Seconds between two polls of the directories without a watch in the symlink-dirs strategy.
+    :type rescan_interval: float
+    :param stable_polls: Number of consecutive polls with the same size and modification time of a tar file before
+    it is extracted.
+    :type stable_polls: int
+    :param verify_gzip: Check the CRC-32 and size of every gzip member of a stable tar file before extracting it.
+    :type verify_gzip: bool
+    :param sharding: Layout of the archive, one of SHARDINGS. With a sharded or journal layout the tar file holds the
+    index of the shards or segments.
+    :type sharding: str
+    :param shard_count: Number of shards of the hash layout.
+    :type shard_count: int
+    :param journal_segments: Number of segments of the journal layout that triggers its compaction.
+    :type journal_segments: int
+    :param archive_format: Format of the tar file, or of its shards, one of FORMATS.
+    :type archive_format: str
+    :param member_index: True to write a member index sidecar next to the uncompressed tar file.
+    :type member_index: bool
+    :param compression_threads: Number of threads compressing a gzip tar file in parallel.
+    :type compression_threads: int
+    :param max_watches: Maximum number of inotify watches of the directory in the symlink-dirs strategy.
+    :type max_watches: int
+    :return:
+    """
+    watch_pairs([{'directory': directory, 'tar_filename': tar_filename, 'recursive': recursive,
+                  'symlinks_only': symlinks_only, 'compression': compression, 'compression_level': compression_level,
+                  'deterministic': deterministic, 'sharding': sharding, 'shard_count': shard_count,
+                  'journal_segments': journal_segments, 'archive_format': archive_format,
+                  'member_index': member_index, 'compression_threads': compression_threads}], log, event,
+                state_filename, quiet_window, max_latency, sync_workers, poll_interval, watch_strategy, rescan_interval,
+                stable_polls, verify_gzip, max_watches)
 
 
 if __name__ == "__main__":  # pragma: no cover
     # Config the program arguments
     parser = argparse.ArgumentParser()
-    parser.add_argument('-d', '--dir', help='Directory to tar', required=True)
-    parser.add_argument('-f', '--tar-file', help='Location of the tar file containing ', required=True)
+    parser.add_argument('-d', '--dir', help='Directory to tar', required=False, default=None)
+    parser.add_argument('-f', '--tar-file', help='Location of the tar file containing ', required=False, default=None)
+    parser.add_argument('--config', help='ini file with a section per directory and tar file pair to synchronize',
+                        required=False, default=None)
     parser.add_argument('-r', '--recursive', help='Location of the tar file containing ', required=False, action='store_true')
+    parser.add_argument('-s', '--symlinks-only', help='Store only the symbolic links in non-recursive mode',
+                        required=False, action='store_true')
+    parser.add_argument('-c', '--compression', help='Compression format of the tar file. zstd needs the optional '
+                        'zstandard package', required=False,
+                        choices=COMPRESSIONS, default='gz')
+    parser.add_argument('--compression-level', help='Compression level or preset of the compression format',
+                        required=False, type=int, default=None)
+    parser.add_argument('--compression-threads', help='Number of threads compressing a gzip tar file in parallel, '
+                        'as a multi-member gzip file', required=False, type=int, default=1)
+    parser.add_argument('--deterministic', help='Write byte-reproducible tar files', required=False,
+                        action='store_true')
+    parser.add_argument('--sharding', help='Write a tar file per top level subdirectory or per hash bucket, or a '
+                        'journal of changes, indexed by the tar file', required=False, choices=SHARDINGS,
+                        default='none')
+    parser.add_argument('--shard-count', help='Number of shards of the hash sharding', required=False, type=int,
+                        default=16)
+    parser.add_argument('--journal-segments', help='Number of journal segments that triggers a compaction',
+                        required=False, type=int, default=32)
+    parser.add_argument('--format', help='Format of the tar file: tar, or a compact manifest of the symbolic links '
+                        'that needs --recursive or --symlinks-only', required=False, choices=FORMATS, default='tar')
+    parser.add_argument('--member-index', help='Write an index of the member offsets next to the tar file, so only '
+                        'the changed members are read. It needs --compression none', required=False,
+                        action='store_true')
+    parser.add_argument('--convert', help='Convert a file holding only symbolic links to the --format and '
+                        '--compression given and exit', required=False, nargs=2, metavar=('SOURCE', 'DESTINATION'),
+                        default=None)
     parser.add_argument('-l', '--log-file', help='Log file to record program progress', required=False, default=None)
+    parser.add_argument('--quiet-window', help='Seconds without events before a change is handled', required=False,
+                        type=float, default=0.5)
+    parser.add_argument('--max-latency', help='Maximum seconds to handle a change under a steady stream of events',
+                        required=False, type=float, default=5.0)
+    parser.add_argument('--sync-workers', help='Maximum number of synchronizations run at the same time',
+                        required=False, type=int, default=2)
+    parser.add_argument('--poll-interval', help='Poll the directories and tar files every given seconds instead of '
+                        'watching file system events, for mounts that do not deliver them', required=False,
+                        type=float, default=None)
+    parser.add_argument('--watch-strategy', help='Watch the whole directory tree or only the directories that hold '
+                        'symbolic links in recursive mode', required=False, choices=WATCH_STRATEGIES, default='tree')
+    parser.add_argument('--rescan-interval', help='Seconds between two polls of the directories without a watch',
+                        required=False, type=float, default=60.0)
+    parser.add_argument('--max-watches', help='Maximum number of inotify watches of every directory in the '
+                        'symlink-dirs strategy. The other directories are found by the polls', required=False,
+                        type=int, default=4096)
+    parser.add_argument('--stable-polls', help='Number of polls with the same size and modification time of a tar '
+                        'file before it is extracted', required=False, type=int, default=2)
+    parser.add_argument('--verify-gzip', help='Check the gzip trailers of a tar file before it is extracted',
+                        required=False, action='store_true')
+    parser.add_argument('--state-file', help='sqlite database holding the state of the tar files', required=False,
+                        default=os.path.join(os.path.dirname(os.path.realpath(__file__)), 'cloud_symlinks.db'))
     args = parser.parse_args()
+    if args.convert is None and (args.config is None) == (args.dir is None or args.tar_file is None):
+        parser.error('either --dir and --tar-file or --config are required')
+    if args.format == 'manifest' and args.config is None and args.convert is None and not (args.recursive or
+                                                                                          args.symlinks_only):
+        parser.error('the manifest format needs --recursive or --symlinks-only')
+    if args.member_index and args.config is None and (args.compression != 'none' or args.sharding != 'none' or
+                                                      args.format != 'tar'):
+        parser.error('the member index needs --compression none, --sharding none and --format tar')
+    if args.max_watches < 1:
+        parser.error('--max-watches must be at least 1')
+    if args.shard_count < 1:
+        parser.error('--shard-count must be at least 1')
+    if args.compression_threads < 1:
+        parser.error('--compression-threads must be at least 1')
+    if args.sync_workers < 1:
+        parser.error('--sync-workers must be at least 1')
+    if args.config is None:
+        try:
+            check_compression_level(args.compression, args.compression_level)
+        except ValueError as e:
+            parser.error(str(e))
 
     # Turn on the logger
     logger = logging.getLogger(__name__)
@@ -351,9 +4204,43 @@ if __name__ == "__main__":  # pragma: no cover
         logging.basicConfig(format='%(asctime)s.%(msecs)03d [%(levelname)s] %(message)s', handlers=[handler],
                             encoding='utf-8', level=logging.INFO, datefmt="%Y-%m-%d %H:%M:%S")
 
-    # Set up the config file
-    config_dir = os.path.dirname(os.path.realpath(__file__))
-    config_file = os.path.join(config_dir, 'cloud_symlinks.ini')
+    # Convert a file and exit
+    if args.convert is not None:
+        count = convert_archive(args.convert[0], args.convert[1], args.format, args.compression,
+                                args.compression_level, args.deterministic, args.compression_threads)
+        logger.info("Converted {0:} symbolic links of {1:} to {2:}.".format(count, args.convert[0], args.convert[1]))
+        sys.exit(0)
+
+    # Read the pairs of the config file. The options of the command line apply to the options no section sets
+    pairs = None
+    if args.config is not None:
+        try:
+            pairs = load_pairs(args.config, {'recursive': args.recursive, 'symlinks_only': args.symlinks_only,
+                                             'compression': args.compression,
+                                             'compression_level': args.compression_level,
+                                             'deterministic': args.deterministic, 'sharding': args.sharding,
+                                             'shard_count': args.shard_count,
+                                             'journal_segments': args.journal_segments, 'archive_format': args.format,
+                                             'member_index': args.member_index,
+                                             'compression_threads': args.compression_threads})
+        except (FileNotFoundError, ValueError) as e:
+            parser.error(str(e))
+
+    # Import the state of the legacy config file
+    config_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'cloud_symlinks.ini')
+    if os.path.isfile(config_file):
+        with contextlib.closing(StateStore(args.state_file)) as legacy_state:
+            legacy_state.import_config_file(config_file, [pair['tar_filename'] for pair in pairs]
+                                            if pairs is not None else [args.tar_file], logger)
 
     # Run the watchdogs
-    main(args.dir, args.tar_file, logger, threading.Event(), config_file, args.recursive)
+    if pairs is not None:
+        watch_pairs(pairs, logger, threading.Event(), args.state_file, args.quiet_window, args.max_latency,
+                    args.sync_workers, args.poll_interval, args.watch_strategy, args.rescan_interval,
+                    args.stable_polls, args.verify_gzip, args.max_watches)
+    else:
+        main(args.dir, args.tar_file, logger, threading.Event(), args.state_file, args.recursive, args.symlinks_only,
+             args.compression, args.compression_level, args.deterministic, args.quiet_window, args.max_latency,
+             args.sync_workers, args.poll_interval, args.watch_strategy, args.rescan_interval, args.stable_polls,
+             args.verify_gzip, args.sharding, args.shard_count, args.journal_segments, args.format, args.member_index,
+             args.compression_threads, args.max_watches)
@@ -1,23 +1,30 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import contextlib
+import datetime
 import tempfile
 import pytest
 import os
-import configparser
+
+from src.cloud_symlinks import StateStore
+
+# Fingerprint of a legacy entry, holding only a very old modification time
+LEGACY_FINGERPRINT = (-1, int((datetime.datetime(2020, 1, 1, 15, 16, 17) -
+                               datetime.datetime(1970, 1, 1)).total_seconds()) * 1000000000, '')
 
 
 @pytest.fixture(scope='function')
 def empty_config_file() -> str:
     """
-    Provides the path to an empty config file to be used by configparser tools
+    Provides the path to a state store that does not exist yet
 
-    :return: The path to the empty config file as a string
+    :return: The path to the state store as a string
     :rtype: str
     """
     temp_dir = tempfile.TemporaryDirectory()
 
-    yield os.path.join(temp_dir.name, 'cloud_symlinks.ini')
+    yield os.path.join(temp_dir.name, 'cloud_symlinks.db')
 
     temp_dir.cleanup()
 
@@ -25,21 +32,17 @@ def empty_config_file() -> str:
 @pytest.fixture(scope='function')
 def config_file_other() -> str:
     """
-    Provides the path to a config file with one entry in the section main. It is aimed to be used by configparser tools
+    Provides the path to a state store with the fingerprint of a tar file different from the tested ones
 
-    :return: The path to the config file as a string
+    :return: The path to the state store as a string
     :rtype: str
     """
     temp_dir = tempfile.TemporaryDirectory()
-    config_filename = os.path.join(temp_dir.name, 'cloud_symlinks.ini')
-    config = configparser.ConfigParser()
-    config.add_section('main')
-    config.set('main', '/a/b/c', '2020-01-01 15:16:17')
-    with open(config_filename, 'w') as f:
-        config.write(f)
-        f.close()
+    state_filename = os.path.join(temp_dir.name, 'cloud_symlinks.db')
+    with contextlib.closing(StateStore(state_filename)) as state:
+        state.save_fingerprint('/a/b/c', LEGACY_FINGERPRINT)
 
-    yield config_filename
+    yield state_filename
 
     temp_dir.cleanup()
 
@@ -47,21 +50,36 @@ def config_file_other() -> str:
 @pytest.fixture(scope='function')
 def config_file(one_file_tar_file: str) -> str:
     """
-    Provides the path to a config file with one entry OF A TAR FILE in the section main. The date of the configured
-    tar file is very old. It is aimed to be used by configparser tools
+    Provides the path to a state store with the fingerprint OF A TAR FILE. The fingerprint is a legacy one with a very
+    old date.
 
     :param one_file_tar_file: Fixture containing the path to a tar file with one file in it
     :type one_file_tar_file: str
+    :return: The path to the state store as a string
+    :rtype: str
+    """
+    temp_dir = tempfile.TemporaryDirectory()
+    state_filename = os.path.join(temp_dir.name, 'cloud_symlinks.db')
+    with contextlib.closing(StateStore(state_filename)) as state:
+        state.save_fingerprint(one_file_tar_file, LEGACY_FINGERPRINT)
+
+    yield state_filename
+
+    temp_dir.cleanup()
+
+
+@pytest.fixture(scope='function')
+def legacy_config_file() -> str:
+    """
+    Provides the path to a legacy ini config file with one entry in the section main
+
     :return: The path to the config file as a string
     :rtype: str
     """
     temp_dir = tempfile.TemporaryDirectory()
     config_filename = os.path.join(temp_dir.name, 'cloud_symlinks.ini')
-    config = configparser.ConfigParser()
-    config.add_section('main')
-    config.set('main', one_file_tar_file, '2020-01-01 15:16:17')
     with open(config_filename, 'w') as f:
-        config.write(f)
+        f.write('[main]\n/a/b/c = 2020-01-01 15:16:17\n')
         f.close()
 
     yield config_filename
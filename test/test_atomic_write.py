@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import tarfile
+import pytest
+import logging
+import threading
+import time
+import os
+
+from src.cloud_symlinks import UMASK
+from src.cloud_symlinks import main
+from src.cloud_symlinks import write_tar_file
+
+
+def test_atomic_write_01(directory_symlink: str, blank_tar_file: str) -> None:
+    """
+    Test to check that writing the tar file replaces it in one step, keeping its permissions and leaving no temporary
+    file behind, and that a failed write leaves the previous tar file untouched
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :return: Nothing
+    """
+    os.chmod(blank_tar_file, 0o640)
+    inode = os.stat(blank_tar_file).st_ino
+    write_tar_file(blank_tar_file, directory_symlink, {'link': ('/target/a', 0o777)})
+    assert os.stat(blank_tar_file).st_ino != inode
+    assert os.stat(blank_tar_file).st_mode & 0o777 == 0o640
+    assert os.listdir(os.path.dirname(blank_tar_file)) == ['test.tar.gz']
+    with open(blank_tar_file, 'rb') as f:
+        contents = f.read()
+        f.close()
+    with pytest.raises(FileNotFoundError):
+        write_tar_file(blank_tar_file, directory_symlink, {'missing.txt': ('', 0o644)})
+    with open(blank_tar_file, 'rb') as f:
+        assert f.read() == contents
+        f.close()
+    assert os.listdir(os.path.dirname(blank_tar_file)) == ['test.tar.gz']
+
+
+def test_atomic_write_02(caplog: pytest.LogCaptureFixture, logger: logging.Logger, directory_symlink: str,
+                         blank_tar_file: str, empty_config_file: str) -> None:
+    """
+    Test to check that the tar file is still observed after it has been replaced by the compression. A symbolic link
+    is added to the directory, which replaces the tar file, and then a peer writes a new tar file with another
+    symbolic link, that has to be extracted.
+
+    :param caplog: Pytest log capture fixture
+    :type caplog: pytest.LogCaptureFixture
+    :param logger: Current logger to pass to the main program to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :param empty_config_file: Path to an empty config file
+    :type empty_config_file: str
+    :return: Nothing
+    """
+    event = threading.Event()
+    caplog.set_level(logging.INFO)
+    thread: threading.Thread = threading.Thread(target=main, args=(directory_symlink, blank_tar_file, logger, event,
+                                                                   empty_config_file))
+    thread.start()
+    time.sleep(1)
+    os.symlink('/target/a', os.path.join(directory_symlink, 'a'))
+    time.sleep(1.5)
+    with tarfile.open(blank_tar_file, "r:gz") as tar:
+        assert tar.getnames() == ['a']
+        tar.close()
+    info = tarfile.TarInfo('b')
+    info.type = tarfile.SYMTYPE
+    info.linkname = '/target/b'
+    with tarfile.open(blank_tar_file, "w:gz") as tar:
+        tar.addfile(info)
+        tar.close()
+    time.sleep(1.5)
+    event.set()
+    time.sleep(2)
+    assert not thread.is_alive()
+    assert os.listdir(directory_symlink) == ['b']
+    assert caplog.records[-1].levelname == "INFO"
+
+
+def test_atomic_write_03(directory_symlink: str, temp_dir: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test to check that a new file written through a temporary file gets the permissions of the umask of the process
+    without setting the umask, which would change the permissions of the files other threads create meanwhile
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :param monkeypatch: Pytest fixture to detect the calls to os.umask
+    :type monkeypatch: pytest.MonkeyPatch
+    :return: Nothing
+    """
+    calls = list()
+    umask = os.umask
+    monkeypatch.setattr(os, 'umask', lambda mask: calls.append(mask) or umask(mask))
+    tar_filename = os.path.join(temp_dir, 'new.tar.gz')
+    write_tar_file(tar_filename, directory_symlink, {'link': ('/target/a', 0o777)})
+    assert calls == []
+    assert os.stat(tar_filename).st_mode & 0o777 == 0o666 & ~UMASK
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+import time
+import os
+
+from src.cloud_symlinks import COMPRESSION_LEVELS
+from src.cloud_symlinks import COMPRESSIONS
+from src.cloud_symlinks import build_manifest
+from src.cloud_symlinks import check_compression_level
+from src.cloud_symlinks import extract_tar_file
+from src.cloud_symlinks import open_tar_reader
+from src.cloud_symlinks import write_tar_file
+
+
+@pytest.mark.parametrize('compression', COMPRESSIONS)
+def test_compression_01(compression: str, directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that a tar file written with every available compression format is detected and extracted back
+
+    :param compression: Compression format to test
+    :type compression: str
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    for i in range(20):
+        os.symlink('/target/{0:}'.format(i), os.path.join(directory_symlink, 'link-{0:}'.format(i)))
+    manifest = build_manifest(directory_symlink, True)
+    tar_filename = os.path.join(temp_dir, 'test.tar')
+    write_tar_file(tar_filename, directory_symlink, manifest, compression, 1)
+    os.mkdir(os.path.join(temp_dir, 'extracted'))
+    with open_tar_reader(tar_filename) as tar:
+        extracted, counts = extract_tar_file(tar, os.path.join(temp_dir, 'extracted'), True)
+    assert counts['created'] == 20
+    assert extracted == manifest
+
+
+def test_compression_02(directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that an unknown compression format is rejected
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    with pytest.raises(ValueError):
+        write_tar_file(os.path.join(temp_dir, 'test.tar'), directory_symlink, dict(), 'lz4')
+
+
+@pytest.mark.parametrize('compression', COMPRESSIONS)
+def test_compression_03(compression: str, directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that in deterministic mode the same symbolic links produce the same bytes, no matter the order of
+    the manifest, the moment the tar file is written or its name
+
+    :param compression: Compression format to test
+    :type compression: str
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    os.mkdir(os.path.join(directory_symlink, 'dir'))
+    for i in range(20):
+        os.symlink('/target/{0:}'.format(i), os.path.join(directory_symlink, 'dir', 'link-{0:}'.format(i)))
+    manifest = build_manifest(directory_symlink, True)
+    reversed_manifest = dict(reversed(list(manifest.items())))
+    write_tar_file(os.path.join(temp_dir, 'first.tar'), directory_symlink, manifest, compression, None, True)
+    time.sleep(1.1)
+    write_tar_file(os.path.join(temp_dir, 'second.tar'), directory_symlink, reversed_manifest, compression, None,
+                   True)
+    with open(os.path.join(temp_dir, 'first.tar'), 'rb') as first, open(os.path.join(temp_dir, 'second.tar'),
+                                                                        'rb') as second:
+        assert first.read() == second.read()
+        first.close()
+        second.close()
+
+
+@pytest.mark.parametrize('compression', sorted(COMPRESSION_LEVELS))
+def test_compression_04(compression: str, directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that the lowest and highest compression levels of every format are accepted and write a tar file,
+    and that the levels outside them are rejected
+
+    :param compression: Compression format to test
+    :type compression: str
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    lowest, highest = COMPRESSION_LEVELS[compression]
+    for level in (lowest, highest):
+        check_compression_level(compression, level)
+        write_tar_file(os.path.join(temp_dir, 'test.tar'), directory_symlink, dict(), compression, level)
+    for level in (lowest - 1, highest + 1):
+        with pytest.raises(ValueError):
+            check_compression_level(compression, level)
+    check_compression_level(compression, None)
+    check_compression_level('none', 42)
@@ -1,23 +1,29 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import configparser
+import contextlib
+import tarfile
 import pytest
 import logging
 import threading
 import time
 import os
-import datetime
 
 from src.cloud_symlinks import main
+from src.cloud_symlinks import StateStore
+from src.cloud_symlinks import fingerprint_tar_file
+from src.cloud_symlinks import format_fingerprint
+from src.cloud_symlinks import parse_fingerprint
+from src.cloud_symlinks import startup_sync
+from src.cloud_symlinks import symlink_tar_info
+from test.fixtures.config_file import LEGACY_FINGERPRINT
 
 
 def test_config_file_01(caplog: pytest.LogCaptureFixture, logger: logging.Logger, directory_symlink: str,
                         blank_tar_file: str, empty_config_file: str) -> None:
     """
-    Test to check the creation of the config file if it does not exist. The main function should create it and add an
-    entry in the main section of the date of the added tar file. As Freezegun can freeze the date of the test but not
-    the fixtures, the test just checks that the date of the config file is OK.
+    Test to check the creation of the state store if it does not exist. The main function should create it and store
+    the fingerprint of the added tar file.
 
     :param caplog: Pytest log capture fixture
     :type caplog: pytest.LogCaptureFixture
@@ -42,19 +48,15 @@ def test_config_file_01(caplog: pytest.LogCaptureFixture, logger: logging.Logger
     assert not thread.is_alive()
     assert len(caplog.records) == 0
     assert os.path.exists(empty_config_file)
-    config = configparser.ConfigParser()
-    config.read(empty_config_file)
-    assert len(config.sections()) == 1
-    assert config.has_section('main')
-    assert blank_tar_file in config['main']
+    with contextlib.closing(StateStore(empty_config_file)) as state:
+        assert state.load_fingerprint(blank_tar_file) == fingerprint_tar_file(blank_tar_file)
 
 
 def test_config_file_02(caplog: pytest.LogCaptureFixture, logger: logging.Logger, directory_symlink: str,
                         blank_tar_file: str, config_file_other: str) -> None:
     """
-    Test to check the read of the config file with an entry different from the current tar file. The main function
-    should add an  entry in the main section of the date of the added tar file. As Freezegun can freeze the date of
-    the test but not the fixtures, the test just checks that the date of the config file is OK.
+    Test to check the read of the state store with an entry different from the current tar file. The main function
+    should add the fingerprint of the added tar file and keep the other entry.
 
     :param caplog: Pytest log capture fixture
     :type caplog: pytest.LogCaptureFixture
@@ -78,20 +80,16 @@ def test_config_file_02(caplog: pytest.LogCaptureFixture, logger: logging.Logger
     time.sleep(2)
     assert not thread.is_alive()
     assert len(caplog.records) == 0
-    assert os.path.exists(config_file_other)
-    config = configparser.ConfigParser()
-    config.read(config_file_other)
-    assert len(config.sections()) == 1
-    assert config.has_section('main')
-    assert blank_tar_file in config['main']
+    with contextlib.closing(StateStore(config_file_other)) as state:
+        assert state.load_fingerprint(blank_tar_file) == fingerprint_tar_file(blank_tar_file)
+        assert state.load_fingerprint('/a/b/c') == LEGACY_FINGERPRINT
 
 
 def test_config_file_03(caplog: pytest.LogCaptureFixture, logger: logging.Logger, directory_symlink: str,
                         one_file_tar_file: str, config_file: str) -> None:
     """
-    Test to check the update of the config file with an entry of the current tar file. The main function should update
-    the date it and uncompress the tar file in the symbolic links' directory. As Freezegun can freeze the date of the
-    test but not the fixtures, the test just checks that the date of the config file is OK.
+    Test to check the update of the state store with a legacy entry of the current tar file. The main function should
+    uncompress the tar file in the symbolic links' directory and store its fingerprint and manifest.
 
     :param caplog: Pytest log capture fixture
     :type caplog: pytest.LogCaptureFixture
@@ -119,20 +117,16 @@ def test_config_file_03(caplog: pytest.LogCaptureFixture, logger: logging.Logger
         assert record.levelname == "INFO"
     assert len([name for name in os.listdir(directory_symlink) if os.path.isfile(os.path.join(directory_symlink,
                                                                                               name))]) == 1
-    assert os.path.exists(config_file)
-    config = configparser.ConfigParser()
-    config.read(config_file)
-    assert len(config.sections()) == 1
-    assert config.has_section('main')
-    assert one_file_tar_file in config['main']
-    assert config['main'][one_file_tar_file].startswith(datetime.datetime.utcnow().strftime("%Y-%m-%d"))
+    with contextlib.closing(StateStore(config_file)) as state:
+        assert state.load_fingerprint(one_file_tar_file) == fingerprint_tar_file(one_file_tar_file)
+        assert state.load_manifest(one_file_tar_file) == {'test.txt': ('', 0o644)}
 
 
 def test_config_file_04(caplog: pytest.LogCaptureFixture, logger: logging.Logger, directory_symlink: str,
                         one_file_tar_file: str, config_file: str) -> None:
     """
-    Test to check the update of the config file with an entry of the current tar file, but with an error during the
-    extraction. The main function should not update the date it as the uncompress process fails.
+    Test to check the update of the state store with an entry of the current tar file, but with an error during the
+    extraction. The main function should not update the fingerprint as the uncompress process fails.
 
     :param caplog: Pytest log capture fixture
     :type caplog: pytest.LogCaptureFixture
@@ -156,14 +150,169 @@ def test_config_file_04(caplog: pytest.LogCaptureFixture, logger: logging.Logger
     event.set()
     time.sleep(2)
     assert not thread.is_alive()
-    assert len(caplog.records) == 3
-    for record in caplog.records[0:1]:
-        assert record.levelname == "INFO"
-    assert caplog.records[2].levelname == "ERROR"
-    assert os.path.exists(config_file)
-    config = configparser.ConfigParser()
-    config.read(config_file)
-    assert len(config.sections()) == 1
-    assert config.has_section('main')
-    assert one_file_tar_file in config['main']
-    assert config['main'][one_file_tar_file] == "2020-01-01 15:16:17"
+    assert len(caplog.records) == 2
+    assert caplog.records[0].levelname == "INFO"
+    assert caplog.records[1].levelname == "ERROR"
+    with contextlib.closing(StateStore(config_file)) as state:
+        assert state.load_fingerprint(one_file_tar_file) == LEGACY_FINGERPRINT
+
+
+def test_config_file_05(caplog: pytest.LogCaptureFixture, logger: logging.Logger, directory_symlink: str,
+                        one_file_tar_file: str, empty_config_file: str) -> None:
+    """
+    Test to check that the fingerprint stored in the state store avoids the extraction of a tar file whose contents
+    did not change, even if its modification time did, and that the new modification time is stored.
+
+    :param caplog: Pytest log capture fixture
+    :type caplog: pytest.LogCaptureFixture
+    :param logger: Current logger to pass to the main program to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param one_file_tar_file: Path to a tar file with files inside.
+    :type one_file_tar_file: str
+    :param empty_config_file: Path to an empty config file
+    :type empty_config_file: str
+    :return: Nothing
+    """
+    fingerprint = fingerprint_tar_file(one_file_tar_file)
+    assert parse_fingerprint(format_fingerprint(fingerprint)) == fingerprint
+    assert parse_fingerprint('2020-01-01 15:16:17') is None
+    with contextlib.closing(StateStore(empty_config_file)) as state:
+        state.save_fingerprint(one_file_tar_file, fingerprint)
+    os.utime(one_file_tar_file, ns=(fingerprint[1] + 1500000000, fingerprint[1] + 1500000000))
+    event = threading.Event()
+    caplog.set_level(logging.INFO)
+    thread: threading.Thread = threading.Thread(target=main, args=(directory_symlink, one_file_tar_file, logger, event,
+                                                                   empty_config_file))
+    thread.start()
+    time.sleep(1)
+    event.set()
+    time.sleep(2)
+    assert not thread.is_alive()
+    assert len(caplog.records) == 0
+    assert len(os.listdir(directory_symlink)) == 0
+    with contextlib.closing(StateStore(empty_config_file)) as state:
+        assert state.load_fingerprint(one_file_tar_file) == (fingerprint[0], fingerprint[1] + 1500000000,
+                                                             fingerprint[2])
+
+
+def test_config_file_06(caplog: pytest.LogCaptureFixture, logger: logging.Logger, directory_symlink: str,
+                        blank_tar_file: str, empty_config_file: str) -> None:
+    """
+    Test to check that the fingerprint and manifest of the tar file written by the compression are stored in the state
+    store, so a restart does not extract it again
+
+    :param caplog: Pytest log capture fixture
+    :type caplog: pytest.LogCaptureFixture
+    :param logger: Current logger to pass to the main program to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :param empty_config_file: Path to an empty config file
+    :type empty_config_file: str
+    :return: Nothing
+    """
+    event = threading.Event()
+    caplog.set_level(logging.INFO)
+    thread: threading.Thread = threading.Thread(target=main, args=(directory_symlink, blank_tar_file, logger, event,
+                                                                   empty_config_file))
+    thread.start()
+    time.sleep(1)
+    os.symlink('/target/a', os.path.join(directory_symlink, 'a'))
+    time.sleep(1.5)
+    event.set()
+    time.sleep(2)
+    assert not thread.is_alive()
+    with contextlib.closing(StateStore(empty_config_file)) as state:
+        assert state.load_fingerprint(blank_tar_file) == fingerprint_tar_file(blank_tar_file)
+        assert state.load_manifest(blank_tar_file) == {'a': ('/target/a', 0o777)}
+
+
+def test_config_file_07(empty_config_file: str, legacy_config_file: str) -> None:
+    """
+    Test to check the import of the legacy ini config file and the incremental update of the stored manifests
+
+    :param empty_config_file: Path to an empty state store
+    :type empty_config_file: str
+    :param legacy_config_file: Path to a legacy ini config file
+    :type legacy_config_file: str
+    :return: Nothing
+    """
+    with contextlib.closing(StateStore(empty_config_file)) as state:
+        state.import_config_file(legacy_config_file, ['/a/b/c'])
+        assert state.load_fingerprint('/a/b/c') == LEGACY_FINGERPRINT
+        assert state.load_manifest('/a/b/c') is None
+        first = {'a': ('/target/a', 0o777), 'b': ('/target/b', 0o777)}
+        state.save_manifest('/a/b/c', first)
+        second = {'a': ('/target/a', 0o777), 'c': ('/target/c', 0o777)}
+        state.save_manifest('/a/b/c', second, first)
+        assert state.load_manifest('/a/b/c') == second
+        state.save_manifest('/a/b/c', dict(), second)
+        assert state.load_manifest('/a/b/c') == dict()
+        assert state.load_fingerprint('/a/b/c') == LEGACY_FINGERPRINT
+
+
+def test_config_file_08(caplog: pytest.LogCaptureFixture, logger: logging.Logger, empty_config_file: str,
+                        temp_dir: str) -> None:
+    """
+    Test to check that the import of the legacy ini config file keeps the case of the configured tar file paths, that
+    only the configured tar files are imported, and that an unparseable entry is skipped and logged
+
+    :param caplog: Pytest log capture fixture
+    :type caplog: pytest.LogCaptureFixture
+    :param logger: Current logger to write to.
+    :type logger: logging.Logger
+    :param empty_config_file: Path to an empty state store
+    :type empty_config_file: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    legacy_filename = os.path.join(temp_dir, 'cloud_symlinks.ini')
+    with open(legacy_filename, 'w') as f:
+        # The legacy ini file was written by ConfigParser, which lowercases the option names
+        f.write('[main]\n/home/u/dropbox/a.tar.gz = 2020-01-01 15:16:17\n/home/u/dropbox/b.tar.gz = garbage\n'
+                '/home/u/dropbox/c.tar.gz = 2020-01-01 15:16:17\n')
+        f.close()
+    with contextlib.closing(StateStore(empty_config_file)) as state:
+        state.import_config_file(legacy_filename, ['/home/u/Dropbox/a.tar.gz', '/home/u/Dropbox/b.tar.gz'], logger)
+        assert state.load_fingerprint('/home/u/Dropbox/a.tar.gz') == LEGACY_FINGERPRINT
+        assert state.load_fingerprint('/home/u/dropbox/a.tar.gz') is None
+        assert state.load_fingerprint('/home/u/Dropbox/b.tar.gz') is None
+        assert state.load_fingerprint('/home/u/dropbox/c.tar.gz') is None
+    assert "Skipped the legacy state garbage" in caplog.records[-1].getMessage()
+
+
+def test_config_file_09(logger: logging.Logger, empty_config_file: str, directory_symlink: str,
+                        blank_tar_file: str) -> None:
+    """
+    Test to check that the startup synchronization updates the stored manifest incrementally, from the manifest it
+    had stored
+
+    :param logger: Current logger to write to.
+    :type logger: logging.Logger
+    :param empty_config_file: Path to an empty state store
+    :type empty_config_file: str
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :return: Nothing
+    """
+    with tarfile.open(blank_tar_file, "w:gz") as tar:
+        tar.addfile(symlink_tar_info('a', '/target/a', 0o777))
+        tar.addfile(symlink_tar_info('b', '/target/b', 0o777))
+        tar.close()
+    with contextlib.closing(StateStore(empty_config_file)) as state:
+        stored = {'a': ('/target/a', 0o777)}
+        state.save_manifest(blank_tar_file, stored)
+        state.save_fingerprint(blank_tar_file, (0, 0, 'old'))
+        calls = list()
+        save_manifest = state.save_manifest
+        state.save_manifest = lambda *args: calls.append(args) or save_manifest(*args)
+        startup_sync(directory_symlink, blank_tar_file, logger, state)
+        assert calls == [(blank_tar_file, {'a': ('/target/a', 0o777), 'b': ('/target/b', 0o777)}, stored)]
+        assert state.load_manifest(blank_tar_file) == calls[0][1]
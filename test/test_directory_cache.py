@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import contextlib
+import pytest
+import time
+import os
+
+from src.cloud_symlinks import StateStore
+from src.cloud_symlinks import build_manifest
+from src.cloud_symlinks import build_manifest_cached
+
+
+def backdate(directory: str) -> None:
+    """
+    Sets the modification time of every directory of a tree ten seconds in the past, so they are old enough to cache
+
+    :param directory: Path of the top level directory of the tree
+    :type directory: str
+    :return: Nothing
+    """
+    past = time.time_ns() - 10000000000
+    for path, dirs, files in os.walk(directory):
+        os.utime(path, ns=(past, past))
+
+
+def test_directory_cache_01(directory_symlink: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test to check that a scan with the directory cache only reads the directories that changed, that it gives the same
+    manifest as a full scan and that recently modified directories are not cached
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param monkeypatch: Pytest fixture to count the directories read
+    :type monkeypatch: pytest.MonkeyPatch
+    :return: Nothing
+    """
+    os.makedirs(os.path.join(directory_symlink, 'a', 'b'))
+    os.makedirs(os.path.join(directory_symlink, 'c'))
+    os.symlink('/target/top', os.path.join(directory_symlink, 'top'))
+    os.symlink('/target/a', os.path.join(directory_symlink, 'a', 'link'))
+    os.symlink('/target/b', os.path.join(directory_symlink, 'a', 'b', 'link'))
+    manifest, cache = build_manifest_cached(directory_symlink, True)
+    assert manifest == build_manifest(directory_symlink, True)
+    assert len(cache) == 0
+    backdate(directory_symlink)
+    manifest, cache = build_manifest_cached(directory_symlink, True, cache=cache)
+    assert sorted(cache.keys()) == ['', 'a', 'a/b', 'c']
+
+    read = list()
+    scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda path: read.append(path) or scandir(path))
+    assert build_manifest_cached(directory_symlink, True, cache=cache)[0] == manifest
+    assert len(read) == 0
+    os.remove(os.path.join(directory_symlink, 'a', 'b', 'link'))
+    os.symlink('/target/new', os.path.join(directory_symlink, 'a', 'b', 'link'))
+    os.rmdir(os.path.join(directory_symlink, 'c'))
+    manifest, new_cache = build_manifest_cached(directory_symlink, True, cache=cache)
+    assert read == [os.path.join(directory_symlink, ''), os.path.join(directory_symlink, 'a', 'b')]
+    assert manifest['a/b/link'] == ('/target/new', 0o777)
+    assert manifest == build_manifest(directory_symlink, True)
+    assert sorted(new_cache.keys()) == ['a']
+
+
+def test_directory_cache_02(directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that the directory cache survives a save and load round trip through the state store, including the
+    updates that only write the changed directories
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    os.makedirs(os.path.join(directory_symlink, 'a'))
+    os.symlink('/target/a', os.path.join(directory_symlink, 'a', 'link'))
+    backdate(directory_symlink)
+    manifest, cache = build_manifest_cached(directory_symlink, True)
+    with contextlib.closing(StateStore(os.path.join(temp_dir, 'cloud_symlinks.db'))) as state:
+        assert state.load_directory_cache('tar') == dict()
+        state.save_directory_cache('tar', cache)
+        assert state.load_directory_cache('tar') == cache
+        os.symlink('/target/top', os.path.join(directory_symlink, 'top'))
+        os.rename(os.path.join(directory_symlink, 'a'), os.path.join(directory_symlink, 'b'))
+        backdate(directory_symlink)
+        manifest, new_cache = build_manifest_cached(directory_symlink, True, cache=cache)
+        state.save_directory_cache('tar', new_cache, cache)
+        assert state.load_directory_cache('tar') == new_cache
+        assert sorted(new_cache.keys()) == ['', 'b']
+        assert new_cache[''][2] == {'b': None, 'top': ('/target/top', 0o777)}
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import pytest
+import watchdog.events
+
+from src.cloud_symlinks import StateStore
+from src.cloud_symlinks import SymLinksEventHandler
+from src.cloud_symlinks import SyncEngine
+from src.cloud_symlinks import serve_pairs
+
+
+def test_engine_01() -> None:
+    """
+    Test to check that the synchronizations requested while an archive is running mark it as dirty and produce exactly
+    one follow-up run, with the arguments of the last request, and that the runs of an archive never overlap
+
+    :return: Nothing
+    """
+    calls = list()
+    running = list()
+    overlaps = list()
+
+    def sync(value: int) -> None:
+        overlaps.append(len(running))
+        running.append(value)
+        time.sleep(0.3)
+        calls.append(value)
+        running.remove(value)
+
+    engine = SyncEngine(max_workers=4)
+    engine.submit('tar', sync, 0)
+    time.sleep(0.1)
+    for i in range(1, 100):
+        engine.submit('tar', sync, i)
+    time.sleep(1)
+    engine.stop()
+    assert calls == [0, 99]
+    assert overlaps == [0, 0]
+
+
+def test_engine_02() -> None:
+    """
+    Test to check that different archives are synchronized in parallel, that the pool of workers is bounded and that
+    an exception raised by a synchronization does not stop the archive from running again
+
+    :return: Nothing
+    """
+    calls = list()
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def sync(value: str) -> None:
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.2)
+        with lock:
+            running[0] -= 1
+        if value == 'fail':
+            raise ValueError(value)
+        calls.append(value)
+
+    engine = SyncEngine(max_workers=2)
+    for key in ('a', 'b', 'c', 'd'):
+        engine.submit(key, sync, key)
+    time.sleep(0.6)
+    engine.submit('e', sync, 'fail')
+    time.sleep(0.3)
+    engine.submit('e', sync, 'e')
+    time.sleep(0.3)
+    engine.stop()
+    assert sorted(calls) == ['a', 'b', 'c', 'd', 'e']
+    assert running[1] == 2
+
+
+def test_engine_03(logger: logging.Logger, directory_symlink: str, blank_tar_file: str, temp_dir: str,
+                   monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test to check that the core waits for a running compression when it is stopped without blocking its event loop
+
+    :param logger: Current logger to pass to the core to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :param monkeypatch: Pytest fixture to slow the compression down
+    :type monkeypatch: pytest.MonkeyPatch
+    :return: Nothing
+    """
+    compressing = threading.Event()
+    compressed = list()
+
+    def compress(event_handler_dir: SymLinksEventHandler, event: watchdog.events.FileSystemEvent) -> None:
+        compressing.set()
+        time.sleep(1.5)
+        compressed.append(event_handler_dir.symlinks_directory)
+
+    monkeypatch.setattr(SymLinksEventHandler, 'compress', compress)
+
+    async def serve() -> float:
+        event = threading.Event()
+        state = StateStore(os.path.join(temp_dir, 'state.db'))
+        task = asyncio.create_task(serve_pairs([{'directory': directory_symlink, 'tar_filename': blank_tar_file}],
+                                               logger, event, state, quiet_window=0.1, poll_interval=0.2))
+        # The link is created after the first poll, which only records the state of the directory
+        await asyncio.sleep(0.5)
+        gaps = list()
+        last = time.monotonic()
+        os.symlink('/target', os.path.join(directory_symlink, 'link'))
+        while not task.done():
+            await asyncio.sleep(0.05)
+            gaps.append(time.monotonic() - last)
+            last = time.monotonic()
+            if compressing.is_set():
+                event.set()
+        await task
+        state.close()
+        return max(gaps)
+
+    assert asyncio.run(serve()) < 0.5
+    assert compressed == [directory_symlink]
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import tarfile
+import pytest
+import os
+
+from src.cloud_symlinks import apply_manifest
+from src.cloud_symlinks import extract_tar_file
+
+
+def add_symlink(tar: tarfile.TarFile, name: str, target: str) -> None:
+    """
+    Adds a symbolic link member to a tar file
+
+    :param tar: Tar file opened for writing
+    :type tar: tarfile.TarFile
+    :param name: Name of the symbolic link inside the tar file
+    :type name: str
+    :param target: Target of the symbolic link
+    :type target: str
+    :return: Nothing
+    """
+    info = tarfile.TarInfo(name)
+    info.type = tarfile.SYMTYPE
+    info.linkname = target
+    info.mode = 0o777
+    tar.addfile(info)
+
+
+def test_extraction_01(directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that the extraction only applies the differences between the tar file and the symbolic links
+    directory. The directory has an up-to-date link, a link with an old target and a link not present in the tar file,
+    while the tar file has a link missing in the directory.
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    os.symlink('/target/a', os.path.join(directory_symlink, 'a'))
+    os.symlink('/target/old', os.path.join(directory_symlink, 'b'))
+    os.symlink('/target/c', os.path.join(directory_symlink, 'c'))
+    inode = os.lstat(os.path.join(directory_symlink, 'a')).st_ino
+    tar_filename = os.path.join(temp_dir, 'test.tar.gz')
+    with tarfile.open(tar_filename, "w:gz") as tar:
+        add_symlink(tar, 'a', '/target/a')
+        add_symlink(tar, 'b', '/target/b')
+        add_symlink(tar, 'd', '/target/d')
+        tar.close()
+    with tarfile.open(tar_filename, "r|gz") as tar:
+        manifest, counts = extract_tar_file(tar, directory_symlink, False)
+        assert len(tar.members) == 0
+        tar.close()
+    assert counts == {'elements': 3, 'created': 1, 'retargeted': 1, 'removed': 1}
+    assert sorted(os.listdir(directory_symlink)) == ['a', 'b', 'd']
+    assert os.lstat(os.path.join(directory_symlink, 'a')).st_ino == inode
+    assert os.readlink(os.path.join(directory_symlink, 'b')) == '/target/b'
+    assert manifest == {'a': ('/target/a', 0o777), 'b': ('/target/b', 0o777), 'd': ('/target/d', 0o777)}
+
+
+def test_extraction_02(directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that a tar file with a member outside the symbolic links directory is rejected
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    tar_filename = os.path.join(temp_dir, 'test.tar.gz')
+    with tarfile.open(tar_filename, "w:gz") as tar:
+        add_symlink(tar, '../escape', '/target/a')
+        tar.close()
+    with tarfile.open(tar_filename, "r|gz") as tar:
+        with pytest.raises(tarfile.ExtractError):
+            extract_tar_file(tar, directory_symlink, True)
+        tar.close()
+    assert not os.path.lexists(os.path.join(os.path.dirname(directory_symlink), 'escape'))
+
+
+def test_extraction_03(directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check the single pass extraction of a tar file opened in stream mode, mixing symbolic links in nested
+    directories and a regular file
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    with open(os.path.join(temp_dir, 'test.txt'), 'w') as f:
+        f.write('hola')
+        f.close()
+    tar_filename = os.path.join(temp_dir, 'test.tar.gz')
+    with tarfile.open(tar_filename, "w:gz") as tar:
+        for i in range(100):
+            add_symlink(tar, 'dir-{0:}/link-{1:}'.format(i % 10, i), '/target/{0:}'.format(i))
+        tar.add(os.path.join(temp_dir, 'test.txt'), arcname='test.txt')
+        tar.close()
+    with tarfile.open(tar_filename, "r|gz") as tar:
+        manifest, counts = extract_tar_file(tar, directory_symlink, True)
+        tar.close()
+    assert counts == {'elements': 101, 'created': 101, 'retargeted': 0, 'removed': 0}
+    assert len(manifest) == 100
+    assert os.readlink(os.path.join(directory_symlink, 'dir-3', 'link-13')) == '/target/13'
+    with open(os.path.join(directory_symlink, 'test.txt'), 'r') as f:
+        assert f.read() == 'hola'
+        f.close()
+
+
+
+def test_extraction_04(directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that a member below a symbolic link of the tar file pointing outside the symbolic links directory is
+    rejected, both from a tar file and from a manifest, instead of being created through the link
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    outside = os.path.join(temp_dir, 'outside')
+    os.mkdir(outside)
+    tar_filename = os.path.join(temp_dir, 'test.tar.gz')
+    with tarfile.open(tar_filename, "w:gz") as tar:
+        add_symlink(tar, 'd', outside)
+        add_symlink(tar, 'd/x', '/target/x')
+        tar.close()
+    with tarfile.open(tar_filename, "r|gz") as tar:
+        with pytest.raises(tarfile.ExtractError):
+            extract_tar_file(tar, directory_symlink, True)
+        tar.close()
+    assert os.readlink(os.path.join(directory_symlink, 'd')) == outside
+    with pytest.raises(ValueError):
+        apply_manifest({'d': (outside, 0o777), 'd/y': ('/target/y', 0o777)}, directory_symlink, True)
+    assert os.listdir(outside) == []
+
+
+@pytest.mark.parametrize('recursive', (True, False))
+def test_extraction_05(recursive: bool, directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that a tar file written with "tar -C directory .", whose members start with ./ and which holds the
+    directory itself as the member ".", is applied by the normalized names of its members: the links already in place
+    are kept and the missing ones are created, and are not removed as if they were not in the tar file
+
+    :param recursive: True to extract the tar file in recursive mode
+    :type recursive: bool
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    source = os.path.join(temp_dir, 'source')
+    os.mkdir(source)
+    os.symlink('/target/1', os.path.join(source, 'l1'))
+    os.symlink('/target/2', os.path.join(source, 'l2'))
+    tar_filename = os.path.join(temp_dir, 'test.tar.gz')
+    with tarfile.open(tar_filename, "w:gz") as tar:
+        tar.add(source, arcname='.')
+        tar.close()
+    with tarfile.open(tar_filename, "r:gz") as tar:
+        assert sorted(tar.getnames()) == ['.', './l1', './l2']
+        tar.close()
+    os.symlink('/target/1', os.path.join(directory_symlink, 'l1'))
+    with tarfile.open(tar_filename, "r|gz") as tar:
+        manifest, counts = extract_tar_file(tar, directory_symlink, recursive)
+        tar.close()
+    assert counts == {'elements': 2, 'created': 1, 'retargeted': 0, 'removed': 0}
+    assert manifest == {'l1': ('/target/1', 0o777), 'l2': ('/target/2', 0o777)}
+    assert sorted(os.listdir(directory_symlink)) == ['l1', 'l2']
+    with tarfile.open(tar_filename, "w:gz") as tar:
+        add_symlink(tar, './l1', '/target/1')
+        add_symlink(tar, './l2', '/target/2')
+        tar.close()
+    with tarfile.open(tar_filename, "r|gz") as tar:
+        manifest, counts = extract_tar_file(tar, directory_symlink, recursive)
+        tar.close()
+    assert counts == {'elements': 2, 'created': 0, 'retargeted': 0, 'removed': 0}
+    assert sorted(os.listdir(directory_symlink)) == ['l1', 'l2']
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+import logging
+import tarfile
+import os
+
+from watchdog.events import DirCreatedEvent
+from watchdog.events import DirDeletedEvent
+from watchdog.events import DirModifiedEvent
+from watchdog.events import FileCreatedEvent
+from watchdog.events import FileMovedEvent
+
+import src.cloud_symlinks
+from src.cloud_symlinks import DebounceScheduler
+from src.cloud_symlinks import SymLinksEventHandler
+from src.cloud_symlinks import TarEventHandler
+from src.cloud_symlinks import build_manifest
+from src.cloud_symlinks import build_manifest_cached
+from src.cloud_symlinks import update_manifest
+
+
+def test_index_01(directory_symlink: str) -> None:
+    """
+    Test to check that updating a manifest path by path gives the same manifest as a scan, including the creation and
+    deletion of whole directories in recursive mode
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :return: Nothing
+    """
+    manifest = build_manifest(directory_symlink, True)
+    os.makedirs(os.path.join(directory_symlink, 'a', 'b'))
+    os.symlink('/target/a', os.path.join(directory_symlink, 'a', 'link'))
+    os.symlink('/target/b', os.path.join(directory_symlink, 'a', 'b', 'link'))
+    assert sorted(update_manifest(manifest, directory_symlink, 'a', True, subtree=True)) == ['a', 'a/b/link', 'a/link']
+    assert manifest == build_manifest(directory_symlink, True)
+    os.symlink('/target/top', os.path.join(directory_symlink, 'top'))
+    update_manifest(manifest, directory_symlink, 'top', True)
+    assert manifest == build_manifest(directory_symlink, True)
+    os.rename(os.path.join(directory_symlink, 'a'), os.path.join(directory_symlink, 'c'))
+    update_manifest(manifest, directory_symlink, 'a', True, subtree=True)
+    update_manifest(manifest, directory_symlink, 'c', True, subtree=True)
+    assert manifest == build_manifest(directory_symlink, True)
+    assert 'c/b/link' in manifest
+
+
+def test_index_02(logger: logging.Logger, directory_symlink: str, blank_tar_file: str,
+                  monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test to check that after the first scan the symbolic links handler finds the changes of the directory from the
+    paths named by the events without scanning it again, and that it scans it again once the index is invalidated
+
+    :param logger: Current logger to pass to the handlers to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :param monkeypatch: Pytest fixture to patch the scan of the directory
+    :type monkeypatch: pytest.MonkeyPatch
+    :return: Nothing
+    """
+    scheduler = DebounceScheduler(quiet_window=60, max_latency=60)
+    event_handler_dir = SymLinksEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory_symlink,
+                                             log=logger, recursive=True, scheduler=scheduler)
+    event_handler_dir.tar_event_handler = TarEventHandler(tar_filename=blank_tar_file,
+                                                          symlinks_directory=directory_symlink, log=logger)
+    os.symlink('/target/top', os.path.join(directory_symlink, 'top'))
+    event_handler_dir.compress(DirModifiedEvent(directory_symlink))
+    scans = list()
+    monkeypatch.setattr(src.cloud_symlinks, 'build_manifest_cached',
+                        lambda *args: scans.append(args) or build_manifest_cached(*args))
+
+    os.makedirs(os.path.join(directory_symlink, 'a'))
+    os.symlink('/target/a', os.path.join(directory_symlink, 'a', 'link'))
+    os.rename(os.path.join(directory_symlink, 'top'), os.path.join(directory_symlink, 'moved'))
+    event_handler_dir.on_any_event(DirCreatedEvent(os.path.join(directory_symlink, 'a')))
+    event_handler_dir.on_any_event(FileMovedEvent(os.path.join(directory_symlink, 'top'),
+                                                  os.path.join(directory_symlink, 'moved')))
+    event_handler_dir.on_any_event(DirModifiedEvent(directory_symlink))
+    event_handler_dir.compress(DirModifiedEvent(directory_symlink))
+    with tarfile.open(blank_tar_file, "r:gz") as tar:
+        assert sorted(tar.getnames()) == ['a/link', 'moved']
+        tar.close()
+    assert len(scans) == 0
+
+    os.symlink('/target/b', os.path.join(directory_symlink, 'other'))
+    event_handler_dir.invalidate_index()
+    event_handler_dir.on_any_event(FileCreatedEvent(os.path.join(directory_symlink, 'other')))
+    event_handler_dir.on_any_event(DirDeletedEvent(os.path.join(directory_symlink, 'missing')))
+    event_handler_dir.compress(DirModifiedEvent(directory_symlink))
+    assert len(scans) == 1
+    assert event_handler_dir.manifest == build_manifest(directory_symlink, True)
+    scheduler.stop()
+    event_handler_dir.engine.stop()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+
+from watchdog.events import DirModifiedEvent
+from watchdog.events import FileModifiedEvent
+
+from src.cloud_symlinks import DebounceScheduler
+from src.cloud_symlinks import SymLinksEventHandler
+from src.cloud_symlinks import TarEventHandler
+from src.cloud_symlinks import build_manifest
+from src.cloud_symlinks import extract_journal
+from src.cloud_symlinks import read_shard_index
+from src.cloud_symlinks import shard_filename
+from src.cloud_symlinks import write_journal
+
+
+def test_journal_01(directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that the journal appends a segment with the changed and removed entries, that a peer only replays
+    the segments it did not apply yet, and that the journal is compacted into a new base once it has too many segments
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    os.makedirs(os.path.join(directory_symlink, 'a'))
+    # A base large enough that the segments never outweigh it, so only their number triggers the compaction
+    for i in range(40):
+        os.symlink('/target/{0:}'.format(i), os.path.join(directory_symlink, 'a', 'link{0:}'.format(i)))
+    tar_filename = os.path.join(temp_dir, 'links.tar')
+    manifest = build_manifest(directory_symlink, True)
+    index = write_journal(tar_filename, directory_symlink, manifest, None, max_segments=2)
+    assert list(index[2].keys()) == ['0000000001']
+    mirror = os.path.join(temp_dir, 'mirror')
+    os.mkdir(mirror)
+    mirror_manifest, counts, applied = extract_journal(tar_filename, mirror, True)
+    assert mirror_manifest == manifest and counts['created'] == 40
+
+    os.remove(os.path.join(directory_symlink, 'a', 'link0'))
+    os.remove(os.path.join(directory_symlink, 'a', 'link1'))
+    os.symlink('/target/new', os.path.join(directory_symlink, 'a', 'link1'))
+    os.symlink('/target/top', os.path.join(directory_symlink, 'top'))
+    manifest = build_manifest(directory_symlink, True)
+    index = write_journal(tar_filename, directory_symlink, manifest, {'a/link0', 'a/link1', 'top'}, previous=index,
+                          max_segments=2)
+    assert sorted(index[2].keys()) == ['0000000001', '0000000002']
+    mirror_manifest, counts, applied = extract_journal(tar_filename, mirror, True, False, applied, mirror_manifest)
+    assert counts == {'elements': 3, 'created': 1, 'retargeted': 1, 'removed': 1}
+    assert mirror_manifest == manifest == build_manifest(mirror, True)
+
+    for name in ('top', 'a/link2'):
+        os.remove(os.path.join(directory_symlink, name))
+        manifest = build_manifest(directory_symlink, True)
+        index = write_journal(tar_filename, directory_symlink, manifest, {name}, previous=index, max_segments=2)
+    assert list(index[2].keys()) == ['0000000004']
+    assert read_shard_index(tar_filename) == index
+    assert not os.path.exists(shard_filename(tar_filename, 'journal', 0, '0000000001'))
+    mirror_manifest, counts, applied = extract_journal(tar_filename, mirror, True, False, applied, mirror_manifest)
+    assert counts['elements'] == 38
+    assert mirror_manifest == manifest == build_manifest(mirror, True)
+
+
+def test_journal_02(logger: logging.Logger, directory_symlink: str, blank_tar_file: str, temp_dir: str) -> None:
+    """
+    Test to check that the handlers append a segment per compression in journal mode and that a peer applies it
+
+    :param logger: Current logger to pass to the handlers to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    scheduler = DebounceScheduler()
+    handlers = list()
+    for directory in (directory_symlink, temp_dir):
+        event_handler_dir = SymLinksEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory,
+                                                 log=logger, recursive=True, scheduler=scheduler, sharding='journal')
+        event_handler_tar = TarEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory, log=logger,
+                                            scheduler=scheduler)
+        event_handler_dir.tar_event_handler = event_handler_tar
+        event_handler_tar.symlink_event_handler = event_handler_dir
+        handlers.append((event_handler_dir, event_handler_tar))
+    for i in range(20):
+        os.symlink('/target/{0:}'.format(i), os.path.join(directory_symlink, 'link{0:}'.format(i)))
+    handlers[0][0].compress(DirModifiedEvent(directory_symlink))
+    handlers[1][1].untar(FileModifiedEvent(blank_tar_file))
+    os.remove(os.path.join(directory_symlink, 'link3'))
+    handlers[0][0].on_any_event(FileModifiedEvent(os.path.join(directory_symlink, 'link3')))
+    handlers[0][0].compress(FileModifiedEvent(os.path.join(directory_symlink, 'link3')))
+    assert len(handlers[0][1].shards[2]) == 2
+    handlers[1][1].untar(FileModifiedEvent(blank_tar_file))
+    assert handlers[1][1].shards == handlers[0][1].shards
+    assert build_manifest(temp_dir, True) == build_manifest(directory_symlink, True)
+    assert not os.path.lexists(os.path.join(temp_dir, 'link3'))
+    scheduler.stop()
+    for event_handler_dir, event_handler_tar in handlers:
+        event_handler_dir.engine.stop()
+        event_handler_tar.engine.stop()
+
+
+def test_journal_03(directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that a symbolic link whose name looks like a whiteout is replayed as a link, without removing the
+    entry it seems to name, and that a removal is still replayed
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    os.symlink('/target/x', os.path.join(directory_symlink, 'x'))
+    os.symlink('/target/y', os.path.join(directory_symlink, 'y'))
+    tar_filename = os.path.join(temp_dir, 'links.tar')
+    manifest = build_manifest(directory_symlink, True)
+    index = write_journal(tar_filename, directory_symlink, manifest, None)
+    mirror = os.path.join(temp_dir, 'mirror')
+    os.mkdir(mirror)
+    mirror_manifest, counts, applied = extract_journal(tar_filename, mirror, True)
+
+    os.symlink('/target/whiteout-lookalike', os.path.join(directory_symlink, '.wh.x'))
+    os.remove(os.path.join(directory_symlink, 'y'))
+    manifest = build_manifest(directory_symlink, True)
+    index = write_journal(tar_filename, directory_symlink, manifest, {'.wh.x', 'y'}, previous=index)
+    assert len(index[2]) == 2
+    mirror_manifest, counts, applied = extract_journal(tar_filename, mirror, True, False, applied, mirror_manifest)
+    assert os.readlink(os.path.join(mirror, '.wh.x')) == '/target/whiteout-lookalike'
+    assert os.readlink(os.path.join(mirror, 'x')) == '/target/x'
+    assert not os.path.lexists(os.path.join(mirror, 'y'))
+    assert counts == {'elements': 2, 'created': 1, 'retargeted': 0, 'removed': 1}
+    assert mirror_manifest == manifest == build_manifest(mirror, True)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import contextlib
+import pytest
+import logging
+import threading
+import time
+import os
+
+from src.cloud_symlinks import main
+from src.cloud_symlinks import StateStore
+from src.cloud_symlinks import build_manifest
+from src.cloud_symlinks import scan_symlinks
+
+
+def test_manifest_01(directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that the manifest records the link target and mode of the symbolic links, that the contents of the
+    regular files are ignored and that it survives a save and load round trip through the state store
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    os.symlink('/a/b/c', os.path.join(directory_symlink, 'link'))
+    with open(os.path.join(directory_symlink, 'test.txt'), 'w') as f:
+        f.write('hola')
+        f.close()
+    manifest = build_manifest(directory_symlink, False)
+    assert manifest['link'][0] == '/a/b/c'
+    assert manifest['test.txt'][0] == ''
+    with open(os.path.join(directory_symlink, 'test.txt'), 'a') as f:
+        f.write(' + hola')
+        f.close()
+    assert build_manifest(directory_symlink, False) == manifest
+    with contextlib.closing(StateStore(os.path.join(temp_dir, 'cloud_symlinks.db'))) as state:
+        assert state.load_manifest('tar') is None
+        state.save_manifest('tar', manifest)
+        assert state.load_manifest('tar') == manifest
+
+
+def test_manifest_02(caplog: pytest.LogCaptureFixture, logger: logging.Logger, directory_symlink: str,
+                     blank_tar_file: str, empty_config_file: str) -> None:
+    """
+    Test to check that the tar file is not rewritten when the directory changes but the symbolic links do not. The
+    first change adds a symbolic link and compresses the directory, the second one only touches a regular file and
+    must be skipped leaving the tar file untouched.
+
+    :param caplog: Pytest log capture fixture
+    :type caplog: pytest.LogCaptureFixture
+    :param logger: Current logger to pass to the main program to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :param empty_config_file: Path to an empty config file
+    :type empty_config_file: str
+    :return: Nothing
+    """
+    with open(os.path.join(directory_symlink, 'test.txt'), 'w') as f:
+        f.write('hola')
+        f.close()
+    event = threading.Event()
+    caplog.set_level(logging.INFO)
+    thread: threading.Thread = threading.Thread(target=main, args=(directory_symlink, blank_tar_file, logger, event,
+                                                                   empty_config_file))
+    thread.start()
+    time.sleep(1)
+    os.symlink('/a/b/c', os.path.join(directory_symlink, 'link'))
+    time.sleep(1)
+    tar_mtime = os.stat(blank_tar_file).st_mtime_ns
+    with open(os.path.join(directory_symlink, 'test.txt'), 'a') as f:
+        f.write(' + hola')
+        f.close()
+    time.sleep(1)
+    event.set()
+    time.sleep(2)
+    assert not thread.is_alive()
+    assert os.stat(blank_tar_file).st_mtime_ns == tar_mtime
+    assert "Compression skipped" in caplog.records[-1].getMessage()
+    with contextlib.closing(StateStore(empty_config_file)) as state:
+        assert state.load_manifest(blank_tar_file)['link'] == ('/a/b/c', 0o777)
+
+
+def test_manifest_03(directory_symlink: str) -> None:
+    """
+    Test to check that the recursive scan yields the symbolic links of every level of the directory tree, including
+    the top level one, and skips regular files and directories
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :return: Nothing
+    """
+    os.makedirs(os.path.join(directory_symlink, 'a', 'b'))
+    os.symlink('/target/top', os.path.join(directory_symlink, 'top'))
+    os.symlink('/target/a', os.path.join(directory_symlink, 'a', 'link'))
+    os.symlink('/target/b', os.path.join(directory_symlink, 'a', 'b', 'link'))
+    os.symlink(os.path.join(directory_symlink, 'a'), os.path.join(directory_symlink, 'dir-link'))
+    with open(os.path.join(directory_symlink, 'a', 'test.txt'), 'w') as f:
+        f.write('hola')
+        f.close()
+    names = sorted(name for name, entry in scan_symlinks(directory_symlink, True))
+    assert names == ['a/b/link', 'a/link', 'dir-link', 'top']
+    names = sorted(name for name, entry in scan_symlinks(directory_symlink, False))
+    assert names == ['a', 'dir-link', 'top']
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+
+import pytest
+
+from watchdog.events import DirModifiedEvent
+from watchdog.events import FileModifiedEvent
+
+from src.cloud_symlinks import MEMBER_INDEX_SUFFIX
+from src.cloud_symlinks import SymLinksEventHandler
+from src.cloud_symlinks import TarEventHandler
+from src.cloud_symlinks import build_manifest
+from src.cloud_symlinks import extract_archive
+from src.cloud_symlinks import extract_members
+from src.cloud_symlinks import hash_file
+from src.cloud_symlinks import load_member_index
+from src.cloud_symlinks import write_member_index
+from src.cloud_symlinks import write_tar_file
+
+
+def test_member_index_01(directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that the member index sidecar maps every entry to its member in the uncompressed tar file, that
+    only the changed members are applied with it, and that a sidecar describing other contents is ignored
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    os.makedirs(os.path.join(directory_symlink, 'a'))
+    for i in range(10):
+        os.symlink('/target/{0:}'.format(i), os.path.join(directory_symlink, 'a', 'link{0:}'.format(i)))
+    # A name longer than a ustar header holds is stored with an extended header before its member
+    long_name = os.path.join('a', 'x' * 150)
+    os.symlink('/target/long', os.path.join(directory_symlink, long_name))
+    tar_filename = os.path.join(temp_dir, 'links.tar')
+    manifest = build_manifest(directory_symlink, True)
+    offsets = write_tar_file(tar_filename, directory_symlink, manifest, 'none')
+    write_member_index(tar_filename, hash_file(tar_filename),
+                       {name: (offsets[name],) + manifest[name] for name in offsets})
+    mirror = os.path.join(temp_dir, 'mirror')
+    os.mkdir(mirror)
+    mirror_manifest, counts = extract_archive(tar_filename, mirror, True)
+    assert mirror_manifest == manifest
+
+    os.remove(os.path.join(directory_symlink, 'a', 'link0'))
+    os.remove(os.path.join(directory_symlink, 'a', 'link1'))
+    os.symlink('/target/new', os.path.join(directory_symlink, 'a', 'link1'))
+    os.remove(os.path.join(directory_symlink, long_name))
+    os.symlink('/target/long/new', os.path.join(directory_symlink, long_name))
+    os.symlink('/target/top', os.path.join(directory_symlink, 'top'))
+    old_digest = hash_file(tar_filename)
+    manifest = build_manifest(directory_symlink, True)
+    offsets = write_tar_file(tar_filename, directory_symlink, manifest, 'none')
+    digest = hash_file(tar_filename)
+    write_member_index(tar_filename, digest, {name: (offsets[name],) + manifest[name] for name in offsets})
+    assert load_member_index(tar_filename, old_digest) is None
+    index = load_member_index(tar_filename, digest)
+    assert {name: entry[1:] for name, entry in index.items()} == manifest
+    mirror_manifest, counts = extract_members(tar_filename, mirror, index, mirror_manifest, True)
+    assert counts == {'elements': 3, 'created': 1, 'retargeted': 2, 'removed': 1}
+    assert mirror_manifest == manifest == build_manifest(mirror, True)
+
+
+def test_member_index_02(caplog: pytest.LogCaptureFixture, logger: logging.Logger, directory_symlink: str,
+                         blank_tar_file: str, temp_dir: str) -> None:
+    """
+    Test to check that the handlers write the member index sidecar of an uncompressed tar file and that a peer that
+    already applied the tar file only reads the changed members
+
+    :param caplog: Pytest log capture fixture
+    :type caplog: pytest.LogCaptureFixture
+    :param logger: Current logger to pass to the handlers to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    caplog.set_level(logging.INFO)
+    handlers = list()
+    for directory in (directory_symlink, temp_dir):
+        event_handler_dir = SymLinksEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory,
+                                                 log=logger, recursive=True, compression='none', member_index=True)
+        event_handler_tar = TarEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory, log=logger)
+        event_handler_dir.tar_event_handler = event_handler_tar
+        event_handler_tar.symlink_event_handler = event_handler_dir
+        handlers.append((event_handler_dir, event_handler_tar))
+    for i in range(20):
+        os.symlink('/target/{0:}'.format(i), os.path.join(directory_symlink, 'link{0:}'.format(i)))
+    handlers[0][0].compress(DirModifiedEvent(directory_symlink))
+    assert os.path.isfile(blank_tar_file + MEMBER_INDEX_SUFFIX)
+    handlers[1][1].untar(FileModifiedEvent(blank_tar_file))
+    assert build_manifest(temp_dir, True) == build_manifest(directory_symlink, True)
+
+    os.remove(os.path.join(directory_symlink, 'link3'))
+    os.symlink('/target/new', os.path.join(directory_symlink, 'link3'))
+    handlers[0][0].on_any_event(FileModifiedEvent(os.path.join(directory_symlink, 'link3')))
+    handlers[0][0].compress(FileModifiedEvent(os.path.join(directory_symlink, 'link3')))
+    handlers[1][1].untar(FileModifiedEvent(blank_tar_file))
+    assert os.readlink(os.path.join(temp_dir, 'link3')) == '/target/new'
+    assert build_manifest(temp_dir, True) == build_manifest(directory_symlink, True)
+    assert "with 1 elements: 0 created, 1 retargeted, 0 removed." in caplog.records[-1].getMessage()
+    for event_handler_dir, event_handler_tar in handlers:
+        event_handler_dir.scheduler.stop()
+        event_handler_dir.engine.stop()
+        event_handler_tar.scheduler.stop()
+        event_handler_tar.engine.stop()
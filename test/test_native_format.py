@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import pytest
+import os
+
+from watchdog.events import DirModifiedEvent
+from watchdog.events import FileModifiedEvent
+
+from src.cloud_symlinks import COMPRESSIONS
+from src.cloud_symlinks import DebounceScheduler
+from src.cloud_symlinks import SymLinksEventHandler
+from src.cloud_symlinks import TarEventHandler
+from src.cloud_symlinks import build_manifest
+from src.cloud_symlinks import convert_archive
+from src.cloud_symlinks import extract_archive
+from src.cloud_symlinks import is_manifest_file
+from src.cloud_symlinks import read_archive_manifest
+from src.cloud_symlinks import read_manifest_file
+from src.cloud_symlinks import write_manifest_file
+
+
+@pytest.mark.parametrize('compression', COMPRESSIONS)
+def test_native_format_01(compression: str, directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that a manifest written in the native format with every available compression is read back, names
+    with newlines and undecodable bytes included, and that it is applied to a directory like a tar file
+
+    :param compression: Compression format to test
+    :type compression: str
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    for i in range(5000):
+        os.symlink('/target/{0:}'.format(i), os.path.join(directory_symlink, 'link-{0:}'.format(i)))
+    os.symlink('/target/new\nline', os.path.join(directory_symlink, 'new\nline'))
+    os.symlink(b'/target/\xff', os.path.join(os.fsencode(directory_symlink), b'\xff'))
+    manifest = build_manifest(directory_symlink, True)
+    filename = os.path.join(temp_dir, 'links.manifest')
+    write_manifest_file(filename, manifest, compression, 1)
+    assert is_manifest_file(filename)
+    assert read_manifest_file(filename) == manifest
+    os.mkdir(os.path.join(temp_dir, 'extracted'))
+    os.symlink('/target/stale', os.path.join(temp_dir, 'extracted', 'stale'))
+    os.symlink('/target/old', os.path.join(temp_dir, 'extracted', 'link-0'))
+    extracted, counts = extract_archive(filename, os.path.join(temp_dir, 'extracted'), True)
+    assert extracted == manifest == build_manifest(os.path.join(temp_dir, 'extracted'), True)
+    assert counts == {'elements': 5002, 'created': 5001, 'retargeted': 1, 'removed': 1}
+
+
+def test_native_format_02(directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that the native format refuses entries that are not symbolic links and truncated files, and that
+    the converter turns a tar file into the native format and back
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    filename = os.path.join(temp_dir, 'links.manifest')
+    with pytest.raises(ValueError):
+        write_manifest_file(filename, {'file.txt': ('', 0o644)})
+    assert not os.path.exists(filename)
+    write_manifest_file(filename, {'link': ('/target/a', 0o777)}, 'none')
+    with open(filename, 'ab') as f:
+        f.write(b'partial\0')
+        f.close()
+    with pytest.raises(ValueError):
+        read_manifest_file(filename)
+
+    for i in range(10):
+        os.symlink('/target/{0:}'.format(i), os.path.join(directory_symlink, 'link-{0:}'.format(i)))
+    manifest = build_manifest(directory_symlink, True)
+    tar_filename = os.path.join(temp_dir, 'links.tar.gz')
+    write_manifest_file(filename, manifest)
+    assert convert_archive(filename, tar_filename, 'tar', 'xz') == 10
+    assert not is_manifest_file(tar_filename)
+    assert read_archive_manifest(tar_filename) == manifest
+    assert convert_archive(tar_filename, filename, 'manifest', 'none') == 10
+    assert read_manifest_file(filename) == manifest
+
+
+def test_native_format_03(logger: logging.Logger, directory_symlink: str, blank_tar_file: str,
+                          temp_dir: str) -> None:
+    """
+    Test to check that the handlers compress a directory in the native format and extract it to another directory
+
+    :param logger: Current logger to pass to the handlers to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    scheduler = DebounceScheduler()
+    handlers = list()
+    for directory in (directory_symlink, temp_dir):
+        event_handler_dir = SymLinksEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory,
+                                                 log=logger, recursive=True, scheduler=scheduler,
+                                                 archive_format='manifest')
+        event_handler_tar = TarEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory, log=logger,
+                                            scheduler=scheduler)
+        event_handler_dir.tar_event_handler = event_handler_tar
+        event_handler_tar.symlink_event_handler = event_handler_dir
+        handlers.append((event_handler_dir, event_handler_tar))
+    os.makedirs(os.path.join(directory_symlink, 'a'))
+    for i in range(20):
+        os.symlink('/target/{0:}'.format(i), os.path.join(directory_symlink, 'a', 'link{0:}'.format(i)))
+    handlers[0][0].compress(DirModifiedEvent(directory_symlink))
+    assert is_manifest_file(blank_tar_file)
+    handlers[1][1].untar(FileModifiedEvent(blank_tar_file))
+    assert build_manifest(temp_dir, True) == build_manifest(directory_symlink, True)
+    assert handlers[1][0].manifest == build_manifest(directory_symlink, True)
+    scheduler.stop()
+    for event_handler_dir, event_handler_tar in handlers:
+        event_handler_dir.engine.stop()
+        event_handler_tar.engine.stop()
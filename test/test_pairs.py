@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import errno
+import pytest
+import logging
+import tarfile
+import threading
+import time
+import os
+
+import src.cloud_symlinks
+from src.cloud_symlinks import WATCH_STRATEGIES
+from src.cloud_symlinks import load_pairs
+from src.cloud_symlinks import watch_pairs
+
+
+def test_pairs_01(temp_dir: str) -> None:
+    """
+    Test to check that the pairs of a config file are read with the options of the DEFAULT section, and that an
+    unknown compression format, a compression level out of the range of the format or a shard count or number of
+    compression threads below 1 is rejected
+
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    config_filename = os.path.join(temp_dir, 'pairs.ini')
+    with open(config_filename, 'w') as f:
+        f.write('[DEFAULT]\nrecursive = yes\n\n'
+                '[one]\ndir = /a\ntar_file = /a.tar.gz\n\n'
+                '[two]\ndir = /b\ntar_file = /b.tar.xz\nrecursive = no\ncompression = xz\ncompression_level = 9\n')
+        f.close()
+    pairs = load_pairs(config_filename)
+    assert pairs[0] == {'directory': '/a', 'tar_filename': '/a.tar.gz', 'recursive': True, 'symlinks_only': False,
+                        'compression': 'gz', 'compression_level': None, 'deterministic': False, 'sharding': 'none',
+                        'shard_count': 16, 'journal_segments': 32, 'archive_format': 'tar',
+                        'member_index': False, 'compression_threads': 1}
+    assert pairs[1]['recursive'] is False
+    assert pairs[1]['compression'] == 'xz' and pairs[1]['compression_level'] == 9
+    with open(config_filename, 'a') as f:
+        f.write('\n[three]\ndir = /c\ntar_file = /c.tar\ncompression = rar\n')
+        f.close()
+    with pytest.raises(ValueError):
+        load_pairs(config_filename)
+    with open(config_filename, 'w') as f:
+        f.write('[one]\ndir = /a\ntar_file = /a.tar.bz2\ncompression = bz2\ncompression_level = 0\n')
+        f.close()
+    with pytest.raises(ValueError, match='one.*level 0 of bz2'):
+        load_pairs(config_filename)
+    with open(config_filename, 'w') as f:
+        f.write('[one]\ndir = /a\ntar_file = /a.tar.gz\n')
+        f.close()
+    with pytest.raises(ValueError, match='level 42 of gz'):
+        load_pairs(config_filename, {'compression_level': 42})
+    with pytest.raises(ValueError, match='shard_count of section one'):
+        load_pairs(config_filename, {'sharding': 'hash', 'shard_count': 0})
+    with pytest.raises(ValueError, match='compression_threads of section one'):
+        load_pairs(config_filename, {'compression_threads': -1})
+    with pytest.raises(FileNotFoundError):
+        load_pairs(os.path.join(temp_dir, 'missing.ini'))
+    with open(config_filename, 'w') as f:
+        f.write('[one]\ndir = /a\n')
+        f.close()
+    with pytest.raises(ValueError, match='one.*tar_file'):
+        load_pairs(config_filename)
+
+
+def test_pairs_02(caplog: pytest.LogCaptureFixture, logger: logging.Logger, temp_dir: str,
+                  empty_config_file: str) -> None:
+    """
+    Test to check that a single process synchronizes several pairs, sharing the watch of the directory of their tar
+    files, and that the pairs whose directory does not exist are skipped
+
+    :param caplog: Pytest log capture fixture
+    :type caplog: pytest.LogCaptureFixture
+    :param logger: Current logger to pass to the main program to write to.
+    :type logger: logging.Logger
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :param empty_config_file: Path to an empty config file
+    :type empty_config_file: str
+    :return: Nothing
+    """
+    pairs = list()
+    for name in ('one', 'two', 'three'):
+        os.mkdir(os.path.join(temp_dir, name))
+        with tarfile.open(os.path.join(temp_dir, name + '.tar.gz'), "w:gz") as tar:
+            tar.close()
+        pairs.append({'directory': os.path.join(temp_dir, name),
+                      'tar_filename': os.path.join(temp_dir, name + '.tar.gz')})
+    pairs.append({'directory': os.path.join(temp_dir, 'missing'), 'tar_filename': os.path.join(temp_dir, 'one.tar.gz')})
+    event = threading.Event()
+    caplog.set_level(logging.INFO)
+    thread: threading.Thread = threading.Thread(target=watch_pairs, args=(pairs, logger, event, empty_config_file))
+    thread.start()
+    time.sleep(1)
+    for name in ('one', 'two', 'three'):
+        os.symlink('/target/' + name, os.path.join(temp_dir, name, 'link'))
+    time.sleep(2)
+    event.set()
+    time.sleep(2)
+    assert not thread.is_alive()
+    for name in ('one', 'two', 'three'):
+        with tarfile.open(os.path.join(temp_dir, name + '.tar.gz'), "r:gz") as tar:
+            assert [member.linkname for member in tar.getmembers()] == ['/target/' + name]
+            tar.close()
+    assert any('missing does not exist' in record.getMessage() for record in caplog.records)
+
+
+def test_pairs_03(logger: logging.Logger, directory_symlink: str, blank_tar_file: str,
+                  empty_config_file: str) -> None:
+    """
+    Test to check that the event loop of the program stops in less than a second once the stop event is set
+
+    :param logger: Current logger to pass to the main program to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :param empty_config_file: Path to an empty config file
+    :type empty_config_file: str
+    :return: Nothing
+    """
+    event = threading.Event()
+    thread: threading.Thread = threading.Thread(target=watch_pairs, args=([{'directory': directory_symlink,
+                                                                            'tar_filename': blank_tar_file}], logger,
+                                                                          event, empty_config_file))
+    thread.start()
+    time.sleep(1)
+    start = time.monotonic()
+    event.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert time.monotonic() - start < 1
+
+
+def test_pairs_04(temp_dir: str) -> None:
+    """
+    Test to check that the defaults given to the config file reader apply to the options that no section sets
+
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    config_filename = os.path.join(temp_dir, 'pairs.ini')
+    with open(config_filename, 'w') as f:
+        f.write('[one]\ndir = /a\ntar_file = /a.tar\n\n'
+                '[two]\ndir = /b\ntar_file = /b.tar\ncompression = gz\ncompression_level =\nrecursive = no\n')
+        f.close()
+    pairs = load_pairs(config_filename, {'recursive': True, 'compression': 'none', 'compression_level': 3,
+                                         'compression_threads': 4})
+    assert pairs[0]['recursive'] is True and pairs[0]['compression'] == 'none'
+    assert pairs[0]['compression_level'] == 3 and pairs[0]['compression_threads'] == 4
+    assert pairs[1]['recursive'] is False and pairs[1]['compression'] == 'gz'
+    assert pairs[1]['compression_level'] is None and pairs[1]['compression_threads'] == 4
+
+
+def test_pairs_05(logger: logging.Logger, temp_dir: str, empty_config_file: str) -> None:
+    """
+    Test to check that the number of threads of the process does not depend on the number of recursive pairs, with
+    both watch strategies, since all the pairs share one inotify instance and its reading thread
+
+    :param logger: Current logger to pass to the main program to write to.
+    :type logger: logging.Logger
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :param empty_config_file: Path to an empty config file
+    :type empty_config_file: str
+    :return: Nothing
+    """
+    for watch_strategy in WATCH_STRATEGIES:
+        counts = list()
+        for count in (1, 10):
+            pairs = list()
+            for i in range(count):
+                name = '{0:}-{1:}-{2:}'.format(watch_strategy, count, i)
+                os.makedirs(os.path.join(temp_dir, name, 'sub'))
+                with tarfile.open(os.path.join(temp_dir, name + '.tar.gz'), "w:gz") as tar:
+                    tar.close()
+                pairs.append({'directory': os.path.join(temp_dir, name),
+                              'tar_filename': os.path.join(temp_dir, name + '.tar.gz'), 'recursive': True})
+            event = threading.Event()
+            threads = threading.active_count()
+            thread: threading.Thread = threading.Thread(target=watch_pairs, args=(pairs, logger, event,
+                                                                                  empty_config_file),
+                                                        kwargs={'sync_workers': 1, 'watch_strategy': watch_strategy})
+            thread.start()
+            time.sleep(1.5)
+            counts.append(threading.active_count() - threads)
+            event.set()
+            thread.join(5)
+            assert not thread.is_alive()
+        assert counts[0] == counts[1]
+
+
+@pytest.mark.skipif('symlink-dirs' not in WATCH_STRATEGIES, reason="inotify is not available")
+def test_pairs_06(caplog: pytest.LogCaptureFixture, logger: logging.Logger, temp_dir: str, empty_config_file: str,
+                  monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test to check that a pair that cannot be watched, for instance at the limit of inotify watches, is polled instead
+    without stopping the other pairs, and that all the pairs are polled when no inotify instance can be created
+
+    :param caplog: Pytest log capture fixture
+    :type caplog: pytest.LogCaptureFixture
+    :param logger: Current logger to pass to the main program to write to.
+    :type logger: logging.Logger
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :param empty_config_file: Path to an empty config file
+    :type empty_config_file: str
+    :param monkeypatch: Pytest fixture to make the inotify calls fail
+    :type monkeypatch: pytest.MonkeyPatch
+    :return: Nothing
+    """
+    caplog.set_level(logging.INFO)
+    start = src.cloud_symlinks.DirectoryWatcher.start
+
+    def failing_start(watcher: src.cloud_symlinks.DirectoryWatcher) -> None:
+        if watcher.event_handler_dir.symlinks_directory.endswith('one'):
+            raise OSError(errno.ENOSPC, 'No space left on device')
+        start(watcher)
+
+    def failing_dispatcher(log: logging.Logger) -> None:
+        raise OSError(errno.EMFILE, 'Too many open files')
+
+    for target, attribute, failing, names in ((src.cloud_symlinks.DirectoryWatcher, 'start', failing_start,
+                                               ('one', 'two')),
+                                              (src.cloud_symlinks, 'InotifyDispatcher', failing_dispatcher,
+                                               ('three', 'four'))):
+        monkeypatch.setattr(target, attribute, failing)
+        pairs = list()
+        for name in names:
+            os.mkdir(os.path.join(temp_dir, name))
+            with tarfile.open(os.path.join(temp_dir, name + '.tar.gz'), "w:gz") as tar:
+                tar.close()
+            pairs.append({'directory': os.path.join(temp_dir, name),
+                          'tar_filename': os.path.join(temp_dir, name + '.tar.gz')})
+        event = threading.Event()
+        thread: threading.Thread = threading.Thread(target=watch_pairs, args=(pairs, logger, event, empty_config_file))
+        thread.start()
+        time.sleep(1)
+        for name in names:
+            os.symlink('/target/' + name, os.path.join(temp_dir, name, 'link'))
+        time.sleep(6)
+        event.set()
+        thread.join(5)
+        assert not thread.is_alive()
+        for name in names:
+            with tarfile.open(os.path.join(temp_dir, name + '.tar.gz'), "r:gz") as tar:
+                assert [member.linkname for member in tar.getmembers()] == ['/target/' + name]
+                tar.close()
+    warnings = [record.getMessage() for record in caplog.records if record.levelname == 'WARNING']
+    assert [warning for warning in warnings if 'Cannot watch the pair' in warning] == [
+        "Cannot watch the pair {0:}, polling it instead. Exception: [Errno 28] No space left on device.".format(
+            os.path.join(temp_dir, 'one'))]
+    assert any('Cannot create an inotify instance' in warning for warning in warnings)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip
+import io
+import os
+import tarfile
+
+from src.cloud_symlinks import ParallelGzipWriter
+from src.cloud_symlinks import build_manifest
+from src.cloud_symlinks import extract_archive
+from src.cloud_symlinks import hash_file
+from src.cloud_symlinks import verify_gzip_file
+from src.cloud_symlinks import write_tar_file
+
+
+def test_parallel_gzip_01(temp_dir: str) -> None:
+    """
+    Test to check that the parallel gzip writer writes a multi-member gzip file that stock readers decompress to the
+    written data, that its output does not depend on the number of threads, and that an empty file is a valid gzip file
+
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    data = os.urandom(50000) + b'symbolic link ' * 20000
+    outputs = list()
+    for threads in (1, 4):
+        output = io.BytesIO()
+        writer = ParallelGzipWriter(output, 6, mtime=0, threads=threads, block_size=16384)
+        for start in range(0, len(data), 10240):
+            writer.write(data[start:start + 10240])
+        writer.close()
+        outputs.append(output.getvalue())
+    assert outputs[0] == outputs[1]
+    assert gzip.decompress(outputs[0]) == data
+    assert outputs[0].count(gzip.compress(b'', mtime=0)[:4]) >= len(data) // 16384
+    filename = os.path.join(temp_dir, 'file.gz')
+    with open(filename, 'wb') as f:
+        f.write(outputs[0])
+        f.close()
+    assert verify_gzip_file(filename)
+
+    output = io.BytesIO()
+    writer = ParallelGzipWriter(output, threads=2)
+    writer.close()
+    assert gzip.decompress(output.getvalue()) == b''
+
+
+def test_parallel_gzip_02(directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that a tar file compressed in parallel is read by the tarfile module and extracted by the program,
+    and that it is byte-reproducible in deterministic mode whatever the number of threads
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    for i in range(3000):
+        os.symlink('/target/{0:}'.format(i), os.path.join(directory_symlink, 'link{0:}'.format(i)))
+    manifest = build_manifest(directory_symlink, True)
+    digests = list()
+    for threads in (2, 3):
+        tar_filename = os.path.join(temp_dir, 'links{0:}.tar.gz'.format(threads))
+        write_tar_file(tar_filename, directory_symlink, manifest, 'gz', deterministic=True,
+                       compression_threads=threads)
+        digests.append(hash_file(tar_filename))
+    assert digests[0] == digests[1]
+    with tarfile.open(tar_filename, 'r:gz') as tar:
+        assert len(tar.getmembers()) == 3000
+        tar.close()
+    mirror = os.path.join(temp_dir, 'mirror')
+    os.mkdir(mirror)
+    mirror_manifest, counts = extract_archive(tar_filename, mirror, True)
+    assert mirror_manifest == manifest == build_manifest(mirror, True)
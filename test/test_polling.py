@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+import logging
+import tarfile
+import threading
+import time
+import os
+
+from src.cloud_symlinks import poll_directories
+from src.cloud_symlinks import symlink_tar_info
+from src.cloud_symlinks import watch_pairs
+
+
+def test_polling_01(directory_symlink: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test to check that polling the directory index only reads the directories whose modification time changed and
+    reports the added, changed and removed directories
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param monkeypatch: Pytest fixture to count the directories read
+    :type monkeypatch: pytest.MonkeyPatch
+    :return: Nothing
+    """
+    os.makedirs(os.path.join(directory_symlink, 'a', 'b'))
+    past = time.time_ns() - 10000000000
+    for path in ('', 'a', os.path.join('a', 'b')):
+        os.utime(os.path.join(directory_symlink, path), ns=(past, past))
+    changed, index = poll_directories(directory_symlink, True)
+    assert sorted(changed) == ['', 'a', 'a/b']
+    read = list()
+    scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda path: read.append(path) or scandir(path))
+    changed, index = poll_directories(directory_symlink, True, index)
+    assert changed == [] and read == []
+    os.symlink('/target/a', os.path.join(directory_symlink, 'a', 'b', 'link'))
+    changed, index = poll_directories(directory_symlink, True, index)
+    assert changed == ['a/b']
+    os.remove(os.path.join(directory_symlink, 'a', 'b', 'link'))
+    os.rmdir(os.path.join(directory_symlink, 'a', 'b'))
+    changed, index = poll_directories(directory_symlink, True, index)
+    assert sorted(changed) == ['a', 'a/b']
+    assert sorted(index.keys()) == ['', 'a']
+
+
+def test_polling_02(logger: logging.Logger, directory_symlink: str, blank_tar_file: str,
+                    empty_config_file: str) -> None:
+    """
+    Test to check that in polling mode the changes of the directory are compressed and the changes of the tar file are
+    extracted without any file system observer
+
+    :param logger: Current logger to pass to the main program to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :param empty_config_file: Path to an empty config file
+    :type empty_config_file: str
+    :return: Nothing
+    """
+    event = threading.Event()
+    thread: threading.Thread = threading.Thread(target=watch_pairs, args=([{'directory': directory_symlink,
+                                                                            'tar_filename': blank_tar_file}], logger,
+                                                                          event, empty_config_file),
+                                                kwargs={'quiet_window': 0.1, 'poll_interval': 0.2})
+    thread.start()
+    time.sleep(1)
+    assert not any('Emitter' in type(other).__name__ or 'Observer' in type(other).__name__
+                   for other in threading.enumerate())
+    os.symlink('/target/a', os.path.join(directory_symlink, 'link'))
+    time.sleep(1.5)
+    with tarfile.open(blank_tar_file, "r:gz") as tar:
+        assert [member.linkname for member in tar.getmembers()] == ['/target/a']
+        tar.close()
+    with tarfile.open(blank_tar_file, "w:gz") as tar:
+        tar.addfile(symlink_tar_info('other', '/target/b', 0o777))
+        tar.close()
+    time.sleep(1.5)
+    event.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert sorted(os.listdir(directory_symlink)) == ['other']
+    assert os.readlink(os.path.join(directory_symlink, 'other')) == '/target/b'
+
+
+def test_polling_03(logger: logging.Logger, directory_symlink: str, blank_tar_file: str, empty_config_file: str,
+                    temp_dir: str) -> None:
+    """
+    Test to check that two polling peers whose directories were just created do not write their directories over the
+    tar file they were never synchronized with, and that a later change of one of them reaches the other one
+
+    :param logger: Current logger to pass to the main program to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory of the first peer, holding the symbolic link of the tar file
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :param empty_config_file: Path to the empty state store of the first peer
+    :type empty_config_file: str
+    :param temp_dir: Path to a temporary directory for the directory and the state store of the second peer
+    :type temp_dir: str
+    :return: Nothing
+    """
+    with tarfile.open(blank_tar_file, "w:gz") as tar:
+        tar.addfile(symlink_tar_info('link', '/target/a', 0o777))
+        tar.close()
+    os.symlink('/target/a', os.path.join(directory_symlink, 'link'))
+    directory_other = os.path.join(temp_dir, 'symlinks')
+    os.mkdir(directory_other)
+    event = threading.Event()
+    threads = [threading.Thread(target=watch_pairs, args=([{'directory': directory, 'tar_filename': blank_tar_file}],
+                                                          logger, event, state_filename),
+                                kwargs={'quiet_window': 0.1, 'poll_interval': 0.5})
+               for directory, state_filename in ((directory_symlink, empty_config_file),
+                                                 (directory_other, os.path.join(temp_dir, 'cloud_symlinks.db')))]
+    try:
+        # The second peer starts first, so a write of its empty directory is not hidden by a write of the first peer
+        for thread in reversed(threads):
+            thread.start()
+            time.sleep(1.5)
+            with tarfile.open(blank_tar_file, "r:gz") as tar:
+                assert [(member.name, member.linkname) for member in tar.getmembers()] == [('link', '/target/a')]
+                tar.close()
+        time.sleep(1)
+        assert os.listdir(directory_symlink) == ['link']
+        os.symlink('/target/b', os.path.join(directory_symlink, 'other'))
+        time.sleep(3)
+    finally:
+        # The peers are stopped even if a check fails, so the test does not hang
+        event.set()
+        for thread in threads:
+            if thread.ident is not None:
+                thread.join(5)
+    assert not any(thread.is_alive() for thread in threads)
+    with tarfile.open(blank_tar_file, "r:gz") as tar:
+        assert sorted(member.name for member in tar.getmembers()) == ['link', 'other']
+        tar.close()
+    assert sorted(os.listdir(directory_symlink)) == ['link', 'other']
+    assert sorted(os.listdir(directory_other)) == ['link', 'other']
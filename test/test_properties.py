@@ -3,6 +3,8 @@
 
 import logging
 
+import pytest
+
 from src.cloud_symlinks import SymLinksEventHandler
 from src.cloud_symlinks import TarEventHandler
 
@@ -18,13 +20,35 @@ def test_properties_01(logger: logging.Logger):
     event_handler_tar = TarEventHandler(tar_filename="tar", symlinks_directory="dir", log=logger)
     event_handler_dir.tar_event_handler = event_handler_tar
     event_handler_tar.symlink_event_handler = event_handler_dir
-    event_handler_tar.controlled_change = True
-    assert event_handler_tar.controlled_change
-    event_handler_dir.controlled_change = True
-    assert event_handler_dir.controlled_change
-    event_handler_tar.controlled_change = False
-    assert not event_handler_tar.controlled_change
-    event_handler_dir.controlled_change = False
-    assert not event_handler_dir.controlled_change
+    assert event_handler_tar.fingerprint is None
+    event_handler_tar.fingerprint = (1, 2, 'abc')
+    assert event_handler_tar.fingerprint == (1, 2, 'abc')
+    assert event_handler_dir.manifest is None
+    event_handler_dir.manifest = {'link': ('/a/b/c', 0o777)}
+    assert event_handler_dir.manifest == {'link': ('/a/b/c', 0o777)}
     assert event_handler_tar.symlink_event_handler == event_handler_dir
     assert event_handler_dir.tar_event_handler == event_handler_tar
+
+
+def test_properties_02(logger: logging.Logger):
+    """
+    Test to check that the directory event handler still takes the tar file, directory, recursive flag and logger
+    positionally, in their historical order, that the tar event handler takes its tar file, directory and logger
+    positionally and that the parameters added to both are keyword-only
+
+    :param logger: Current logger to pass to the main program to write to.
+    :type logger: logging.Logger
+    """
+    event_handler_dir = SymLinksEventHandler("tar", "dir", True, logger)
+    assert event_handler_dir.recursive is True
+    assert event_handler_dir.log is logger
+    event_handler_dir.scheduler.stop()
+    event_handler_dir.engine.stop()
+    event_handler_tar = TarEventHandler("tar", "dir", logger)
+    assert event_handler_tar.tar_filename == "tar" and event_handler_tar.log is logger
+    event_handler_tar.scheduler.stop()
+    event_handler_tar.engine.stop()
+    with pytest.raises(TypeError):
+        SymLinksEventHandler("tar", "dir", True, logger, None)
+    with pytest.raises(TypeError):
+        TarEventHandler("tar", "dir", logger, None)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from src.cloud_symlinks import DebounceScheduler
+from src.cloud_symlinks import SyncEngine
+from src.cloud_symlinks import start_event_loop
+
+
+def test_scheduler_01() -> None:
+    """
+    Test to check that a burst of events runs the callback once, with the arguments of the last event, and without
+    creating a thread per event
+
+    :return: Nothing
+    """
+    calls = list()
+    scheduler = DebounceScheduler(quiet_window=0.3, max_latency=5.0)
+    threads = threading.active_count()
+    for i in range(5000):
+        scheduler.schedule('key', calls.append, i)
+    assert threading.active_count() == threads + 1
+    time.sleep(0.6)
+    scheduler.stop()
+    assert calls == [4999]
+
+
+def test_scheduler_02() -> None:
+    """
+    Test to check that a steady stream of events is flushed once the maximum latency is reached, and that the keys are
+    debounced independently
+
+    :return: Nothing
+    """
+    calls = list()
+    scheduler = DebounceScheduler(quiet_window=0.3, max_latency=0.5)
+    scheduler.schedule('other', calls.append, 'other')
+    for i in range(15):
+        scheduler.schedule('key', calls.append, i)
+        time.sleep(0.1)
+    time.sleep(0.5)
+    scheduler.stop()
+    assert 'other' in calls
+    flushed = [call for call in calls if call != 'other']
+    assert len(flushed) >= 3
+    assert flushed[-1] == 14
+
+
+def test_scheduler_03() -> None:
+    """
+    Test to check that the scheduler and the sync engine share an event loop given to them, debouncing with the timers
+    of that loop and sending the callbacks of the engine to its pool, without threads of their own
+
+    :return: Nothing
+    """
+    calls = list()
+    loop, thread = start_event_loop('test')
+    scheduler = DebounceScheduler(quiet_window=0.2, max_latency=5.0, loop=loop)
+    engine = SyncEngine(max_workers=1, loop=loop)
+    threads = threading.active_count()
+    for i in range(100):
+        scheduler.schedule('key', engine.submit, 'tar', calls.append, i)
+    assert threading.active_count() == threads
+    time.sleep(0.5)
+    assert calls == [99]
+    assert threading.active_count() == threads + 1
+    scheduler.stop()
+    engine.stop()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
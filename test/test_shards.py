@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import tarfile
+import os
+
+from watchdog.events import DirModifiedEvent
+from watchdog.events import FileModifiedEvent
+
+from src.cloud_symlinks import DebounceScheduler
+from src.cloud_symlinks import SymLinksEventHandler
+from src.cloud_symlinks import TarEventHandler
+from src.cloud_symlinks import build_manifest
+from src.cloud_symlinks import extract_shards
+from src.cloud_symlinks import is_shard_index
+from src.cloud_symlinks import read_shard_index
+from src.cloud_symlinks import shard_filename
+from src.cloud_symlinks import write_shards
+
+
+def test_shards_01(directory_symlink: str, temp_dir: str) -> None:
+    """
+    Test to check that a sharded archive only rewrites the shards with changed entries, that its extraction only
+    applies the shards whose hash changed, and that the shards left without entries are removed on both sides
+
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    for directory in ('a', 'b'):
+        os.makedirs(os.path.join(directory_symlink, directory, 'sub'))
+        os.symlink('/target/' + directory, os.path.join(directory_symlink, directory, 'sub', 'link'))
+    os.symlink('/target/top', os.path.join(directory_symlink, 'top'))
+    tar_filename = os.path.join(temp_dir, 'links.tar')
+    manifest = build_manifest(directory_symlink, True)
+    index = write_shards(tar_filename, directory_symlink, manifest, None, 'top', 16)
+    assert is_shard_index(tar_filename)
+    assert read_shard_index(tar_filename) == index
+    assert sorted(index[2].keys()) == ['', 'a', 'b']
+    mirror = os.path.join(temp_dir, 'mirror')
+    os.mkdir(mirror)
+    mirror_manifest, counts, applied = extract_shards(tar_filename, mirror, True)
+    assert mirror_manifest == manifest and applied == index
+    assert counts['created'] == 3
+
+    inode = os.stat(shard_filename(tar_filename, 'top', 16, 'b')).st_ino
+    os.remove(os.path.join(directory_symlink, 'a', 'sub', 'link'))
+    os.symlink('/target/new', os.path.join(directory_symlink, 'a', 'sub', 'link'))
+    os.remove(os.path.join(directory_symlink, 'top'))
+    new_manifest = build_manifest(directory_symlink, True)
+    new_index = write_shards(tar_filename, directory_symlink, new_manifest, {'a/sub/link', 'top'}, 'top', 16,
+                             previous=index)
+    assert sorted(new_index[2].keys()) == ['a', 'b']
+    assert new_index[2]['b'] == index[2]['b'] and new_index[2]['a'] != index[2]['a']
+    assert os.stat(shard_filename(tar_filename, 'top', 16, 'b')).st_ino == inode
+    assert not os.path.exists(shard_filename(tar_filename, 'top', 16, ''))
+    mirror_manifest, counts, applied = extract_shards(tar_filename, mirror, True, False, applied, mirror_manifest)
+    assert mirror_manifest == new_manifest == build_manifest(mirror, True)
+    assert counts == {'elements': 1, 'created': 0, 'retargeted': 1, 'removed': 1}
+
+
+def test_shards_02(logger: logging.Logger, directory_symlink: str, blank_tar_file: str, temp_dir: str) -> None:
+    """
+    Test to check that the handlers compress a directory to a hash sharded archive and extract it to another
+    directory, and that an index whose shards did not arrive yet is not applied
+
+    :param logger: Current logger to pass to the handlers to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    scheduler = DebounceScheduler()
+    handlers = list()
+    for directory in (directory_symlink, temp_dir):
+        event_handler_dir = SymLinksEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory,
+                                                 log=logger, recursive=True, scheduler=scheduler, sharding='hash',
+                                                 shard_count=4)
+        event_handler_tar = TarEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory, log=logger,
+                                            scheduler=scheduler)
+        event_handler_dir.tar_event_handler = event_handler_tar
+        event_handler_tar.symlink_event_handler = event_handler_dir
+        handlers.append((event_handler_dir, event_handler_tar))
+    for i in range(20):
+        os.symlink('/target/{0:}'.format(i), os.path.join(directory_symlink, 'link{0:}'.format(i)))
+    handlers[0][0].compress(DirModifiedEvent(directory_symlink))
+    index = handlers[0][1].shards
+    assert index[:2] == ('hash', 4) and len(index[2]) == 4
+    assert read_shard_index(blank_tar_file) == index
+
+    os.rename(shard_filename(blank_tar_file, 'hash', 4, '0'), blank_tar_file + '.missing')
+    handlers[1][1].untar(FileModifiedEvent(blank_tar_file))
+    assert os.listdir(temp_dir) == [] and handlers[1][1].shards is None
+    os.rename(blank_tar_file + '.missing', shard_filename(blank_tar_file, 'hash', 4, '0'))
+    handlers[1][1].untar(FileModifiedEvent(blank_tar_file))
+    assert handlers[1][1].shards == index
+    assert build_manifest(temp_dir, True) == build_manifest(directory_symlink, True)
+    assert handlers[1][0].manifest == build_manifest(directory_symlink, True)
+    with tarfile.open(shard_filename(blank_tar_file, 'hash', 4, '0'), "r") as tar:
+        assert all(member.issym() for member in tar.getmembers())
+        tar.close()
+    scheduler.stop()
+    for event_handler_dir, event_handler_tar in handlers:
+        event_handler_dir.engine.stop()
+        event_handler_tar.engine.stop()
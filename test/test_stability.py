@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip
+import logging
+import tarfile
+import time
+import os
+
+from watchdog.events import FileModifiedEvent
+
+from src.cloud_symlinks import DebounceScheduler
+from src.cloud_symlinks import SymLinksEventHandler
+from src.cloud_symlinks import TarEventHandler
+from src.cloud_symlinks import symlink_tar_info
+from src.cloud_symlinks import verify_gzip_file
+
+
+def test_stability_01(temp_dir: str) -> None:
+    """
+    Test to check that the gzip check accepts complete single and multi-member gzip files, zero padded gzip files and
+    files that are not gzip files, and rejects truncated and corrupt gzip files
+
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    filename = os.path.join(temp_dir, 'file.gz')
+    data = gzip.compress(os.urandom(100000)) + gzip.compress(b'second member')
+    with open(filename, 'wb') as f:
+        f.write(data)
+        f.close()
+    assert verify_gzip_file(filename)
+    with open(filename, 'wb') as f:
+        f.write(data[:-10])
+        f.close()
+    assert not verify_gzip_file(filename)
+    with open(filename, 'wb') as f:
+        f.write(data[:-5] + bytes([data[-5] ^ 0xff]) + data[-4:])
+        f.close()
+    assert not verify_gzip_file(filename)
+    # Zero padding after the last member, as written by tape oriented tools
+    with open(filename, 'wb') as f:
+        f.write(data + b'\0' * 10240)
+        f.close()
+    assert verify_gzip_file(filename)
+    with open(filename, 'wb') as f:
+        f.write(data + b'\0' * 512 + b'\x1f')
+        f.close()
+    assert not verify_gzip_file(filename)
+    with open(filename, 'wb') as f:
+        f.write(b'plain tar')
+        f.close()
+    assert verify_gzip_file(filename)
+
+
+def test_stability_02(logger: logging.Logger, directory_symlink: str, blank_tar_file: str) -> None:
+    """
+    Test to check that a tar file is only extracted once its size and modification time stop changing and its gzip
+    trailer is valid, and that it is extracted a single time
+
+    :param logger: Current logger to pass to the handlers to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :return: Nothing
+    """
+    scheduler = DebounceScheduler(quiet_window=0.1)
+    event_handler_dir = SymLinksEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory_symlink,
+                                             log=logger, scheduler=scheduler)
+    event_handler_tar = TarEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory_symlink, log=logger,
+                                        scheduler=scheduler, stable_interval=0.2, verify_gzip=True)
+    event_handler_dir.tar_event_handler = event_handler_tar
+    event_handler_tar.symlink_event_handler = event_handler_dir
+    extractions = list()
+    untar = event_handler_tar.untar
+    event_handler_tar.untar = lambda event: extractions.append(event) or untar(event)
+
+    complete = os.path.join(directory_symlink, '..', 'complete.tar.gz')
+    with tarfile.open(complete, "w:gz") as tar:
+        tar.addfile(symlink_tar_info('link', '/target/a', 0o777))
+        tar.close()
+    with open(complete, 'rb') as f:
+        data = f.read()
+        f.close()
+    # A download in progress: the tar file grows and keeps a truncated gzip stream
+    with open(blank_tar_file, 'wb') as f:
+        f.write(data[:len(data) // 2])
+        f.close()
+    event_handler_tar.on_any_event(FileModifiedEvent(os.path.abspath(blank_tar_file)))
+    time.sleep(0.6)
+    assert extractions == []
+    with open(blank_tar_file, 'wb') as f:
+        f.write(data)
+        f.close()
+    event_handler_tar.on_any_event(FileModifiedEvent(os.path.abspath(blank_tar_file)))
+    time.sleep(1.5)
+    assert len(extractions) == 1
+    assert os.readlink(os.path.join(directory_symlink, 'link')) == '/target/a'
+    scheduler.stop()
+    event_handler_tar.engine.stop()
+    event_handler_dir.engine.stop()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+import logging
+import os
+
+from watchdog.events import DirModifiedEvent
+from watchdog.events import FileModifiedEvent
+
+from src.cloud_symlinks import SymLinksEventHandler
+from src.cloud_symlinks import TarEventHandler
+
+
+def test_suppression_01(caplog: pytest.LogCaptureFixture, logger: logging.Logger, directory_symlink: str,
+                        blank_tar_file: str) -> None:
+    """
+    Test to check that the handlers ignore their own writes whatever the number of events they produce: the events of
+    a compression do not extract the tar file, the events of an extraction do not compress the directory, and a real
+    change of the tar file is still extracted
+
+    :param caplog: Pytest log capture fixture
+    :type caplog: pytest.LogCaptureFixture
+    :param logger: Current logger to pass to the handlers to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :return: Nothing
+    """
+    caplog.set_level(logging.INFO)
+    event_handler_dir = SymLinksEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory_symlink,
+                                             log=logger)
+    event_handler_tar = TarEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory_symlink, log=logger)
+    event_handler_dir.tar_event_handler = event_handler_tar
+    event_handler_tar.symlink_event_handler = event_handler_dir
+    os.symlink('/target/a', os.path.join(directory_symlink, 'link'))
+    event_handler_dir.compress(DirModifiedEvent(directory_symlink))
+    tar_mtime = os.stat(blank_tar_file).st_mtime_ns
+    for i in range(3):
+        event_handler_tar.untar(FileModifiedEvent(blank_tar_file))
+        assert "Extraction skipped" in caplog.records[-1].getMessage()
+    assert os.stat(blank_tar_file).st_mtime_ns == tar_mtime
+
+    # A change of the tar file made by someone else is extracted, and the events of the extraction are ignored
+    os.remove(os.path.join(directory_symlink, 'link'))
+    os.symlink('/target/b', os.path.join(directory_symlink, 'other'))
+    other_handler = SymLinksEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory_symlink, log=logger)
+    other_handler.tar_event_handler = TarEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory_symlink,
+                                                      log=logger)
+    other_handler.compress(DirModifiedEvent(directory_symlink))
+    os.remove(os.path.join(directory_symlink, 'other'))
+    os.symlink('/target/a', os.path.join(directory_symlink, 'link'))
+    event_handler_tar.untar(FileModifiedEvent(blank_tar_file))
+    assert "1 created, 0 retargeted, 1 removed" in caplog.records[-1].getMessage()
+    assert os.readlink(os.path.join(directory_symlink, 'other')) == '/target/b'
+    for i in range(3):
+        event_handler_dir.compress(DirModifiedEvent(directory_symlink))
+        assert "Compression skipped" in caplog.records[-1].getMessage()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import tarfile
+import logging
+import os
+
+from watchdog.events import DirModifiedEvent
+
+from src.cloud_symlinks import SymLinksEventHandler
+from src.cloud_symlinks import TarEventHandler
+from src.cloud_symlinks import extract_tar_file
+
+
+def test_symlinks_only_01(logger: logging.Logger, directory_symlink: str, blank_tar_file: str, temp_dir: str) -> None:
+    """
+    Test to check that in symbolic links only mode the regular files and directories of the symbolic links directory
+    are not stored in the tar file, and that they are neither extracted nor removed from another directory
+
+    :param logger: Current logger to pass to the handlers to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :param temp_dir: Path to a temporary directory
+    :type temp_dir: str
+    :return: Nothing
+    """
+    os.symlink('/target/a', os.path.join(directory_symlink, 'link'))
+    os.mkdir(os.path.join(directory_symlink, 'dir'))
+    with open(os.path.join(directory_symlink, 'dir', 'big.bin'), 'wb') as f:
+        f.write(b'0' * 1024 * 1024)
+        f.close()
+    with open(os.path.join(directory_symlink, 'test.txt'), 'w') as f:
+        f.write('hola')
+        f.close()
+    event_handler_dir = SymLinksEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory_symlink,
+                                             log=logger, symlinks_only=True)
+    event_handler_tar = TarEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory_symlink, log=logger)
+    event_handler_dir.tar_event_handler = event_handler_tar
+    event_handler_tar.symlink_event_handler = event_handler_dir
+    event_handler_dir.compress(DirModifiedEvent(directory_symlink))
+    with tarfile.open(blank_tar_file, "r:gz") as tar:
+        assert tar.getnames() == ['link']
+        tar.close()
+    assert os.path.getsize(blank_tar_file) < 1024
+    with open(os.path.join(temp_dir, 'test.txt'), 'w') as f:
+        f.write('hola')
+        f.close()
+    with tarfile.open(blank_tar_file, "r|gz") as tar:
+        manifest, counts = extract_tar_file(tar, temp_dir, False, True)
+        tar.close()
+    assert counts['created'] == 1 and counts['removed'] == 0
+    assert sorted(os.listdir(temp_dir)) == ['link', 'test.txt']
+    assert manifest == {'link': ('/target/a', 0o777)}
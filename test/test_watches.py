@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import subprocess
+import sys
+import tarfile
+import threading
+import time
+import os
+
+import pytest
+
+from watchdog.events import DirModifiedEvent
+
+import src.cloud_symlinks
+
+from src.cloud_symlinks import INOTIFY_EVENT_HEADER
+from src.cloud_symlinks import WATCH_STRATEGIES
+from src.cloud_symlinks import DebounceScheduler
+from src.cloud_symlinks import DirectoryWatcher
+from src.cloud_symlinks import InotifyConstants
+from src.cloud_symlinks import InotifyDispatcher
+from src.cloud_symlinks import SymLinksEventHandler
+from src.cloud_symlinks import SymlinkDirectoryWatcher
+from src.cloud_symlinks import TarEventHandler
+from src.cloud_symlinks import symlink_tar_info
+from src.cloud_symlinks import watch_pairs
+
+# The inotify watchers are only available where the libc provides inotify
+inotify = pytest.mark.skipif('symlink-dirs' not in WATCH_STRATEGIES, reason="inotify is not available")
+
+
+@inotify
+def test_watches_01(caplog: pytest.LogCaptureFixture, logger: logging.Logger, directory_symlink: str,
+                    blank_tar_file: str) -> None:
+    """
+    Test to check that the symlink-dirs strategy only watches the top level directory and the directories that hold
+    symbolic links, up to the maximum number of watches, which is logged once when reached, that the changes in a
+    watched directory are compressed from its events and that the changes in an unwatched one are found by a poll
+
+    :param caplog: Pytest log capture fixture
+    :type caplog: pytest.LogCaptureFixture
+    :param logger: Current logger to pass to the handlers to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :return: Nothing
+    """
+    for directory in ('a', 'b', 'c', 'empty'):
+        os.makedirs(os.path.join(directory_symlink, directory, 'sub'))
+    for directory in ('a', 'b', 'c/sub'):
+        os.symlink('/target/' + directory, os.path.join(directory_symlink, directory, 'link'))
+    scheduler = DebounceScheduler(quiet_window=0.1)
+    event_handler_dir = SymLinksEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory_symlink,
+                                             log=logger, recursive=True, scheduler=scheduler)
+    event_handler_dir.tar_event_handler = TarEventHandler(tar_filename=blank_tar_file,
+                                                          symlinks_directory=directory_symlink, log=logger)
+    event_handler_dir.compress(DirModifiedEvent(directory_symlink))
+    watcher = SymlinkDirectoryWatcher(event_handler_dir, max_watches=3)
+    watcher.start()
+    assert watcher.watched == {'', 'a', 'b'}
+    watcher.refresh()
+    warnings = [record.getMessage() for record in caplog.records if record.levelname == 'WARNING']
+    assert len(warnings) == 1 and 'Reached the maximum of 3 watches' in warnings[0]
+    watcher.max_watches = 10
+    watcher.refresh()
+    assert watcher.watched == {'', 'a', 'b', 'c/sub'}
+    watcher.poll()
+
+    os.symlink('/target/new', os.path.join(directory_symlink, 'a', 'new'))
+    time.sleep(0.5)
+    with tarfile.open(blank_tar_file, "r:gz") as tar:
+        assert 'a/new' in tar.getnames()
+        tar.close()
+    os.symlink('/target/deep', os.path.join(directory_symlink, 'empty', 'sub', 'deep'))
+    time.sleep(0.5)
+    with tarfile.open(blank_tar_file, "r:gz") as tar:
+        assert 'empty/sub/deep' not in tar.getnames()
+        tar.close()
+    watcher.poll()
+    time.sleep(0.5)
+    with tarfile.open(blank_tar_file, "r:gz") as tar:
+        assert 'empty/sub/deep' in tar.getnames()
+        tar.close()
+    watcher.poll()
+    assert 'empty/sub' in watcher.watched
+    watcher.stop()
+    scheduler.stop()
+    event_handler_dir.engine.stop()
+
+
+@inotify
+def test_watches_02(caplog: pytest.LogCaptureFixture, logger: logging.Logger, directory_symlink: str,
+                    blank_tar_file: str) -> None:
+    """
+    Test to check that an overflow of the inotify event queue, which loses events, discards the index of the directory
+    and compresses the whole directory, even below the rescan threshold of the pending paths
+
+    :param caplog: Pytest log capture fixture
+    :type caplog: pytest.LogCaptureFixture
+    :param logger: Current logger to pass to the handlers to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :return: Nothing
+    """
+    caplog.set_level(logging.INFO)
+    with open('/proc/sys/fs/inotify/max_queued_events') as f:
+        max_queued_events = int(f.read())
+        f.close()
+    scheduler = DebounceScheduler(quiet_window=0.1)
+    event_handler_dir = SymLinksEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory_symlink,
+                                             log=logger, recursive=True, scheduler=scheduler,
+                                             rescan_threshold=10 * max_queued_events)
+    event_handler_dir.tar_event_handler = TarEventHandler(tar_filename=blank_tar_file,
+                                                          symlinks_directory=directory_symlink, log=logger)
+    event_handler_dir.compress(DirModifiedEvent(directory_symlink))
+    dispatcher = InotifyDispatcher(logger)
+    watcher = DirectoryWatcher(event_handler_dir, dispatcher)
+    watcher.start()
+    # The events are queued by the kernel until the dispatcher reads them, and the queue overflows
+    for i in range(max_queued_events + 1):
+        os.symlink('/target/{0:}'.format(i), os.path.join(directory_symlink, 'link{0:}'.format(i)))
+    dispatcher.start()
+    for i in range(60):
+        time.sleep(0.5)
+        with tarfile.open(blank_tar_file, "r:gz") as tar:
+            count = len(tar.getnames())
+            tar.close()
+        if count == max_queued_events + 1:
+            break
+    assert count == max_queued_events + 1
+    assert any('event queue overflowed' in record.getMessage() for record in caplog.records)
+
+    os.mkdir(os.path.join(directory_symlink, 'lost'))
+    dispatcher._dispatch(INOTIFY_EVENT_HEADER.pack(-1, InotifyConstants.IN_Q_OVERFLOW, 0, 0))
+    assert 'lost' in watcher.watched
+    watcher.stop()
+    dispatcher.close()
+    scheduler.stop()
+    event_handler_dir.engine.stop()
+
+
+def test_watches_03() -> None:
+    """
+    Test to check that the program is imported and falls back to the watchdog observer when the libc does not
+    provide inotify, in which case watchdog raises an error that is not an ImportError
+
+    :return: Nothing
+    """
+    code = """
+import sys
+from watchdog.utils import UnsupportedLibcError
+class Finder:
+    def find_spec(self, name, path=None, target=None):
+        if name == 'watchdog.observers.inotify_c':
+            raise UnsupportedLibcError('inotify functions not found')
+sys.meta_path.insert(0, Finder())
+import src.cloud_symlinks
+assert src.cloud_symlinks.InotifyConstants is None
+assert src.cloud_symlinks.WATCH_STRATEGIES == ('tree',)
+"""
+    result = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.dirname(__file__)),
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+@inotify
+def test_watches_04(logger: logging.Logger, directory_symlink: str, blank_tar_file: str,
+                    empty_config_file: str) -> None:
+    """
+    Test to check that a peer with an empty directory and no state that joins a populated tar file with the
+    symlink-dirs strategy does not write its directory over the tar file while placing its watches
+
+    :param logger: Current logger to pass to the main program to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the empty directory of the joining peer
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :param empty_config_file: Path to an empty state store
+    :type empty_config_file: str
+    :return: Nothing
+    """
+    with tarfile.open(blank_tar_file, "w:gz") as tar:
+        tar.addfile(symlink_tar_info('sub/l', '/target/a', 0o777))
+        tar.close()
+    with open(blank_tar_file, 'rb') as f:
+        contents = f.read()
+        f.close()
+    event = threading.Event()
+    thread = threading.Thread(target=watch_pairs, args=([{'directory': directory_symlink,
+                                                          'tar_filename': blank_tar_file, 'recursive': True}],
+                                                        logger, event, empty_config_file),
+                              kwargs={'quiet_window': 0.1, 'watch_strategy': 'symlink-dirs', 'rescan_interval': 0.2})
+    thread.start()
+    time.sleep(2)
+    event.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    with open(blank_tar_file, 'rb') as f:
+        assert f.read() == contents
+        f.close()
+    assert os.listdir(directory_symlink) == []
+
+
+@inotify
+def test_watches_05(logger: logging.Logger, directory_symlink: str, blank_tar_file: str) -> None:
+    """
+    Test to check that an event of a directory created that is dispatched after the watcher of the directory is stopped
+    does not place a watch
+
+    :param logger: Current logger to pass to the handlers to write to.
+    :type logger: logging.Logger
+    :param directory_symlink: Path to the directory that contains the symbolic links
+    :type directory_symlink: str
+    :param blank_tar_file: Path to a blank tar file.
+    :type blank_tar_file: str
+    :return: Nothing
+    """
+    scheduler = DebounceScheduler(quiet_window=0.1)
+    event_handler_dir = SymLinksEventHandler(tar_filename=blank_tar_file, symlinks_directory=directory_symlink,
+                                             log=logger, recursive=True, scheduler=scheduler)
+    event_handler_dir.tar_event_handler = TarEventHandler(tar_filename=blank_tar_file,
+                                                          symlinks_directory=directory_symlink, log=logger)
+    dispatcher = InotifyDispatcher(logger)
+    watcher = DirectoryWatcher(event_handler_dir, dispatcher)
+    watcher.start()
+    assert watcher.watched == {''}
+    watcher.stop()
+    os.mkdir(os.path.join(directory_symlink, 'late'))
+    # InotifyEvent is only imported by the program where inotify is available
+    late = src.cloud_symlinks.InotifyEvent(1, InotifyConstants.IN_CREATE | InotifyConstants.IN_ISDIR, 0, b'late',
+                                           os.fsencode(os.path.join(directory_symlink, 'late')))
+    watcher.dispatch(late)
+    assert watcher.watched == set()
+    assert dispatcher._watchers == dict()
+    dispatcher.close()
+    scheduler.stop()
+    event_handler_dir.engine.stop()